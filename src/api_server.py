@@ -0,0 +1,403 @@
+# local HTTP/JSON API in front of one RentalManager, for kiosks, a booking page or the POS
+#
+# usage: python api_server.py [port] [host]
+# stdlib only: asyncio streams and a small HTTP/1.1 reader with keep-alive. Reads are answered on the
+# event loop (the manager's lock makes them safe), every change goes through one writer task that owns
+# the manager's mutations and runs whatever queued up meanwhile in one hop to its worker thread.
+#
+#   GET  /bikes[?status=available]                   inventory, or one status
+#   GET  /bikes/search?q=trek                        search_bikes
+#   POST /tickets      {"customer": {"name", "phone"[, "id"]}, "bike_id", "hours"[, "personal_notes"]}
+#   GET  /tickets/search?q=smith[&active=1]          search_tickets
+#   GET  /tickets/active?name=...&phone=...          find_active_tickets_by_customer
+#   GET  /tickets/<id>
+#   POST /tickets/<id>/close
+#   GET  /reports/summary | /reports/revenue_by_bike | /reports/revenue_by_day
+#   POST /batch        [{"method", "path"[, "body"]}, ...] -> [{"status", "body"}, ...]
+
+import asyncio
+import json
+import re
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Callable, NamedTuple
+from urllib.parse import parse_qs, urlsplit
+from customer import Customer
+from rental_manager import RentalManager
+
+MAX_BODY = 1 << 20  # bytes
+
+
+# --------------------
+# HTTP messages
+# --------------------
+async def read_message(reader: asyncio.StreamReader) -> None | tuple[str, dict, bytes]:
+    """Read one HTTP/1.1 request or response: (start line, lower-case headers, body), or None at end of stream."""
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError as e:
+        if not e.partial.strip():
+            return None
+        raise ValueError("Truncated message")
+    except asyncio.LimitOverrunError:
+        raise ValueError("Headers too large")
+
+    start_line, *lines = head.decode('latin-1').split('\r\n')
+    headers = {}
+    for line in lines:
+        if line:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    if length > MAX_BODY:
+        raise ValueError("Body too large")
+    return start_line, headers, await reader.readexactly(length) if length else b''
+
+
+def format_message(start_line: str, payload, keep_alive=True, headers=()) -> bytes:
+    """An HTTP message with a JSON body (none if payload is None)."""
+    body = b'' if payload is None else json.dumps(payload).encode()
+    lines = [start_line, 'Content-Type: application/json', f'Content-Length: {len(body)}',
+             'Connection: ' + ('keep-alive' if keep_alive else 'close'), *headers]
+    return '\r\n'.join(lines).encode('latin-1') + b'\r\n\r\n' + body
+
+
+def wants_keep_alive(version: str, headers: dict) -> bool:
+    """HTTP/1.1 keeps the connection open unless told otherwise, HTTP/1.0 only when asked to."""
+    connection = headers.get('connection', '').lower()
+    return connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+
+def internal_error() -> tuple[int, dict]:
+    """Log the exception being handled and answer 500, without its details."""
+    traceback.print_exc()
+    return 500, {'error': "Internal server error"}
+
+
+def is_id(value) -> bool:
+    """True for a positive integer; JSON true/false parse to bools, which Python counts as ints."""
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+class Route(NamedTuple):
+    method: str
+    pattern: re.Pattern
+    handler: Callable  # (query, body, *path groups) -> (status, payload)
+    writes: bool  # run by the writer task
+
+
+# --------------------
+# Service
+# --------------------
+class ApiService:
+    """Routes HTTP requests to a RentalManager; start() serves them, close() stops."""
+
+    SYNC_SECONDS = 2.0  # with shared_files, how often changes by other processes are picked up when idle
+
+    def __init__(self, manager: RentalManager, max_batch=64):
+        self.manager = manager
+        self.max_batch = max_batch  # changes run per hop to the writer thread
+        self.queue = None  # (handler, args, future), made on the event loop by start()
+        self.server = None
+        self.tasks = []
+        self.connections = {}  # connection task -> True while it waits for the next request
+        self.closing = False
+        self.routes = [
+            Route('GET', re.compile(r'/bikes'), self.list_bikes, False),
+            Route('GET', re.compile(r'/bikes/search'), self.search_bikes, False),
+            Route('POST', re.compile(r'/tickets'), self.create_ticket, True),
+            Route('GET', re.compile(r'/tickets/search'), self.search_tickets, False),
+            Route('GET', re.compile(r'/tickets/active'), self.active_tickets, False),
+            Route('GET', re.compile(r'/tickets/(\d+)'), self.get_ticket, False),
+            Route('POST', re.compile(r'/tickets/(\d+)/close'), self.close_ticket, True),
+            Route('GET', re.compile(r'/reports/summary'), self.summary, False),
+            Route('GET', re.compile(r'/reports/revenue_by_bike'), self.revenue_by_bike, False),
+            Route('GET', re.compile(r'/reports/revenue_by_day'), self.revenue_by_day, False),
+        ]
+
+    async def start(self, host='127.0.0.1', port=8080) -> asyncio.Server:
+        """Start listening and the writer task; port 0 picks a free port (see self.server.sockets)."""
+        self.queue = asyncio.Queue()
+        self.tasks.append(asyncio.create_task(self.run_writer()))
+        if self.manager.shared_files:
+            self.tasks.append(asyncio.create_task(self.run_sync()))
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server
+
+    async def close(self) -> None:
+        """
+        Stop accepting connections, hang up on idle keep-alive ones, let the others finish their request,
+        then let the writer finish what is queued.
+        """
+        self.closing = True
+        if self.server is not None:
+            self.server.close()
+            for task, idle in list(self.connections.items()):
+                if idle:
+                    task.cancel()
+            await asyncio.gather(*self.connections, return_exceptions=True)
+            await self.server.wait_closed()
+        while self.queue is not None and not self.queue.empty():
+            await asyncio.sleep(0.01)
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    # --------------------
+    # Connections
+    # --------------------
+    async def handle_connection(self, reader, writer) -> None:
+        """Answer requests on one connection, one at a time, until either side closes it or the service stops."""
+        task = asyncio.current_task()
+        try:
+            while not self.closing:
+                self.connections[task] = True
+                try:
+                    message = await read_message(reader)
+                    if message is None:
+                        break
+                    start_line, headers, body = message
+                    method, target, version = start_line.split(' ')
+                except ValueError as e:
+                    writer.write(format_message('HTTP/1.1 400 Bad Request', {'error': str(e) or "Bad request"}, False))
+                    break
+                self.connections[task] = False
+                keep_alive = wants_keep_alive(version, headers) and not self.closing
+                try:
+                    status, payload = await self.dispatch(method, target, body)
+                except Exception:
+                    status, payload = internal_error()
+                writer.write(format_message(f'HTTP/1.1 {status} {HTTPStatus(status).phrase}', payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:
+            if not self.closing:
+                raise
+            # close() hung up on this idle connection; ending normally keeps asyncio from logging it
+        finally:
+            self.connections.pop(task, None)
+            writer.close()
+
+    async def dispatch(self, method: str, target: str, body: bytes) -> tuple[int, object]:
+        """Run one request and return (status, JSON payload)."""
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            return 400, {'error': "Body is not valid JSON"}
+        url = urlsplit(target)
+        if url.path == '/batch' and method == 'POST':
+            if not isinstance(data, list):
+                return 400, {'error': "A batch is a list of requests"}
+            return 200, await self.run_batch(data)
+        return await self.call(self.match(method, url.path), url.query, data)
+
+    def match(self, method: str, path: str) -> None | tuple[Route, tuple]:
+        """The route for a request and the groups of its path, or None."""
+        for route in self.routes:
+            found = route.pattern.fullmatch(path)
+            if found and route.method == method:
+                return route, found.groups()
+        return None
+
+    async def call(self, matched, query: str, data) -> tuple[int, object]:
+        """Run a matched route, reads right here and changes through the writer task."""
+        if matched is None:
+            return 404, {'error': "Not found"}
+        route, groups = matched
+        query = {name: values[-1] for name, values in parse_qs(query).items()}
+        try:
+            if route.writes:
+                return await self.submit(route.handler, query, data, *groups)
+            return route.handler(query, data, *groups)
+        except (ValueError, TypeError, KeyError) as e:
+            return 400, {'error': str(e)}
+        except Exception:
+            return internal_error()
+
+    async def run_batch(self, requests: list) -> list[dict]:
+        """
+        Run several requests sent as one. Consecutive changes are queued together, so the writer runs
+        them in one hop; a read waits for the changes before it, so it sees them.
+        """
+        results = [None] * len(requests)
+        pending = []  # (index, future) of queued changes
+
+        async def settle():
+            for index, future in pending:
+                try:
+                    results[index] = await future
+                except (ValueError, TypeError, KeyError) as e:
+                    results[index] = 400, {'error': str(e)}
+                except Exception:
+                    results[index] = internal_error()
+            pending.clear()
+
+        for index, request in enumerate(requests):
+            if (not isinstance(request, dict) or not isinstance(request.get('method'), str)
+                    or not isinstance(request.get('path'), str)):
+                results[index] = 400, {'error': "A batch request needs a method and a path"}
+                continue
+            # a bad item only fails itself, the changes queued before it still go through
+            try:
+                url = urlsplit(request['path'])
+                matched = self.match(request['method'], url.path)
+                if matched is not None and matched[0].writes:
+                    query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+                    pending.append((index, self.submit(matched[0].handler, query, request.get('body') or {}, *matched[1])))
+                    continue
+            except ValueError as e:
+                results[index] = 400, {'error': str(e)}
+                continue
+            except Exception:
+                results[index] = internal_error()
+                continue
+            await settle()
+            results[index] = await self.call(matched, url.query, request.get('body') or {})
+        await settle()
+        return [{'status': status, 'body': payload} for status, payload in results]
+
+    # --------------------
+    # Writer task
+    # --------------------
+    def submit(self, handler, *args) -> asyncio.Future:
+        """Queue a change for the writer task; the future gets its (status, payload) or exception."""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((handler, args, future))
+        return future
+
+    async def run_writer(self) -> None:
+        """The only place changes are made: take what is queued, run it in order on one worker thread."""
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(1, thread_name_prefix='api-writer') as executor:
+            while True:
+                batch = [await self.queue.get()]
+                while len(batch) < self.max_batch and not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                outcomes = await loop.run_in_executor(executor, self.apply_batch, batch)
+                for (_, _, future), (result, error) in zip(batch, outcomes):
+                    if future.done():
+                        continue  # the client went away
+                    if error is None:
+                        future.set_result(result)
+                    else:
+                        future.set_exception(error)
+
+    @staticmethod
+    def apply_batch(batch) -> list[tuple]:
+        """Run queued changes one after another; each is its own transaction, a failure only fails itself."""
+        outcomes = []
+        for handler, args, _ in batch:
+            try:
+                outcomes.append((handler(*args), None))
+            except Exception as e:
+                outcomes.append((None, e))
+        return outcomes
+
+    async def run_sync(self) -> None:
+        """Pick up changes other processes made to the shared files, through the writer so it stays the only one."""
+        def sync(query, body):
+            self.manager.sync_changes()
+            return 200, {}
+        while True:
+            await asyncio.sleep(self.SYNC_SECONDS)
+            if self.queue.empty():
+                try:
+                    await self.submit(sync, {}, {})
+                except (OSError, ValueError) as e:
+                    print(f"Could not load changes: {e}", file=sys.stderr)
+
+    # --------------------
+    # Handlers: (query, body, *path groups) -> (status, payload)
+    # --------------------
+    def list_bikes(self, query, body):
+        bikes = self.manager.list_inventory() if 'status' not in query else self.manager.list_any_bikes(query['status'])
+        return 200, [b.to_dict() for b in bikes]
+
+    def search_bikes(self, query, body):
+        return 200, [b.to_dict() for b in self.manager.search_bikes(query.get('q', ''))]
+
+    def create_ticket(self, query, body):
+        if not isinstance(body, dict):
+            raise ValueError("Body must be a JSON object")
+        customer = body.get('customer')
+        if not isinstance(customer, dict) or not isinstance(customer.get('name'), str) \
+                or not isinstance(customer.get('phone'), str):
+            raise ValueError("customer needs a name and a phone")
+        if customer.get('id') is not None and not is_id(customer['id']):
+            raise ValueError("customer id must be a positive integer")
+        if not is_id(body.get('bike_id')):
+            raise ValueError("bike_id must be a positive integer")
+        if not isinstance(body.get('personal_notes', ''), str):
+            raise ValueError("personal_notes must be a string")
+        # hours are checked by the manager
+        ticket = self.manager.create_ticket(Customer(customer.get('id'), customer['name'], customer['phone']),
+                                            body['bike_id'], body.get('hours'), body.get('personal_notes', ''))
+        return 201, ticket.to_dict()
+
+    def search_tickets(self, query, body):
+        tickets = self.manager.search_tickets(query.get('q', ''), query.get('active') == '1')
+        return 200, [t.to_dict() for t in tickets]
+
+    def active_tickets(self, query, body):
+        if 'name' not in query or 'phone' not in query:
+            raise ValueError("name and phone are required")
+        return 200, [t.to_dict() for t in self.manager.find_active_tickets_by_customer(query['name'], query['phone'])]
+
+    def get_ticket(self, query, body, ticket_id):
+        ticket = self.manager.get_ticket(int(ticket_id))
+        if ticket is None:
+            return 404, {'error': "Ticket not found"}
+        return 200, ticket.to_dict()
+
+    def close_ticket(self, query, body, ticket_id):
+        if self.manager.get_ticket(int(ticket_id)) is None:
+            return 404, {'error': "Ticket not found"}
+        return 200, self.manager.close_ticket(int(ticket_id)).to_dict()
+
+    def summary(self, query, body):
+        return 200, {'active_rentals': self.manager.total_active_rentals(), 'total_revenue': self.manager.total_revenue(),
+                     'current_charges': self.manager.total_current_charges(), 'bikes': self.manager.status_counts()}
+
+    def revenue_by_bike(self, query, body):
+        return 200, self.manager.revenue_by_bike()
+
+    def revenue_by_day(self, query, body):
+        return 200, self.manager.revenue_by_day()
+
+
+# main() serves the GUI's files, which may be open at the same time. In journal mode each process picks up
+# the other's changes as records instead of reading every file again; writes already run off the event loop.
+MANAGER_OPTIONS = {'storage_mode': 'journal', 'shared_files': True}
+
+
+async def serve(manager: RentalManager, host='127.0.0.1', port=8080) -> None:
+    """Serve the API until cancelled."""
+    service = ApiService(manager)
+    server = await service.start(host, port)
+    print(f"Serving on http://{host}:{server.sockets[0].getsockname()[1]}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await service.close()
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    host = sys.argv[2] if len(sys.argv) > 2 else '127.0.0.1'
+    manager = RentalManager(**MANAGER_OPTIONS)
+    try:
+        asyncio.run(serve(manager, host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manager.close()
+
+
+if __name__ == '__main__':
+    main()
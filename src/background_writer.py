@@ -0,0 +1,242 @@
+import itertools
+import queue
+import threading
+import time
+
+
+class BackgroundWriter:
+    """
+    Runs storage writes on a worker thread, so a GUI click never waits for the disk.
+
+    Callers hand over change records, or a copied full snapshot. Storage without incremental writes
+    (json) gets the full state once through submit_state(); the writer keeps its own copy of it, applies
+    the records to that and saves it whole, so a caller's work per change stays the size of the change.
+    Writes that pile up while the worker is busy are coalesced: only the newest record per object and
+    the newest snapshot are written. Outcomes are queued as events and delivered on the caller's
+    thread by poll(), e.g. from a Tk root.after loop.
+
+    With a file_lock (files shared with other processes) callers submit while holding it, and the writer
+    keeps a hold() on it until that work is written: the other processes wait for the write instead of the caller.
+    """
+
+    def __init__(self, storage, delay=0.05, file_lock=None):
+        self.storage = storage
+        self.delay = delay  # seconds to wait for more changes before writing
+        self.file_lock = file_lock
+        self.events = queue.Queue()  # ('done', write_count) or ('error', exception)
+        self.error = None  # last failed write, cleared by the next successful one
+        self.write_count = 0
+
+        self._cond = threading.Condition()
+        self._records = {}  # (kind, id) -> newest record
+        self._sequences = None
+        self._snapshot = None  # (bikes, tickets, sequences)
+        self._ranks = {}  # bike id -> inventory position, for the records of a mirrored state
+        self._state = None  # queued by submit_state
+        self._mirror = None  # the writer's copy of the full state, only touched by the worker
+        self._unsaved = False  # the mirror has changes a failed write didn't store
+        self._wake = False
+        self._flushing = 0  # flush() calls waiting, they skip the delay
+        self._holds = 0  # file_lock holds taken for the queued work
+        self._busy = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='rental-writer', daemon=True)
+        self._thread.start()
+
+    def submit_records(self, records, sequences, ranks=None) -> None:
+        """
+        Queue change records for storage.apply(), or for the mirrored state after submit_state().
+        ranks gives the inventory position of each bike in the records, to keep the saved order.
+        """
+        with self._cond:
+            if ranks:
+                self._ranks.update(ranks)
+            for record in records:
+                kind = 'ticket' if record['op'] == 'ticket' else 'bike'
+                key = (kind, record['id'] if 'id' in record else record['data']['id'])
+                self._records.pop(key, None)  # keep the newest record last
+                self._records[key] = record
+            self._sequences = sequences
+            self._hold()
+            self._wake = True
+            self._cond.notify_all()
+
+    def submit_state(self, bikes, ranks, tickets, sequences, archived=None, save=True) -> None:
+        """
+        Hand over copies of the full state for the writer to keep, replacing every record queued before it:
+        bike dicts in inventory order with their positions, the ticket dicts kept in memory and a callable
+        yielding the archived ones (which never change). Later records are applied to it. save writes it.
+        """
+        with self._cond:
+            self._state = (bikes, ranks, tickets, archived, save)
+            self._sequences = sequences
+            self._records = {}
+            self._ranks = {}
+            if save:
+                self._hold()
+                self._wake = True
+                self._cond.notify_all()
+
+    def submit_snapshot(self, snapshot) -> None:
+        """Queue a full save; it replaces any older snapshot and every record queued before it."""
+        with self._cond:
+            self._snapshot = snapshot
+            self._records = {}
+            self._hold()
+            self._wake = True
+            self._cond.notify_all()
+
+    def _hold(self) -> None:
+        # under _cond, while the caller holds file_lock
+        if self.file_lock is not None:
+            self.file_lock.hold()
+            self._holds += 1
+
+    @property
+    def snapshot_pending(self) -> bool:
+        """Return True while a full save is queued but not written yet."""
+        return self._snapshot is not None
+
+    def pending(self) -> bool:
+        """Return True if anything is queued or being written."""
+        with self._cond:
+            return self._busy or self._has_work()
+
+    def _has_work(self) -> bool:
+        return self._snapshot is not None or bool(self._records) or self._unsaved or (
+            self._state is not None and self._state[-1])
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._wake and not self._closed:
+                    self._cond.wait()
+                if self._closed and (not self._has_work() or self.error is not None):
+                    return
+                self._wake = False
+                self._busy = True
+
+                # let a burst of changes pile up into one write, unless someone is waiting for it
+                if self.delay:
+                    self._cond.wait_for(lambda: self._flushing or self._closed, self.delay)
+                if not self._has_work():  # a state without save waits for the records that follow it
+                    self._busy = False
+                    self._cond.notify_all()
+                    continue
+                snapshot, self._snapshot = self._snapshot, None
+                state, self._state = self._state, None
+                records, self._records = self._records, {}
+                ranks, self._ranks = self._ranks, {}
+                holds, self._holds = self._holds, 0
+                self._unsaved = False
+                sequences = self._sequences
+            try:
+                if state is not None:
+                    self._mirror = _Mirror(*state[:-1])
+                if snapshot is not None:
+                    self.storage.save_all(*snapshot)
+                if self._mirror is not None:
+                    self._mirror.apply(records.values(), ranks)
+                    self.storage.save_all(*self._mirror.snapshot(sequences))
+                elif records:
+                    self.storage.apply(list(records.values()), sequences)
+            except Exception as e:
+                with self._cond:
+                    # keep the failed work for the next attempt, unless something newer replaced it
+                    if self._mirror is not None:
+                        self._unsaved = True  # the records are in the mirror already
+                    elif self._snapshot is None:
+                        self._snapshot = snapshot
+                        self._records = {**records, **self._records}
+                    self._holds += holds  # other processes still mustn't read the files without it
+                    self.error = e
+                    self._busy = False
+                    self._cond.notify_all()
+                self.events.put(('error', e))
+            else:
+                with self._cond:
+                    self.error = None
+                    self.write_count += 1
+                    self._busy = False
+                    self._cond.notify_all()
+                if holds:
+                    self.file_lock.unhold(holds)
+                self.events.put(('done', self.write_count))
+
+    def flush(self, timeout=None) -> bool:
+        """
+        Write everything queued and wait for it. Re-raises the error if the write fails.
+        Returns False if the timeout ran out first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if not self._busy and not self._has_work():
+                return True  # don't send the writer through an idle round
+            self._wake = True
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                while self._busy or self._has_work():
+                    if self.error is not None and not self._busy and not self._wake:
+                        raise self.error
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._flushing -= 1
+        return True
+
+    def poll(self, on_done=None, on_error=None) -> None:
+        """Deliver queued outcomes on the calling thread."""
+        while True:
+            try:
+                kind, value = self.events.get_nowait()
+            except queue.Empty:
+                return
+            callback = on_done if kind == 'done' else on_error
+            if callback is not None:
+                callback(value)
+
+    def close(self) -> None:
+        """Flush everything, then stop the worker thread."""
+        try:
+            self.flush()
+        finally:
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+            self._thread.join()
+            if self._holds:
+                # unwritten after a failure; leaving the files locked would block the other processes for good
+                self.file_lock.unhold(self._holds)
+                self._holds = 0
+
+
+class _Mirror:
+    """The BackgroundWriter's own copy of the full state, updated from change records."""
+
+    def __init__(self, bikes, ranks, tickets, archived):
+        self.bikes = {b['id']: b for b in bikes}
+        self.ranks = ranks
+        self.tickets = {t['id']: t for t in tickets}
+        self.archived = archived
+
+    def apply(self, records, ranks) -> None:
+        for record in records:
+            if record['op'] == 'bike':
+                self.bikes[record['data']['id']] = record['data']
+                self.ranks[record['data']['id']] = ranks[record['data']['id']]
+            elif record['op'] == 'remove_bike':
+                self.bikes.pop(record['id'], None)
+                self.ranks.pop(record['id'], None)
+            elif record['op'] == 'ticket':
+                self.tickets[record['data']['id']] = record['data']
+
+    def snapshot(self, sequences) -> tuple[list[dict], object, dict]:
+        """Return (bike dicts, ticket dicts, sequence values) for storage.save_all()."""
+        bikes = sorted(self.bikes.values(), key=lambda b: self.ranks[b['id']])
+        tickets = self.tickets.values()
+        if self.archived is not None:
+            tickets = itertools.chain(self.archived(), tickets)
+        return bikes, tickets, sequences
@@ -0,0 +1,125 @@
+# latency and throughput of the HTTP API
+#
+# usage: python bench_api.py [seconds] [connections] [host:port]
+# each connection is a keep-alive client looping over: rent a random bike, look at the available bikes
+# and the summary report, return the bike. Without host:port a server is started over a temp directory.
+
+import asyncio
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from api_server import MANAGER_OPTIONS, ApiService, format_message, read_message
+from bike import Bike
+from rental_manager import RentalManager
+
+
+class Client:
+    """One keep-alive HTTP connection."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, payload=None) -> tuple[int, object]:
+        """Send one request and return (status, JSON payload)."""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(format_message(f'{method} {path} HTTP/1.1', payload, headers=[f'Host: {self.host}']))
+        await self.writer.drain()
+        message = await read_message(self.reader)
+        if message is None:
+            raise ConnectionError("Server closed the connection")
+        status_line, headers, body = message
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return int(status_line.split(' ')[1]), json.loads(body) if body else None
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+async def load(host, port, seconds, connections) -> tuple[dict[str, list[float]], int]:
+    """Return the latencies in ms per kind of request, and how many requests failed."""
+    latencies = {}
+    failures = 0
+    bike_ids = [b['id'] for b in (await Client(host, port).request('GET', '/bikes'))[1]]
+    deadline = time.perf_counter() + seconds
+
+    async def timed(client, kind, method, path, payload=None):
+        nonlocal failures
+        start = time.perf_counter()
+        status, body = await client.request(method, path, payload)
+        latencies.setdefault(kind, []).append((time.perf_counter() - start) * 1000)
+        if status >= 500:
+            failures += 1
+        return status, body
+
+    async def desk(n):
+        rng = random.Random(n)
+        client = Client(host, port)
+        customer = {'name': f'api desk {n}', 'phone': '555-0100'}
+        while time.perf_counter() < deadline:
+            status, ticket = await timed(client, 'rent', 'POST', '/tickets',
+                                         {'customer': customer, 'bike_id': rng.choice(bike_ids), 'hours': 1})
+            await timed(client, 'available', 'GET', '/bikes?status=available')
+            await timed(client, 'summary', 'GET', '/reports/summary')
+            if status == 201:
+                customer['id'] = ticket['customer']['id']
+                await timed(client, 'return', 'POST', f"/tickets/{ticket['id']}/close")
+        client.close()
+
+    await asyncio.gather(*(desk(n) for n in range(connections)))
+    return latencies, failures
+
+
+async def run(seconds, connections, address=None, bikes=50, **options) -> tuple[dict[str, list[float]], int]:
+    """Run the load against address ('host:port'), or against a fresh server over a temp directory."""
+    if address is not None:
+        host, port = address.rsplit(':', 1)
+        return await load(host, int(port), seconds, connections)
+
+    with tempfile.TemporaryDirectory() as directory:
+        manager = RentalManager(inventory_file=f'{directory}/inventory.json', tickets_file=f'{directory}/tickets.json',
+                                sequences_file=f'{directory}/sequences.json', journal_file=f'{directory}/journal.jsonl',
+                                database_file=f'{directory}/rental.db', **options)
+        for i in range(1, bikes + 1):
+            manager.add_bike(Bike(id=i, make='Trek', model='FX 2', hourly_rate=10.0))
+        service = ApiService(manager)
+        server = await service.start('127.0.0.1', 0)
+        try:
+            return await load('127.0.0.1', server.sockets[0].getsockname()[1], seconds, connections)
+        finally:
+            await service.close()
+            manager.close()
+
+
+def percentile(values, p) -> float:
+    return statistics.quantiles(values, n=100, method='inclusive')[p - 1] if len(values) > 1 else values[0]
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    connections = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    address = sys.argv[3] if len(sys.argv) > 3 else None
+
+    # the configuration api_server.py runs with
+    options = {} if address else MANAGER_OPTIONS
+    latencies, failures = asyncio.run(run(seconds, connections, address, **options))
+    total = sum(len(values) for values in latencies.values())
+    print(f"{connections} connections, {seconds}s: {total / seconds:.0f} requests/s, {failures} failed")
+    print(f"{'request':<10} {'count':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for kind, values in latencies.items():
+        print(f"{kind:<10} {len(values):>7} {percentile(values, 50):8.2f} {percentile(values, 99):8.2f}")
+    every = [v for values in latencies.values() for v in values]
+    print(f"{'all':<10} {len(every):>7} {percentile(every, 50):8.2f} {percentile(every, 99):8.2f}")
+
+
+if __name__ == '__main__':
+    main()
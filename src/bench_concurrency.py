@@ -0,0 +1,81 @@
+# rentals per second with several terminals sharing one manager
+#
+# usage: python bench_concurrency.py [seconds] [bikes]
+# each thread is a front desk renting a random bike and returning it; renting a bike another desk
+# holds fails with "Bike not available". At the end every bike must have at most one open ticket.
+
+import random
+import sys
+import tempfile
+import threading
+import time
+from bike import Bike
+from customer import Customer
+from rental_manager import RentalManager
+
+
+def check_no_double_booking(manager) -> None:
+    """Raise AssertionError if any bike has more than one open ticket or the books don't add up."""
+    open_per_bike = {}
+    for ticket in manager.get_all_tickets():
+        if ticket.status == 'active':
+            open_per_bike[ticket.bike['id']] = open_per_bike.get(ticket.bike['id'], 0) + 1
+    doubles = {bike_id: n for bike_id, n in open_per_bike.items() if n > 1}
+    assert not doubles, f"bikes rented twice: {doubles}"
+    assert set(open_per_bike) == {b.id for b in manager.list_rented_bikes()}, "rented bikes and open tickets differ"
+    assert manager.total_active_rentals() == len(open_per_bike), "active rental count is off"
+
+
+def run(threads, seconds, bikes, **options) -> tuple[int, int]:
+    """Return (rentals, conflicts) made by threads desks in the given time."""
+    with tempfile.TemporaryDirectory() as directory:
+        manager = RentalManager(inventory_file=f'{directory}/inventory.json', tickets_file=f'{directory}/tickets.json',
+                                sequences_file=f'{directory}/sequences.json', journal_file=f'{directory}/journal.jsonl',
+                                database_file=f'{directory}/rental.db', **options)
+        for i in range(1, bikes + 1):
+            manager.add_bike(Bike(id=i, make='Trek', model='FX 2', hourly_rate=10.0))
+
+        counts = [[0, 0] for _ in range(threads)]  # per desk: rentals, conflicts
+        deadline = time.perf_counter() + seconds
+
+        def desk(n):
+            rng = random.Random(n)
+            customer_id = None
+            while time.perf_counter() < deadline:
+                try:
+                    customer = Customer(id=customer_id, name=f'desk {n}', phone='555-0100')
+                    ticket = manager.create_ticket(customer, rng.randint(1, bikes), 1)
+                    customer_id = customer.id
+                except ValueError:
+                    counts[n][1] += 1
+                    continue
+                counts[n][0] += 1
+                manager.close_ticket(ticket.id)
+
+        workers = [threading.Thread(target=desk, args=(n,)) for n in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        check_no_double_booking(manager)
+        manager.close()
+    return sum(c[0] for c in counts), sum(c[1] for c in counts)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    bikes = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    print(f"{bikes} bikes, {seconds}s per run")
+    print(f"{'mode':<8} {'fsync':<7} {'writer':<7} {'desks':>5} {'rentals/s':>10} {'conflicts':>10}")
+    for storage_mode, fsync, background_writes in (('journal', 'never', False), ('journal', 'always', False),
+                                                   ('journal', 'always', True), ('sqlite', 'always', False)):
+        for threads in (1, 2, 4, 8):
+            rentals, conflicts = run(threads, seconds, bikes, storage_mode=storage_mode, fsync=fsync,
+                                     background_writes=background_writes)
+            print(f"{storage_mode:<8} {fsync:<7} {str(background_writes):<7} {threads:>5} "
+                  f"{rentals / seconds:10.0f} {conflicts:>10}")
+
+
+if __name__ == '__main__':
+    main()
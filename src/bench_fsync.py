@@ -0,0 +1,67 @@
+# write latency per storage mode and fsync policy
+#
+# usage: python bench_fsync.py [changes] [existing_tickets]
+# every change is one add_bike(); the JSON mode rewrites all existing tickets each time,
+# so keep existing_tickets small there or expect it to take a while.
+
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from bike import Bike
+from durable import FSYNC_POLICIES
+from rental_manager import RentalManager
+from storage import JsonStorage, migrate_json_to_sqlite
+
+
+def seed_tickets(count) -> list[dict]:
+    """Closed tickets to give the snapshot files a realistic size."""
+    start = datetime(2024, 1, 1)
+    return [{'id': i, 'bike': {'id': 1, 'make': 'Trek', 'model': 'FX 2', 'hourly_rate': 10.0, 'status': 'available'},
+             'customer': {'id': i, 'name': f'customer {i}', 'phone': '555-0100'},
+             'start_time': (start + timedelta(minutes=i)).isoformat(), 'planned_hours': 1,
+             'end_time': (start + timedelta(minutes=i + 60)).isoformat(), 'total_fee': 10.0,
+             'status': 'closed', 'system_notes': '', 'personal_notes': ''}
+            for i in range(1, count + 1)]
+
+
+def run(storage_mode, fsync, changes, tickets) -> list[float]:
+    """Return the latency of each change in milliseconds."""
+    with tempfile.TemporaryDirectory() as directory:
+        files = dict(inventory_file=f'{directory}/inventory.json', tickets_file=f'{directory}/tickets.json',
+                     sequences_file=f'{directory}/sequences.json', journal_file=f'{directory}/journal.jsonl',
+                     database_file=f'{directory}/rental.db')
+        JsonStorage(files['inventory_file'], files['tickets_file'], files['sequences_file'], fsync='never').save_all(
+            [], tickets, {})
+        if storage_mode == 'sqlite':
+            migrate_json_to_sqlite(files['database_file'], files['inventory_file'], files['tickets_file'],
+                                   files['sequences_file'], files['journal_file'])
+
+        manager = RentalManager(storage_mode=storage_mode, fsync=fsync, compact_every=changes + 1, **files)
+        latencies = []
+        for _ in range(changes):
+            bike = Bike(id=manager.next_bike_id(), make='Trek', model='FX 2')
+            start = time.perf_counter()
+            manager.add_bike(bike)
+            latencies.append((time.perf_counter() - start) * 1000)
+        manager.close()
+        return latencies
+
+
+def main():
+    changes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    tickets = seed_tickets(int(sys.argv[2]) if len(sys.argv) > 2 else 1000)
+
+    print(f"{changes} changes on top of {len(tickets)} tickets, latency in ms")
+    print(f"{'mode':<8} {'fsync':<8} {'mean':>8} {'p50':>8} {'p99':>8} {'max':>8}")
+    for storage_mode in ('json', 'journal', 'sqlite'):
+        for fsync in FSYNC_POLICIES:
+            latencies = sorted(run(storage_mode, fsync, changes, tickets))
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            print(f"{storage_mode:<8} {fsync:<8} {statistics.mean(latencies):8.3f} "
+                  f"{statistics.median(latencies):8.3f} {p99:8.3f} {latencies[-1]:8.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# load / save time of the json and binary snapshot formats
+#
+# usage: python bench_snapshot.py [tickets]
+
+import os
+import sys
+import tempfile
+import time
+from bench_fsync import seed_tickets
+from rental_manager import RentalManager
+from storage import JsonStorage
+
+
+def best_of(runs, func) -> float:
+    """Return the fastest of a few runs, in seconds."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    tickets = seed_tickets(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
+
+    print(f"{len(tickets)} tickets, best of 3 in seconds")
+    print(f"{'format':<8} {'load':>8} {'save':>8} {'size MB':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for snapshot_format in ('json', 'binary'):
+            files = dict(inventory_file=f'{directory}/inventory.json', tickets_file=f'{directory}/tickets.json',
+                         sequences_file=f'{directory}/sequences.json', snapshot_file=f'{directory}/rental.snap')
+            JsonStorage(**files, fsync='never', snapshot_format=snapshot_format).save_all([], tickets, {})
+
+            manager = None
+            def load():
+                nonlocal manager
+                manager = RentalManager(snapshot_format=snapshot_format, fsync='never', **files)
+            load_time = best_of(3, load)
+            save_time = best_of(3, manager.save_data)
+
+            paths = [files['snapshot_file']] if snapshot_format == 'binary' else [files['inventory_file'], files['tickets_file']]
+            size = sum(os.path.getsize(path) for path in paths) / 1e6
+            print(f"{snapshot_format:<8} {load_time:8.3f} {save_time:8.3f} {size:8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,21 @@
+from sys import intern
+
+
 class Bike:
+    # slots instead of a per-bike __dict__; make/model/status strings are shared across bikes
+    __slots__ = ('id', 'make', 'model', 'status', 'rented_by', 'hourly_rate')
+
     def __init__(self, id, make, model, status='available', rented_by=None, hourly_rate=5.0):
         self.id = id
-        self.make = make
-        self.model = model
-        self.status = status
+        self.make = intern(make) if type(make) is str else make
+        self.model = intern(model) if type(model) is str else model
+        self.status = intern(status) if type(status) is str else status
         self.rented_by = rented_by
         self.hourly_rate = hourly_rate
 
+    def to_dict(self) -> dict:
+        """Return the bike as a plain dict (the JSON/storage shape)."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
     def __repr__(self):
-        return f"Bike({self.id}, {self.make}, {self.model}, {self.status}, {self.rented_by}, ${self.hourly_rate}/hr)"
\ No newline at end of file
+        return f"Bike({self.id}, {self.make}, {self.model}, {self.status}, {self.rented_by}, ${self.hourly_rate}/hr)"
@@ -0,0 +1,226 @@
+# binary snapshot format, an alternative to inventory.json + tickets.json + sequences.json
+#
+# layout (little endian):
+#   header     magic, version, section count, bike count, ticket count
+#   directory  one (name, offset, length) entry per section
+#   sections   'meta'           JSON: {'sequences': {...}, 'ticket_fields': [...], 'header_fields': [...]}
+#              'bikes'          JSON: list of bike dicts
+#              'ticket_headers' fixed-width rows (HEADER_ROW), readable through mmap without parsing anything
+#              'ticket.<field>' JSON: one list per Ticket field, in ticket order
+#
+# The fields in header_fields (id, status, total_fee when every ticket's value fits the header row exactly)
+# are only stored in the header table, and loaded from it. Everything else is JSON, which reads the same
+# on every Python version. Version 1 snapshots kept their sections in marshal; they are still read, and
+# the next save writes version 2.
+
+import json
+import marshal
+import mmap
+import struct
+from ticket_store import iso_to_micros
+
+MAGIC = b'BIKESNAP'
+VERSION = 2
+MARSHAL_VERSIONS = (1,)  # snapshot versions whose sections are marshal
+
+HEADER = struct.Struct('<8sHHqq')  # magic, version, section count, bike count, ticket count
+DIRECTORY_ENTRY = struct.Struct('<32sqq')  # section name, offset, length
+
+# id, start, end (epoch microseconds), total fee, bike id, customer id, status
+HEADER_ROW = struct.Struct('<qqqdqqq')
+NO_VALUE = -(1 << 63)  # a header field that isn't a plain int / timestamp, or an open ticket's end time
+STATUS_CODES = {'active': 0, 'closed': 1}  # anything else is stored as -1
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+# ticket field -> place in HEADER_ROW, for the fields the header table can hold exactly
+HEADER_COLUMNS = {'id': 0, 'total_fee': 3, 'status': 6}
+HEADER_FITS = {
+    'id': lambda value: type(value) is int and NO_VALUE < value < -NO_VALUE,
+    'total_fee': lambda value: type(value) is float,
+    'status': lambda value: value in STATUS_CODES,
+}
+
+
+def _int_or_none(value) -> int:
+    return value if type(value) is int and NO_VALUE < value < -NO_VALUE else NO_VALUE
+
+
+def _micros_or_none(iso_str) -> int:
+    try:
+        return iso_to_micros(iso_str)
+    except (TypeError, ValueError):
+        return NO_VALUE
+
+
+def header_row(ticket: dict) -> bytes:
+    """Pack the fixed-width header of one ticket dict."""
+    fee = ticket['total_fee']
+    return HEADER_ROW.pack(_int_or_none(ticket['id']), _micros_or_none(ticket['start_time']),
+                           _micros_or_none(ticket['end_time']),
+                           float(fee) if type(fee) in (int, float) else float('nan'),
+                           _int_or_none(ticket['bike'].get('id')), _int_or_none(ticket['customer'].get('id')),
+                           STATUS_CODES.get(ticket['status'], -1))
+
+
+def _dumps(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def write_snapshot(file, bikes, tickets, sequences) -> None:
+    """Write a snapshot to a binary file; every ticket dict must have the same fields."""
+    bikes = list(bikes)
+    tickets = list(tickets)
+    fields = list(tickets[0]) if tickets else []
+    if any(t.keys() != tickets[0].keys() for t in tickets):
+        raise ValueError("Tickets with different fields can't be written to one snapshot")
+    header_fields = [name for name in HEADER_COLUMNS
+                     if name in fields and all(HEADER_FITS[name](t[name]) for t in tickets)]
+    meta = {'sequences': dict(sequences), 'ticket_fields': fields, 'header_fields': header_fields}
+    sections = [
+        ('meta', _dumps(meta)),
+        ('bikes', _dumps(bikes)),
+        ('ticket_headers', b''.join(header_row(t) for t in tickets)),
+    ]
+    for name in fields:
+        if name not in header_fields:
+            sections.append(('ticket.' + name, _dumps([t[name] for t in tickets])))
+
+    offset = HEADER.size + DIRECTORY_ENTRY.size * len(sections)
+    directory = []
+    for name, data in sections:
+        offset += -offset % 8  # keep sections 8-byte aligned for memoryview.cast
+        directory.append(DIRECTORY_ENTRY.pack(name.encode(), offset, len(data)))
+        offset += len(data)
+
+    file.write(HEADER.pack(MAGIC, VERSION, len(sections), len(bikes), len(tickets)))
+    file.write(b''.join(directory))
+    position = HEADER.size + DIRECTORY_ENTRY.size * len(sections)
+    for name, data in sections:
+        file.write(b'\0' * (-position % 8))
+        position += -position % 8
+        file.write(data)
+        position += len(data)
+
+
+class SnapshotReader:
+    """Memory-mapped view of a snapshot file; sections are only parsed when asked for."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            try:
+                self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError(f"{path} is empty")
+        try:
+            self.sections = self._read_directory()
+        except BaseException:
+            self.map.close()
+            raise
+
+    def _read_directory(self) -> dict[str, tuple[int, int]]:
+        if len(self.map) < HEADER.size:
+            raise ValueError(f"{self.path} is truncated")
+        magic, self.version, section_count, self.bike_count, self.ticket_count = HEADER.unpack_from(self.map)
+        if magic != MAGIC or not (self.version == VERSION or self.version in MARSHAL_VERSIONS):
+            raise ValueError(f"{self.path} is not a version {VERSION} snapshot")
+
+        sections = {}
+        for i in range(section_count):
+            name, offset, length = DIRECTORY_ENTRY.unpack_from(self.map, HEADER.size + i * DIRECTORY_ENTRY.size)
+            if offset + length > len(self.map):
+                raise ValueError(f"{self.path} is truncated")
+            sections[name.rstrip(b'\0').decode()] = (offset, length)
+        return sections
+
+    def section(self, name) -> memoryview:
+        """Return the raw bytes of a section without copying them."""
+        offset, length = self.sections[name]
+        return memoryview(self.map)[offset:offset + length]
+
+    def load(self, name):
+        """Parse a section."""
+        try:
+            if self.version in MARSHAL_VERSIONS:
+                return marshal.loads(self.section(name))
+            return json.loads(str(self.section(name), 'utf-8'))
+        except (EOFError, TypeError, ValueError) as e:
+            raise ValueError(f"{self.path}: damaged section {name}") from e
+
+    def meta(self) -> dict:
+        return self.load('meta')
+
+    def bikes(self) -> list[dict]:
+        return self.load('bikes')
+
+    def ticket_columns(self) -> dict[str, list]:
+        """Return field name -> list of values, in ticket order."""
+        meta = self.meta()
+        header_fields = meta.get('header_fields', [])
+        headers = list(self.ticket_headers()) if header_fields else []
+        if len(headers) != (self.ticket_count if header_fields else 0):
+            raise ValueError(f"{self.path}: the ticket headers don't match the ticket count")
+        columns = {}
+        for name in meta['ticket_fields']:
+            if name not in header_fields:
+                columns[name] = self.load('ticket.' + name)
+                continue
+            column = [row[HEADER_COLUMNS[name]] for row in headers]
+            if name == 'status':
+                if not set(column) <= STATUS_NAMES.keys():
+                    raise ValueError(f"{self.path}: damaged section ticket_headers")
+                column = [STATUS_NAMES[code] for code in column]
+            columns[name] = column
+        if any(len(column) != self.ticket_count for column in columns.values()):
+            raise ValueError(f"{self.path}: ticket columns don't match the ticket count")
+        return columns
+
+    def ticket_headers(self):
+        """Yield (id, start, end, total_fee, bike_id, customer_id, status code) per ticket, NO_VALUE where unknown."""
+        section = self.section('ticket_headers')
+        if len(section) % HEADER_ROW.size:
+            raise ValueError(f"{self.path}: damaged section ticket_headers")
+        return HEADER_ROW.iter_unpack(section)
+
+    def close(self) -> None:
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_snapshot(path) -> tuple[list[dict], list[dict], dict]:
+    """Return (bike dicts, ticket dicts, sequence values) from a snapshot file."""
+    with SnapshotReader(path) as reader:
+        meta = reader.meta()
+        columns = reader.ticket_columns()
+        bikes = reader.bikes()
+    names = list(columns)
+    tickets = [dict(zip(names, row)) for row in zip(*columns.values())]
+    return bikes, tickets, meta['sequences']
+
+
+def read_snapshot_objects(path, bike_cls, ticket_cls) -> tuple[list, list, dict]:
+    """
+    Like read_snapshot(), but return model objects. Tickets skip __init__: their fields are set
+    column by column, which is most of the speed-up over json.loads + Ticket(**data).
+    """
+    with SnapshotReader(path) as reader:
+        meta = reader.meta()
+        columns = reader.ticket_columns()
+        bikes = [bike_cls(**b) for b in reader.bikes()]
+
+    if set(columns) != set(ticket_cls.FIELDS):
+        tickets = [ticket_cls(**dict(zip(columns, row))) for row in zip(*columns.values())]
+        return bikes, tickets, meta['sequences']
+
+    new = ticket_cls.__new__
+    tickets = [new(ticket_cls) for _ in range(reader.ticket_count)]
+    for name, column in columns.items():
+        setter = getattr(ticket_cls, name).__set__
+        for ticket, value in zip(tickets, column):
+            setter(ticket, value)
+    return bikes, tickets, meta['sequences']
@@ -1,8 +1,14 @@
 class Customer:
+    __slots__ = ('id', 'name', 'phone')
+
     def __init__(self, id, name, phone):
         self.id = id
         self.name = name
         self.phone = phone
 
+    def to_dict(self) -> dict:
+        """Return the customer as a plain dict (the shape embedded in tickets)."""
+        return {"id": self.id, "name": self.name, "phone": self.phone}
+
     def __repr__(self):
-        return f"Customer({self.id}, {self.name}, {self.phone})"
\ No newline at end of file
+        return f"Customer({self.id}, {self.name}, {self.phone})"
@@ -0,0 +1,120 @@
+# crash-safe file writes shared by the storage backends
+#
+# every snapshot file is written to <name>.tmp, fsync'd (depending on the policy) and renamed over
+# <name>; the file it replaces is kept as <name>.bak, so there is always one complete copy to recover from.
+
+import json
+import os
+import shutil
+import time
+
+FSYNC_POLICIES = ('always', 'batched', 'never')
+
+
+class FsyncPolicy:
+    """When to fsync: 'always' after every write, 'batched' at most once per interval seconds, 'never'."""
+
+    def __init__(self, policy='always', interval=1.0):
+        if policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {policy}")
+        self.policy = policy
+        self.interval = interval
+        self.last_sync = 0.0
+
+    def due(self) -> bool:
+        """Return True if the write that just happened should be fsync'd now."""
+        if self.policy == 'always':
+            return True
+        if self.policy == 'never':
+            return False
+        now = time.monotonic()
+        if now - self.last_sync >= self.interval:
+            self.last_sync = now
+            return True
+        return False
+
+    def __repr__(self):
+        return f"FsyncPolicy({self.policy!r}, interval={self.interval})"
+
+
+def fsync_dir(path) -> None:
+    """Make a rename in path's directory durable (a no-op where directories can't be opened)."""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_atomic(path, write, sync=True, binary=False) -> None:
+    """
+    Replace path with what write(file) writes, keeping the old file as path + '.bak'.
+    Readers see either the old or the new file, never a half-written one.
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb' if binary else 'w') as file:
+        write(file)
+        if sync:
+            file.flush()
+            os.fsync(file.fileno())
+
+    if os.path.exists(path):
+        backup_path = path + '.bak'
+        try:
+            os.remove(backup_path)
+        except FileNotFoundError:
+            pass
+        try:
+            os.link(path, backup_path)  # path never goes missing, unlike a rename
+        except OSError:
+            shutil.copyfile(path, backup_path)
+    os.replace(tmp_path, path)
+    if sync:
+        fsync_dir(path)
+
+
+def restore_backup(path) -> bool:
+    """Put path + '.bak' back in place of a damaged path; return False if there is no backup."""
+    backup_path = path + '.bak'
+    if not os.path.exists(backup_path):
+        return False
+    tmp_path = path + '.tmp'
+    shutil.copyfile(backup_path, tmp_path)
+    os.replace(tmp_path, path)
+    return True
+
+
+def read_json(path):
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def load_json(path, default=None, recovered=None):
+    """
+    Load a JSON file written by write_atomic, falling back to its backup if it is damaged.
+    Returns default if neither exists; recovered paths are appended to the recovered list.
+    """
+    return load_recovering(path, read_json, default, recovered)
+
+
+def load_recovering(path, read, default=None, recovered=None):
+    """Return read(path), restoring path from its backup first if read raises ValueError."""
+    try:
+        return read(path)
+    except FileNotFoundError:
+        if not os.path.exists(path + '.bak'):
+            return default
+    except ValueError:
+        pass
+
+    # damaged or missing: go back to the last good snapshot
+    if not restore_backup(path):
+        raise ValueError(f"{path} is damaged and has no backup")
+    if recovered is not None:
+        recovered.append(path)
+    return read(path)
@@ -0,0 +1,97 @@
+# advisory lock file shared by every process (and thread) using the same data files
+#
+# fcntl.flock locks belong to an open file, not a thread, so the threads of one process
+# take a normal lock first and only the outermost holder locks the file.
+
+import threading
+
+try:
+    import fcntl
+except ImportError:  # e.g. Windows: threads still exclude each other, other processes are not seen
+    fcntl = None
+
+
+class FileLock:
+    """
+    Exclusive, reentrant advisory lock on path (created if missing).
+
+    hold() keeps the file locked for this process after its threads have released it, until a matching
+    unhold(): a BackgroundWriter holds it for changes it hasn't written yet, so no other process can read the
+    files in between. generation counts the times the file was locked afresh; while it stays the same, no other
+    process can have written since.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._state = threading.Lock()  # guards the file lock itself; unhold() must not wait for _thread_lock
+        self._depth = 0
+        self._holds = 0
+        self._locked = False
+        self._file = None
+        self.generation = 0
+
+    def acquire(self) -> None:
+        self._thread_lock.acquire()
+        if self._depth:
+            self._depth += 1
+            return
+        try:
+            with self._state:
+                self._lock_file()
+                self._depth = 1
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+    def release(self) -> None:
+        if self._depth > 1:
+            self._depth -= 1
+        else:
+            with self._state:
+                self._depth = 0
+                if not self._holds:
+                    self._unlock_file()
+        self._thread_lock.release()
+
+    def hold(self) -> None:
+        """Keep the file locked after every thread releases it, until unhold(). Call it while holding the lock."""
+        with self._state:
+            self._lock_file()
+            self._holds += 1
+
+    def unhold(self, count=1) -> None:
+        """Give back count hold()s; the file is unlocked once none are left and no thread holds it."""
+        with self._state:
+            self._holds -= count
+            if not self._holds and not self._depth:
+                self._unlock_file()
+
+    def _lock_file(self) -> None:
+        if self._locked:
+            return
+        if fcntl is not None:
+            if self._file is None:
+                self._file = open(self.path, 'a')
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        self._locked = True
+        self.generation += 1
+
+    def _unlock_file(self) -> None:
+        if self._locked and fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._locked = False
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def close(self) -> None:
+        """Close the lock file; the lock must not be held."""
+        with self._thread_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -10,27 +10,40 @@
 
 
 from datetime import datetime
+from tkinter import filedialog
 from tkinter import messagebox
 from tkinter import ttk
 
 import random
 import tkinter
 import re
+import threading
 import sv_ttk
 import rental_manager
 import customer
 import bike
 import math
+from ticket_export import export_tickets
+from virtual_list import Column, VirtualList
 
 class BikeRentalApp:
+    WRITER_POLL_MS = 100
+    SEARCH_DEBOUNCE_MS = 150  # type-ahead waits this long after the last key press
+    SYNC_MS = 2000  # how often changes made by other open windows are picked up
+    EXPORT_POLL_MS = 200  # how often a running export is checked for completion
+
     def __init__(self, root):
         self.root = root
         
         # variables
         self.delete_clicks = 0
+        self.search_job = None  # pending type-ahead search, see schedule_search
+        self.export_thread = None  # running ticket export, see export_tickets
         
-        # initialize the rental manager
-        self.rental_backend = rental_manager.RentalManager()
+        # initialize the rental manager, file writes happen on its background writer thread;
+        # several windows (processes) can have the same files open, each change is locked and synced,
+        # and the journal lets them pass each other just the changed records
+        self.rental_backend = rental_manager.RentalManager(storage_mode='journal', background_writes=True, shared_files=True)
 
         # title
         self.root.title("Bluegrass Bicycle Company - Bike Rental Ticket System")
@@ -63,6 +76,11 @@ class BikeRentalApp:
         # Setup the initial view
         self.main_page()
 
+        # write results come back through the Tk event loop, and everything is flushed on exit
+        self.root.after(self.WRITER_POLL_MS, self.poll_writer)
+        self.root.after(self.SYNC_MS, self.poll_changes)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
     # helper functions
 
     def create_label(self, parent, text, **pack_kwargs):
@@ -278,6 +296,45 @@ class BikeRentalApp:
         submit_full_reports = ttk.Button(reports_frame, text="Full Reports", command=lambda: self.submit_reports(all_reports=True))
         submit_full_reports.pack(pady=10)
 
+        export_button = ttk.Button(reports_frame, text="Export Tickets...", command=self.export_tickets)
+        export_button.pack(pady=10)
+
+    def export_tickets(self):
+        """
+        Export every ticket to a CSV or JSON Lines file (gzipped if the name ends in .gz) for accounting.
+        """
+        path = filedialog.asksaveasfilename(title="Export Tickets", defaultextension=".csv",
+                                            filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl"),
+                                                       ("Gzipped CSV", "*.csv.gz"), ("Gzipped JSON Lines", "*.jsonl.gz")])
+        if not path:
+            return
+        if self.export_thread is not None and self.export_thread.is_alive():
+            self.raise_error("An export is already running.")
+            return
+
+        # a long history takes a while, so the export runs on its own thread and only reports back through Tk
+        outcome = {}
+        def run():
+            try:
+                outcome['count'] = export_tickets(self.rental_backend, path)
+            except (OSError, ValueError) as e:
+                outcome['error'] = e
+        self.export_thread = threading.Thread(target=run, name='ticket-export', daemon=True)
+        self.export_thread.start()
+        self.raise_response(f"Exporting tickets to {path}...")
+        self.root.after(self.EXPORT_POLL_MS, self.poll_export, path, outcome)
+
+    def poll_export(self, path, outcome):
+        """
+        Report the running export once its thread is done, else check again later.
+        """
+        if self.export_thread.is_alive():
+            self.root.after(self.EXPORT_POLL_MS, self.poll_export, path, outcome)
+        elif 'error' in outcome:
+            self.raise_error(f"Could not export tickets: {outcome['error']}")
+        else:
+            self.raise_response(f"Exported {outcome['count']} tickets to {path}.")
+
     # submit functions
     def submit_new_ticket(self, customer_name_entry, customer_phone_entry, bike_selection_var, rental_hours_entry, personal_notes_entry):
         """
@@ -341,13 +398,13 @@ class BikeRentalApp:
                     return
                 
                 if ticket.end_time != "":
-                    self.raise_response(f"Bike ID {ticket.bike['id']} has already been returned on {self.iso_to_datetime(ticket.end_time)}.")
+                    self.raise_response(f"Bike ID {ticket.bike['id']} has already been returned on {self.format_datetime(ticket.end_datetime)}.")
                     return
                 
                 returned_ticket = self.rental_backend.close_ticket(ticket_id)
 
                 response_txt_label = f"Bike ID {returned_ticket.bike['id']} returned successfully.\n"\
-                                     f"Total Fee: ${returned_ticket.total_fee} for {math.ceil((datetime.fromisoformat(returned_ticket.end_time) - datetime.fromisoformat(returned_ticket.start_time)).total_seconds() / 3600)} hours rented."
+                                     f"Total Fee: ${returned_ticket.total_fee} for {math.ceil(returned_ticket.hours_rented())} hours rented."
                 print("Bike returned:", returned_ticket)
                 self.raise_response(response_txt_label)
 
@@ -383,7 +440,7 @@ class BikeRentalApp:
                 txt = ""
 
                 for ticket in tickets:
-                    txt += f"Ticket ID: {ticket.id}, Bike ID: {ticket.bike['id']}, \nRented by {ticket.customer['name']} with phone {ticket.customer['phone']}, \nStart Time: {self.iso_to_datetime(ticket.start_time)}, Planned Hours: {ticket.planned_hours}\n\n"
+                    txt += f"Ticket ID: {ticket.id}, Bike ID: {ticket.bike['id']}, \nRented by {ticket.customer['name']} with phone {ticket.customer['phone']}, \nStart Time: {self.format_datetime(ticket.start_datetime)}, Planned Hours: {ticket.planned_hours}\n\n"
 
                 tickets_label = ttk.Label(scrollable_content, text=txt, justify="left")
                 tickets_label.pack(pady=10)
@@ -393,7 +450,7 @@ class BikeRentalApp:
                     ticket_to_return = tickets[0]
                     returned_ticket = self.rental_backend.close_ticket(ticket_to_return.id)
                     response_txt_label = f"Bike ID {returned_ticket.bike['id']} returned successfully.\n"\
-                                        f"Total Fee: ${returned_ticket.total_fee} for {math.ceil((datetime.fromisoformat(returned_ticket.end_time) - datetime.fromisoformat(returned_ticket.start_time)).total_seconds() / 3600)} hours rented."
+                                        f"Total Fee: ${returned_ticket.total_fee} for {math.ceil(returned_ticket.hours_rented())} hours rented."
                     print("Bike returned:", returned_ticket)    
 
                     self.raise_response(response_txt_label)
@@ -422,6 +479,7 @@ class BikeRentalApp:
         stats_frame.pack(pady=5)
         
         ttk.Label(stats_frame, text=f"Total Active Rentals: {total_rentals} | Total Revenue: ${total_rentals_revenue}").pack()
+        ttk.Label(stats_frame, text=f"Current Charges if Returned Now: ${self.rental_backend.total_current_charges()}").pack()
 
         # search controls
         search_frame = ttk.Frame(self.right_frame)
@@ -440,12 +498,21 @@ class BikeRentalApp:
 
         ttk.Label(self.right_frame, text="Ticket List:", width=64, anchor="center").pack(pady=5)
 
-        # create scrollable frame for results
-        self.report_scroll_content = self.create_scrollable_frame(self.right_frame)
-        
-        # label to hold the list text
-        self.report_list_label = ttk.Label(self.report_scroll_content, text="", justify="left")
-        self.report_list_label.pack(pady=10)
+        # paged table of results, click a heading to sort
+        self.report_list = VirtualList(self.right_frame, [
+            Column("Ticket ID", 70, lambda t: t.id),
+            Column("Customer", 140, lambda t: t.customer['name'], lambda t: str(t.customer['name']).casefold()),
+            Column("Phone", 100, lambda t: t.customer['phone']),
+            Column("Bike", 160, lambda t: f"{t.bike['id']}: {t.bike['make']} {t.bike['model']}", lambda t: t.bike['id']),
+            Column("Rate", 60, lambda t: f"${t.bike['hourly_rate']}/hr", lambda t: t.bike['hourly_rate']),
+            Column("Start Time", 140, lambda t: self.format_datetime(t.start_datetime), lambda t: t.start_datetime),
+            Column("Planned Hours", 90, lambda t: t.planned_hours),
+            Column("Actual Hours", 90, lambda t: math.ceil(t.hours_rented())),
+            Column("Returned at", 140, lambda t: self.format_datetime(t.end_datetime) if t.end_time != "" else "Currently Rented Out"),
+            Column("Total Fee", 80, lambda t: f"${t.total_fee}", lambda t: t.total_fee),
+            Column("System Notes", 300, lambda t: t.system_notes),
+            Column("Personal Notes", 200, lambda t: t.personal_notes),
+        ])
 
         # perform initial empty search to load the list
         self.perform_report_search("")
@@ -454,52 +521,12 @@ class BikeRentalApp:
         """
         Filters reports based on query and current mode (Active/All).
         """
-        active_tickets = self.rental_backend.get_all_tickets()
-        reports_str = ""
-        
-        query = query.lower()
-
-        # iterate through tickets
-        matches_found = False
-        for ticket in active_tickets:
-            # 1. filter by Mode (Active vs All)
-            if not self.report_mode_all and ticket.end_time != "":
-                continue
-
-            # 2. filter by Search Query
-            # check if query matches Customer Name OR Ticket ID
-            if query:
-                if (query not in ticket.customer['name'].lower()) and (query not in str(ticket.id)):
-                    continue
-
-            matches_found = True
-            
-            # 3. calculate time logic
-            hours_passed = 0
-            if ticket.end_time == "":
-                passed_time = datetime.now() - datetime.fromisoformat(ticket.start_time)
-                hours_passed = passed_time.total_seconds() / 3600
-            else:
-                passed_time = datetime.fromisoformat(ticket.end_time) - datetime.fromisoformat(ticket.start_time)
-                hours_passed = passed_time.total_seconds() / 3600
-
-            # 4. build string
-            reports_str += f"\nBike ID: {ticket.bike['id']}, {ticket.bike['make']} {ticket.bike['model']}, Rate: ${ticket.bike['hourly_rate']}/hr\n"\
-                        f"Rented by {ticket.customer['name']} (Phone: {ticket.customer['phone']})\n"\
-                        f"Ticket ID: {ticket.id}, Start Time: {self.iso_to_datetime(ticket.start_time)}\n"\
-                        f"Planned Hours: {ticket.planned_hours}, Actual Hours: {math.ceil(hours_passed)}\n"\
-                        f"System Notes: {ticket.system_notes}\n"\
-                        f"Personal Notes: {ticket.personal_notes}\n"
-            
-            if ticket.end_time != "":
-                reports_str += f"Returned at: {self.iso_to_datetime(ticket.end_time)}, Total Fee: ${ticket.total_fee}\n\n"
-            else:
-                reports_str += "Currently Rented Out\n\n"
-
-        if not matches_found:
-            reports_str = "No tickets found matching your criteria."
+        # filter by Mode (Active vs All) and by the search index: name, phone, ticket ID, bike, notes
+        ticket_ids = self.rental_backend.search_ticket_ids(query, active_only=not self.report_mode_all)
 
-        self.report_list_label.config(text=reports_str)
+        # tickets are only looked up for the page on screen
+        tickets = (t for t in map(self.rental_backend.get_ticket, ticket_ids) if t is not None)
+        self.report_list.show(tickets, total=len(ticket_ids), empty_text="No tickets found matching your criteria.")
 
     def submit_view_inventory(self):
         """
@@ -523,6 +550,9 @@ class BikeRentalApp:
         search_button = ttk.Button(search_frame, text="Filter", command=lambda: self.perform_inventory_search(search_entry.get()))
         search_button.pack(side="left", padx=5)
 
+        # filter as you type
+        search_entry.bind("<KeyRelease>", lambda event: self.schedule_search(lambda: self.perform_inventory_search(search_entry.get())))
+
         # reset
         reset_button = ttk.Button(search_frame, text="Show All", command=lambda: search_entry.delete(0, 'end') or self.perform_inventory_search(""))
         reset_button.pack(side="left", padx=5)
@@ -530,15 +560,15 @@ class BikeRentalApp:
         self.inventory_subtitle = ttk.Label(self.right_frame, text="Viewing All Bikes", width=64, anchor="center")
         self.inventory_subtitle.pack(pady=5)
 
-        # create a scrollable frame for the inventory list
-        # we store the scrollable frame in self so we can reference it if needed, 
-        # though strictly we just need to update the label inside it.
-        self.inventory_scroll_content = self.create_scrollable_frame(self.right_frame)
-
-        # create the label that will hold the text. We keep a reference (self.inventory_list_label)
-        # so the search function can update its text config later.
-        self.inventory_list_label = ttk.Label(self.inventory_scroll_content, text="", justify="left")
-        self.inventory_list_label.pack(pady=10)
+        # paged table of bikes, click a heading to sort. We keep a reference (self.inventory_list)
+        # so the search function can show its results later.
+        self.inventory_list = VirtualList(self.right_frame, [
+            Column("Bike ID", 80, lambda b: b.id),
+            Column("Make", 160, lambda b: b.make, lambda b: str(b.make).casefold()),
+            Column("Model", 160, lambda b: b.model, lambda b: str(b.model).casefold()),
+            Column("Rate", 80, lambda b: f"${b.hourly_rate}/hr", lambda b: b.hourly_rate),
+            Column("Status", 100, lambda b: b.status),
+        ])
 
         # populate initially with all bikes
         self.perform_inventory_search("")
@@ -551,34 +581,15 @@ class BikeRentalApp:
         """
         Filters inventory list based on query and updates the display label.
         """
-        # get full list from backend
-        all_bikes = self.rental_backend.list_inventory()
-        
-        # filter Logic
-        if not query:
-            filtered_bikes = all_bikes
+        # search by ID, Make, or Model through the backend's bike index
+        filtered_bikes = self.rental_backend.search_bikes(query)
+        if not query.strip():
             self.inventory_subtitle.config(text="Viewing All Bikes")
         else:
-            query = query.lower()
-            # search by ID, Make, or Model
-            filtered_bikes = [
-                b for b in all_bikes 
-                if query in str(b.id).lower() or 
-                   query in b.make.lower() or 
-                   query in b.model.lower()
-            ]
             self.inventory_subtitle.config(text=f"Search Results for '{query}'")
 
-        # build the display string
-        inventory_str = ""
-        if not filtered_bikes:
-            inventory_str = "No bikes found matching your criteria."
-        else:
-            for bike in filtered_bikes:
-                inventory_str += f"Bike ID: {bike.id}, \n{bike.make} {bike.model}, \nRate: ${bike.hourly_rate}/hr, \nStatus: {bike.status}\n\n"
-
         # Update the UI
-        self.inventory_list_label.config(text=inventory_str)
+        self.inventory_list.show(filtered_bikes, empty_text="No bikes found matching your criteria.")
 
     def submit_add_bike(self):
         """
@@ -641,7 +652,7 @@ class BikeRentalApp:
         bike_model = model_entry.get()
         bike_hourly_rate = float(hourly_rate_entry.get())
 
-        bike_id = len(self.rental_backend.inventory) + 1
+        bike_id = self.rental_backend.next_bike_id()
         new_bike = bike.Bike(id=bike_id, make=bike_make, model=bike_model, rented_by=None, hourly_rate=bike_hourly_rate)
 
         # add bike to backend
@@ -764,10 +775,12 @@ class BikeRentalApp:
         # update bike in backend
         try:
             old_val = f"Bike ID {bike.id} - {bike.make} {bike.model}"
-            bike = self.rental_backend.set_bike_status(bike_id, 'make', make_entry.get())
-            bike = self.rental_backend.set_bike_status(bike_id, 'model', model_entry.get())
-            bike = self.rental_backend.set_bike_status(bike_id, 'status', status_dropdown.get())
-            bike = self.rental_backend.set_bike_status(bike_id, 'hourly_rate', float(hourly_rate_entry.get()))
+            # one save for all four fields
+            with self.rental_backend.transaction():
+                bike = self.rental_backend.set_bike_status(bike_id, 'make', make_entry.get())
+                bike = self.rental_backend.set_bike_status(bike_id, 'model', model_entry.get())
+                bike = self.rental_backend.set_bike_status(bike_id, 'status', status_dropdown.get())
+                bike = self.rental_backend.set_bike_status(bike_id, 'hourly_rate', float(hourly_rate_entry.get()))
             
             print("Bike updated:", bike)
             
@@ -795,9 +808,27 @@ class BikeRentalApp:
         """
         Clear the right frame to navigate to a new page.
         """
+        self.cancel_search()
         for widget in self.right_frame.winfo_children():
             widget.destroy()
 
+    def schedule_search(self, search):
+        """
+        Run search once typing pauses for SEARCH_DEBOUNCE_MS, dropping the one scheduled by the previous key press.
+        """
+        self.cancel_search()
+        self.search_job = self.root.after(self.SEARCH_DEBOUNCE_MS, self.run_search, search)
+
+    def run_search(self, search):
+        self.search_job = None
+        search()
+
+    def cancel_search(self):
+        """Drop a pending type-ahead search, e.g. when its page is closed."""
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+            self.search_job = None
+
     def raise_response(self, message):
         """
         Raise a response message in the response frame.
@@ -823,11 +854,42 @@ class BikeRentalApp:
         for widget in self.response_frame.winfo_children():
             widget.destroy()
 
-    def iso_to_datetime(self, iso_str):
+    def poll_writer(self):
+        """
+        Report finished or failed background saves, then check again later.
+        """
+        self.rental_backend.writer.poll(on_error=lambda e: self.raise_error(f"Could not save changes: {e}"))
+        self.root.after(self.WRITER_POLL_MS, self.poll_writer)
+
+    def poll_changes(self):
+        """
+        Pick up changes other windows saved meanwhile, then check again later.
+        """
+        try:
+            self.rental_backend.sync_changes()
+        except (OSError, ValueError) as e:
+            self.raise_error(f"Could not load changes: {e}")
+        self.root.after(self.SYNC_MS, self.poll_changes)
+
+    def on_close(self):
+        """
+        Write any pending changes before the window closes.
+        """
+        try:
+            self.rental_backend.writer.flush()
+        except Exception as e:
+            if not messagebox.askyesno("Save failed", f"Could not save changes: {e}\nQuit anyway?"):
+                return
+        try:
+            self.rental_backend.close()
+        finally:
+            self.root.destroy()
+
+    def format_datetime(self, value):
         """
-        Convert ISO string to readable datetime.
+        Format a ticket datetime for display.
         """
-        return datetime.fromisoformat(iso_str).strftime("%Y-%m-%d %H:%M:%S")
+        return value.strftime("%Y-%m-%d %H:%M:%S")
 
     def create_scrollable_frame(self, parent):
         """
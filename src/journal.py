@@ -0,0 +1,218 @@
+import json
+import os
+import shutil
+import threading
+from durable import FsyncPolicy
+
+
+class Journal:
+    """
+    Append-only log of inventory and ticket mutations, one JSON record per line.
+
+    Records are whole-object upserts ("bike", "ticket") or deletions ("remove_bike"),
+    so replaying them on top of any older snapshot always ends at the latest state.
+    """
+
+    def __init__(self, path, fsync=None):
+        self.path = path
+        self.compacting_path = path + '.compacting'
+        self.fsync = fsync or FsyncPolicy('always')
+        self.file = None
+        self.record_count = 0
+        self.unsynced = False  # appended records the OS may still be holding in its cache
+        # group commit, see sync_through()
+        self._sync_cond = threading.Condition()
+        self._appended = 0  # appends so far
+        self._synced = 0  # appends known to be on disk
+        self._syncing = False
+        # how far into the live log this process has read or written, to pick up other processes' appends
+        self.inode = None  # of the live log, None if there was none
+        self.position = 0
+
+    def replay(self):
+        """Yield every record, oldest first: a half-finished compaction, then the live log."""
+        # another process may have rotated the log under an open file, appends reopen it
+        self.close()
+        self.inode, self.position = None, 0
+        self.record_count = 0
+        for path in (self.compacting_path, self.path):
+            try:
+                with open(path, 'rb') as file:
+                    if path == self.path:
+                        self.inode = os.fstat(file.fileno()).st_ino
+                    for line in file:
+                        if path == self.path and line.endswith(b'\n'):
+                            self.position += len(line)
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            # torn line from a crash mid-append
+                            continue
+                        if path == self.path:
+                            self.record_count += 1
+                        yield record
+            except FileNotFoundError:
+                continue
+
+    def read_new(self) -> None | list[dict]:
+        """
+        Return the records other processes appended to the live log since this one last read or wrote it,
+        or None if the log was rotated meanwhile and everything has to be read again.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None if self.inode is not None else []
+        if self.inode is not None and (stat.st_ino != self.inode or stat.st_size < self.position):
+            return None
+        if stat.st_size == self.position:
+            return []
+
+        records = []
+        with open(self.path, 'rb') as file:
+            self.inode = os.fstat(file.fileno()).st_ino
+            file.seek(self.position)
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break  # still being written
+                self.position += len(line)
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+        self.record_count += len(records)
+        return records
+
+    def has_leftover_compaction(self) -> bool:
+        """Return True if a previous compaction never finished."""
+        return os.path.exists(self.compacting_path)
+
+    def open(self) -> None:
+        """Open the live log for appending."""
+        if self.file is None:
+            self._trim_torn_tail()
+            self.file = open(self.path, 'a')
+            self._mark()
+
+    def _trim_torn_tail(self) -> None:
+        """Cut off a last line left half written by a crash, so the next record doesn't run into it."""
+        try:
+            with open(self.path, 'rb+') as file:
+                end = position = file.seek(0, os.SEEK_END)
+                while position > 0:
+                    step = min(4096, position)
+                    file.seek(position - step)
+                    newline = file.read(step).rfind(b'\n')
+                    position -= step
+                    if newline >= 0:
+                        position += newline + 1
+                        break
+                if position < end:
+                    # the torn record was never acknowledged, replay skips it anyway
+                    file.truncate(position)
+        except FileNotFoundError:
+            pass
+
+    def _mark(self) -> None:
+        """Remember the end of the live log as read: this process wrote it or has caught up with it."""
+        self.file.flush()
+        stat = os.fstat(self.file.fileno())
+        self.inode, self.position = stat.st_ino, stat.st_size
+
+    def append(self, records, sync=True) -> None | int:
+        """
+        Append one or more records, flush them to the OS and fsync them if the policy says so.
+        With sync=False a due fsync is left to the caller: the append's number is returned for sync_through().
+        """
+        self.open()
+        self.file.write(''.join(json.dumps(r) + '\n' for r in records))
+        self._mark()
+        self.record_count += len(records)
+        self.unsynced = True
+        with self._sync_cond:
+            self._appended += 1
+            number = self._appended
+        if not self.fsync.due():
+            return None
+        if not sync:
+            return number
+        self.sync_through(number)
+        return None
+
+    def sync_through(self, number) -> None:
+        """
+        Wait until append number (from append(sync=False)) is on disk. Group commit: appends made while
+        another thread's fsync runs share the next fsync, instead of each waiting for one of their own.
+        Callers must not hold the lock that orders the appends, or there is nothing to share.
+        """
+        while True:
+            with self._sync_cond:
+                while self._syncing and self._synced < number:
+                    self._sync_cond.wait()
+                if self._synced >= number:
+                    return
+                self._syncing = True
+                target = self._appended
+                fd = os.dup(self.file.fileno())  # stays valid if the log is closed or rotated meanwhile
+            synced = False
+            try:
+                os.fsync(fd)
+                synced = True
+            finally:
+                os.close(fd)
+                with self._sync_cond:
+                    self._syncing = False
+                    if synced:
+                        self._synced = max(self._synced, target)
+                    self._sync_cond.notify_all()
+
+    def sync(self) -> None:
+        """fsync the live log."""
+        if self.file is not None and self.unsynced:
+            with self._sync_cond:
+                target = self._appended
+            os.fsync(self.file.fileno())
+            self.unsynced = False
+            with self._sync_cond:
+                self._synced = max(self._synced, target)
+                self._sync_cond.notify_all()
+
+    def rotate(self) -> None:
+        """Move the live log aside for compaction and start a fresh one."""
+        self.close()
+        if os.path.exists(self.compacting_path) and os.path.exists(self.path):
+            # an earlier compaction never finished, keep its records in front of ours
+            with open(self.compacting_path, 'a') as out, open(self.path, 'r') as live:
+                out.write('\n')  # in case its last line was torn
+                shutil.copyfileobj(live, out)
+                if self.fsync.policy != 'never':
+                    out.flush()
+                    os.fsync(out.fileno())
+            os.remove(self.path)
+        elif os.path.exists(self.path):
+            os.replace(self.path, self.compacting_path)
+        self.record_count = 0
+        self.open()
+
+    def finish_compaction(self) -> None:
+        """Drop the rotated log once its records are part of a snapshot."""
+        try:
+            os.remove(self.compacting_path)
+        except FileNotFoundError:
+            pass
+
+    def reset(self) -> None:
+        """Drop every record; the caller has just written a full snapshot."""
+        self.close()
+        self.finish_compaction()
+        open(self.path, 'w').close()
+        self.record_count = 0
+        self.inode, self.position = os.stat(self.path).st_ino, 0
+
+    def close(self) -> None:
+        """Close the live log file, syncing it unless the policy is 'never'."""
+        if self.file is not None:
+            if self.fsync.policy != 'never':
+                self.sync()
+            self.file.close()
+            self.file = None
@@ -0,0 +1,134 @@
+# rental fee rules
+# the defaults reproduce the original close_ticket arithmetic: planned hours rounded up times the hourly rate,
+# plus a pro-rated late fee of (hours over plan) * rate * late_fee_rate.
+
+import math
+from typing import NamedTuple
+
+try:
+    import numpy
+except ImportError:  # optional, quote_batch works on plain lists without it
+    numpy = None
+
+ROUNDING_POLICIES = ('ceil', 'quarter', 'exact')
+
+
+class Quote(NamedTuple):
+    base_fee: float  # billable planned hours * rate
+    late_hours: float  # hours over plan, before rounding
+    late_fee: float
+    total: float  # base + late, capped
+    rate: float  # hourly rate after the time-of-day multiplier
+
+
+def round_hours(hours: float, policy: str) -> float:
+    """Round billable hours: 'ceil' to whole hours, 'quarter' up to 15 minutes, 'exact' not at all."""
+    if policy == 'ceil':
+        return math.ceil(hours)
+    if policy == 'quarter':
+        return math.ceil(hours * 4) / 4
+    return hours
+
+
+def round_column(hours, policy: str) -> list:
+    """round_hours over a whole column of hours."""
+    if policy == 'ceil':
+        return list(map(math.ceil, hours))
+    if policy == 'quarter':
+        return [math.ceil(h * 4) / 4 for h in hours]
+    return list(hours)
+
+
+class PricingRules:
+    """
+    Configurable fee rules.
+
+    late_fee_rate   multiplier on the hourly rate for hours past the plan
+    planned_rounding / late_rounding   'ceil', 'quarter' or 'exact', see round_hours
+    max_fee         cap on the total fee, None for no cap
+    time_of_day     (from_hour, to_hour, multiplier) ranges applied to the rate by the hour a rental starts,
+                    e.g. [(17, 24, 1.25)] for evening rentals; to_hour is exclusive
+    """
+
+    def __init__(self, late_fee_rate=1.0, planned_rounding='ceil', late_rounding='exact', max_fee=None, time_of_day=()):
+        for policy in (planned_rounding, late_rounding):
+            if policy not in ROUNDING_POLICIES:
+                raise ValueError(f"Unknown rounding policy: {policy}")
+        self.late_fee_rate = late_fee_rate
+        self.planned_rounding = planned_rounding
+        self.late_rounding = late_rounding
+        self.max_fee = max_fee
+        self.hour_multipliers = [1.0] * 24
+        for from_hour, to_hour, multiplier in time_of_day:
+            if not 0 <= from_hour < to_hour <= 24:
+                raise ValueError(f"Invalid time-of-day range: {from_hour}-{to_hour}")
+            for hour in range(from_hour, to_hour):
+                self.hour_multipliers[hour] = multiplier
+
+    def quote(self, planned_hours: float, hourly_rate: float, hours_rented: float, start_hour=None) -> Quote:
+        """Price one rental."""
+        rate = hourly_rate if start_hour is None else hourly_rate * self.hour_multipliers[start_hour]
+        base_fee = round_hours(planned_hours, self.planned_rounding) * rate
+        late_hours = 0
+        late_fee = 0
+        if hours_rented > planned_hours:
+            late_hours = hours_rented - planned_hours
+            late_fee = round_hours(late_hours, self.late_rounding) * rate * self.late_fee_rate
+        total = base_fee + late_fee
+        if self.max_fee is not None:
+            total = min(total, self.max_fee)
+        return Quote(base_fee, late_hours, late_fee, total, rate)
+
+    def quote_batch(self, planned_hours, hourly_rates, hours_rented, start_hours=None, use_numpy=None) -> list[float]:
+        """
+        Price many rentals at once; returns the totals rounded to cents, the way close_ticket stores them.
+        Works a column at a time, on numpy arrays when numpy is installed (or use_numpy=True), on lists otherwise.
+        Both give exactly what quote() gives for each rental.
+        """
+        if use_numpy is None:
+            use_numpy = numpy is not None
+        if use_numpy and numpy is None:
+            raise ValueError("use_numpy needs numpy installed")
+        totals = (self._numpy_totals if use_numpy else self._list_totals)(planned_hours, hourly_rates, hours_rented, start_hours)
+        # round like Python's round(), so batch quotes match the fee close_ticket charges to the cent
+        return [round(total, 2) for total in totals]
+
+    def _list_totals(self, planned_hours, hourly_rates, hours_rented, start_hours) -> list[float]:
+        planned = list(planned_hours)
+        rates = list(hourly_rates)
+        if start_hours is not None:
+            multipliers = self.hour_multipliers
+            rates = [rate * multipliers[hour] for rate, hour in zip(rates, start_hours)]
+
+        base = [billable * rate for billable, rate in zip(round_column(planned, self.planned_rounding), rates)]
+        # 0 for rentals that aren't late, which keeps their total at the base fee like quote()
+        late = round_column([h - p if h > p else 0 for h, p in zip(hours_rented, planned)], self.late_rounding)
+        late_fee_rate = self.late_fee_rate
+        totals = [fee + billable * rate * late_fee_rate if billable else fee for fee, billable, rate in zip(base, late, rates)]
+        if self.max_fee is not None:
+            max_fee = self.max_fee
+            totals = [min(total, max_fee) for total in totals]
+        return totals
+
+    def _numpy_totals(self, planned_hours, hourly_rates, hours_rented, start_hours) -> list[float]:
+        planned = numpy.asarray(planned_hours, dtype=float)
+        rates = numpy.asarray(hourly_rates, dtype=float)
+        hours = numpy.asarray(hours_rented, dtype=float)
+        if start_hours is not None:
+            rates = rates * numpy.asarray(self.hour_multipliers)[numpy.asarray(start_hours, dtype=int)]
+
+        base = self._round_array(planned, self.planned_rounding) * rates
+        late_hours = numpy.where(hours > planned, hours - planned, 0.0)
+        late = numpy.where(hours > planned, self._round_array(late_hours, self.late_rounding) * rates * self.late_fee_rate, 0.0)
+        total = base + late
+        if self.max_fee is not None:
+            total = numpy.minimum(total, self.max_fee)
+        return total.tolist()
+
+    @staticmethod
+    def _round_array(hours, policy):
+        if policy == 'ceil':
+            return numpy.ceil(hours)
+        if policy == 'quarter':
+            return numpy.ceil(hours * 4) / 4
+        return hours
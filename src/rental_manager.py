@@ -1,200 +1,910 @@
+import csv
 import json
+from contextlib import ExitStack, contextmanager
 from datetime import datetime
-import json
-import math
+import itertools
+import threading
+from background_writer import BackgroundWriter
 from bike import Bike
 from customer import Customer
 from ticket import Ticket
+from pricing import PricingRules
+from search_index import SearchIndex, tokenize
+from sequence import Sequence
+from storage import SEQUENCE_NAMES, JsonStorage, Storage, check_files_exist, make_storage
+from segments import SegmentedTicketArchive
+from ticket_store import ColumnarTicketArchive, MmapTicketArchive, TicketStore
 
-class RentalManager:
+class _TransactionState(threading.local):
+    """Open transaction of the current thread, see RentalManager.transaction()."""
 
     def __init__(self):
-        self.inventory = []  # list of Bike objects
-        self.tickets = {}  # dict: ticket_id -> Ticket
+        self.depth = 0
+        self.records = {}  # (kind, id) -> latest record, so repeated edits write once
+        self.undo = []  # callables that revert the in-memory changes, newest last
+
+
+class RentalManager:
+
+    def __init__(self, inventory_file='inventory.json', tickets_file='tickets.json', storage_mode='json', journal_file='journal.jsonl', compact_every=1000, sequences_file='sequences.json', database_file='rental.db', storage=None, lazy_history=False, columnar_history=False, background_writes=False, fsync='always', snapshot_format='json', snapshot_file='rental.snap', mmap_history=False, history_file='tickets.archive', segmented_history=False, segments_dir='segments', shared_files=False):
+        # several terminals can share one manager, see Locking
+        self.lock = threading.RLock()  # guards the in-memory state; held briefly, never during file I/O
+        self.storage_lock = threading.Lock()  # keeps storage writes in order
+        self.bike_locks = {}  # dict: bike_id -> RLock, held across a rental's check, change and write
+
+        self.inventory = []  # Bike objects, kept by id in self.bike_index in inventory order
+        self.tickets = {}  # dict: ticket_id -> Ticket, secondary indexes kept by _index_ticket
+
+        # storage_mode 'json' rewrites both files on every change,
+        # 'journal' appends one record per change and compacts into the JSON files now and then,
+        # 'sqlite' writes single rows to database_file. Any Storage object can be passed instead.
+        # fsync 'always' / 'batched' / 'never' trades durability for write speed, see durable.FsyncPolicy
+        # snapshot_format 'binary' keeps the json/journal snapshot in snapshot_file instead, see binary_snapshot.py
+        self.inventory_file = inventory_file
+        self.tickets_file = tickets_file
+        self.sequences_file = sequences_file
+        self.storage_mode = storage_mode
+        self.storage = storage or make_storage(storage_mode, inventory_file=inventory_file, tickets_file=tickets_file,
+                                               sequences_file=sequences_file, journal_file=journal_file,
+                                               compact_every=compact_every, database_file=database_file, fsync=fsync,
+                                               snapshot_format=snapshot_format, snapshot_file=snapshot_file)
+
+        # lazy_history: only open tickets are loaded as objects, closed ones are read from storage on demand
+        self.lazy_history = lazy_history
+        # columnar_history: closed tickets are loaded, but packed into arrays instead of Ticket objects
+        self.columnar_history = columnar_history
+        # mmap_history: closed tickets are moved out of storage into history_file and read back through mmap
+        self.mmap_history = mmap_history
+        self.history_file = history_file
+        # segmented_history: closed tickets are moved into per-month files in segments_dir,
+        # months older than seal_after_months are compressed and made read-only
+        self.segmented_history = segmented_history
+        self.segments_dir = segments_dir
+        self.seal_after_months = 2
+        self.fsync = fsync
+        if lazy_history + columnar_history + mmap_history + segmented_history > 1:
+            raise ValueError("Only one of lazy_history, columnar_history, mmap_history and segmented_history can be used")
+
+        # open transaction state, one per thread, see transaction()
+        self._txn = _TransactionState()
+
+        # shared_files: other processes (e.g. a second GUI) use the same files. Every change then holds the
+        # storage's file lock and starts by applying what the others stored meanwhile, see sync_changes()
+        self.shared_files = shared_files
+        if shared_files and self.storage.file_lock is None:
+            raise ValueError("This storage can't be shared between processes")
+        self._synced_generation = None  # file_lock.generation as of the last sync_changes() or load
+
+        # id allocators, restored in load_data
+        self.sequences = {name: Sequence() for name in SEQUENCE_NAMES}
+
+        # background_writes: storage writes run on a BackgroundWriter thread, see persist()
+        self.writer = None
         self.load_data()
+        if background_writes:
+            self.writer = BackgroundWriter(self.storage, file_lock=self.storage.file_lock if shared_files else None)
+            if not self.storage.incremental:
+                self.submit_state(save=False)
 
-        self.late_fee_rate = 1.0 # for PROD, this would be configurable
+        self.pricing = PricingRules(late_fee_rate=1.0) # for PROD, this would be configurable
 
     # --------------------
-    # JSON Persistence
+    # Persistence
     # --------------------
-    def load_data(self, inventory_file='inventory.json', tickets_file='tickets.json') -> None:
-        """Load bikes and tickets from JSON files."""
-        # check and create files if they don't exist
-        self.check_files_exist(inventory_file, tickets_file)
+    def storage_for(self, inventory_file=None, tickets_file=None) -> Storage:
+        """Return the configured storage, or plain JSON files if other file names are given."""
+        if inventory_file is None and tickets_file is None:
+            return self.storage
+        return JsonStorage(inventory_file or self.inventory_file, tickets_file or self.tickets_file, self.sequences_file)
 
-        # Load bikes
-        try:
-            with open(inventory_file, 'r') as file:
-                bikes_data = json.loads(file.read())
-                self.inventory = [Bike(**b) for b in bikes_data]
-        except FileNotFoundError:
-            self.inventory = []
+    def load_data(self, inventory_file=None, tickets_file=None) -> None:
+        """Load bikes and tickets from storage (the JSON files by default)."""
+        if self.shared_files:
+            with self.storage.file_lock:
+                self._load_data(inventory_file, tickets_file)
+                self._synced_generation = self.storage.file_lock.generation
+        else:
+            self._load_data(inventory_file, tickets_file)
 
-        # Load tickets
-        try:
-            with open(tickets_file, 'r') as file:
-                tickets_data = json.loads(file.read())
-                self.tickets = {t['id']: Ticket(**t) for t in tickets_data}
-        except FileNotFoundError:
-            self.tickets = {}
-
-    def save_data(self, inventory_file='inventory.json', tickets_file='tickets.json') -> None:
-        """Save bikes and tickets to JSON files."""
-        # check and create files if they don't exist
-        self.check_files_exist(inventory_file, tickets_file)
-
-        # save bikes
-        with open(inventory_file, 'w') as file:
-            json.dump([b.__dict__ for b in self.inventory], file, indent=4)
-        with open(tickets_file, 'w') as file:
-            json.dump([t.__dict__ for t in self.tickets.values()], file, indent=4)
+    def _load_data(self, inventory_file=None, tickets_file=None) -> None:
+        storage = self.storage_for(inventory_file, tickets_file)
+        if self.writer is not None:
+            self.writer.flush()
+        self.close_archive()
+        if self.lazy_history or self.columnar_history:
+            if self.lazy_history:
+                bikes_data, tickets_data, sequences, archive = storage.load_lazy()
+            else:
+                bikes_data, tickets_data, sequences = storage.load()
+                archive = ColumnarTicketArchive()
+                for t in sorted((t for t in tickets_data if t['end_time'] != ""), key=lambda t: t['id']):
+                    archive.add(t)
+                tickets_data = [t for t in tickets_data if t['end_time'] == ""]
+            bikes = [Bike(**b) for b in bikes_data]
+            tickets = [Ticket(**t) for t in tickets_data]
+        else:
+            bikes, tickets, sequences = storage.load_objects(Bike, Ticket)
+            archive = None
+            if self.mmap_history:
+                archive = MmapTicketArchive(self.history_file)
+            elif self.segmented_history:
+                archive = SegmentedTicketArchive(self.segments_dir)
+
+        tickets = {t.id: t for t in tickets}
+        with self.lock:
+            self.inventory = bikes
+            self.tickets = tickets if archive is None else TicketStore(tickets, archive, Ticket)
+            self.restore_sequences(sequences)
+
+        # e.g. a journal compaction was cut short last run
+        if storage.needs_compaction():
+            self.compact(wait=True)
+
+        if (self.mmap_history or self.segmented_history) and storage is self.storage:
+            self.archive_closed_tickets()
+        if self.writer is not None and not self.storage.incremental and storage is self.storage:
+            self.submit_state(save=False)
+
+    def restore_sequences(self, saved: dict) -> None:
+        """Restore the id allocators from saved values and the ids already in use."""
+        self.sequences = {name: Sequence(saved.get(name, 0)) for name in SEQUENCE_NAMES}
+
+        # ids can be handed in by callers, so never go below what is on disk
+        for b in self.inventory:
+            self.sequences['bike'].observe(b.id)
+        for t in self.in_memory_tickets():
+            self.sequences['ticket'].observe(t.id)
+            self.sequences['customer'].observe(t.customer['id'])
+        if isinstance(self.tickets, TicketStore):
+            self.sequences['ticket'].observe(self.tickets.summary['max_ticket_id'])
+            self.sequences['customer'].observe(self.tickets.summary['max_customer_id'])
+
+    def sequence_values(self) -> dict[str, int]:
+        """Return the last id handed out per sequence."""
+        return {name: seq.last for name, seq in self.sequences.items()}
+
+    def snapshot_state(self, copy=False) -> tuple[list[dict], list[dict], dict]:
+        """
+        Return (bike dicts, ticket dicts, sequence values) for a full save.
+        copy=True detaches them from the live objects, for writing on another thread;
+        without it the caller must hold self.lock until the tickets have been read.
+        """
+        if not copy:
+            return [b.to_dict() for b in self.inventory], (t.to_dict() for t in self.stored_tickets()), self.sequence_values()
+        with self.lock:
+            bikes = [b.to_dict() for b in self.inventory]
+            tickets = [t.to_dict() for t in self.in_memory_tickets()]
+            if isinstance(self.tickets, TicketStore) and not self.tickets.archive.stored_separately:
+                # archived tickets never change, the writer can stream them from the archive itself
+                tickets = itertools.chain(self.tickets.archive.iter_dicts(), tickets)
+            return bikes, tickets, self.sequence_values()
+
+    def submit_state(self, save=True) -> None:
+        """Hand the writer copies of the full state (storage without incremental writes), written if save."""
+        with self.lock:
+            archived = None
+            if isinstance(self.tickets, TicketStore) and not self.tickets.archive.stored_separately:
+                archived = self.tickets.archive.iter_dicts
+            self.writer.submit_state([b.to_dict() for b in self.inventory], dict(self.bike_rank),
+                                     [t.to_dict() for t in self.in_memory_tickets()],
+                                     self.sequence_values(), archived, save)
+
+    def stored_tickets(self):
+        """Tickets that belong in storage: all of them, except those kept in a separate archive file."""
+        if isinstance(self.tickets, TicketStore) and self.tickets.archive.stored_separately:
+            return self.tickets.hot.values()
+        return self.tickets.values()
+
+    def archive_closed_tickets(self) -> int:
+        """
+        Move closed in-memory tickets into the archive's own files (mmap_history / segmented_history),
+        then save storage without them. Returns how many tickets were moved.
+        """
+        store = self.tickets
+        if not isinstance(store, TicketStore) or not store.archive.stored_separately:
+            raise ValueError("Archiving closed tickets needs mmap_history or segmented_history")
+        closed = [t for t in store.hot.values() if t.end_time != "" and isinstance(t.id, int)]
+        if not closed:
+            return 0
+        if self._txn.depth:
+            raise ValueError("Can't archive tickets inside a transaction")
+
+        # the archive is written first: after a crash in between, the copy left in storage wins on load
+        archive = store.archive.extended([t.to_dict() for t in closed], self.fsync != 'never')
+
+        moved = {t.id for t in closed}
+        hot = {ticket_id: t for ticket_id, t in store.hot.items() if ticket_id not in moved}
+        self.tickets = TicketStore(hot, archive, Ticket)
+        store.close()
+        self.save_data()
+        if self.segmented_history:
+            self.seal_segments()
+        return len(closed)
+
+    def seal_segments(self, before=None) -> list[str]:
+        """
+        Compress the segments of months before 'YYYY-MM' (default: older than seal_after_months) and make them read-only.
+        Returns the sealed months.
+        """
+        if not self.segmented_history:
+            raise ValueError("Sealing segments needs segmented_history=True")
+        if before is None:
+            today = datetime.now()
+            month = today.year * 12 + today.month - 1 - (self.seal_after_months - 1)
+            before = f"{month // 12:04d}-{month % 12 + 1:02d}"
+        return self.tickets.archive.seal(before, self.fsync != 'never')
+
+    def save_data(self, inventory_file=None, tickets_file=None) -> None:
+        """Save bikes and tickets to storage (the JSON files by default)."""
+        if self.shared_files:
+            with self.storage.file_lock:
+                self._save_data(inventory_file, tickets_file)
+        else:
+            self._save_data(inventory_file, tickets_file)
+
+    def _save_data(self, inventory_file=None, tickets_file=None) -> None:
+        if self.writer is not None and inventory_file is None and tickets_file is None:
+            if not self.storage.incremental:
+                self.submit_state()
+            else:
+                with self.lock:  # taken and queued in one go, so no record queued meanwhile is older than it
+                    self.writer.submit_snapshot(self.snapshot_state(copy=True))
+            self.writer.flush()
+            return
+        with self.storage_lock, self.lock:
+            self.storage_for(inventory_file, tickets_file).save_all(*self.snapshot_state())
+
+    def persist(self, *records) -> None:
+        """Persist one mutation: hand its records to incremental storage, or save everything."""
+        if self._txn.depth:
+            # held back until the outermost transaction commits
+            for record in records:
+                kind = 'ticket' if record['op'] == 'ticket' else 'bike'
+                key = (kind, record['id'] if 'id' in record else record['data']['id'])
+                self._txn.records.pop(key, None)  # keep the newest record last
+                self._txn.records[key] = record
+            return
+
+        if not self.storage.incremental:
+            if self.writer is None:
+                self.save_data()
+                return
+            # the writer applies the records to its own copy of the state and saves that;
+            # failures arrive later through writer.poll()
+            with self.lock:
+                ranks = {r['data']['id']: self.bike_rank[r['data']['id']] for r in records if r['op'] == 'bike'}
+                self.writer.submit_records(records, self.sequence_values(), ranks)
+            return
+
+        # sequence values are read under the storage lock, so a later write never carries older ones
+        with self.storage_lock:
+            if self.writer is not None:
+                self.writer.submit_records(records, self.sequence_values())
+                if self.storage.needs_compaction() and not self.writer.snapshot_pending:
+                    self.compact()
+                return
+
+            token = self.storage.apply(records, self.sequence_values(), sync=False)
+            if self.storage.needs_compaction():
+                self.compact()
+        # fsync'd after the lock is released: what other threads write meanwhile shares the fsync (group commit)
+        self.storage.sync(token)
+
+    def compact(self, wait=False) -> None:
+        """Let the storage fold its incremental changes into a full copy (in the background unless wait)."""
+        if self.writer is not None:
+            # a full save through the writer keeps it ordered with the queued records;
+            # with shared files the writer keeps them locked until the snapshot is written
+            with self.lock:
+                self.writer.submit_snapshot(self.snapshot_state(copy=True))
+            if wait:
+                self.writer.flush()
+            return
+        # with shared files, the snapshot must be written before the file lock is released
+        self.storage.compact(lambda: self.snapshot_state(copy=True), wait=wait or self.shared_files)
+
+    def sync_changes(self) -> None | int:
+        """
+        Apply what other processes sharing the files have stored since this one last loaded or wrote them.
+        Returns the number of records applied, or None if everything had to be loaded again.
+        """
+        with self.storage.file_lock:
+            # the files stayed locked since this process last looked (the writer may still be appending
+            # to them), so nobody else can have written
+            generation = self.storage.file_lock.generation
+            if generation == self._synced_generation:
+                return 0
+            records = self.storage.changes()
+            if records is None:
+                self.load_data()
+                return None
+            with self.lock:
+                for record in records:
+                    self._apply_record(record)
+            self._synced_generation = generation
+            return len(records)
+
+    def _apply_record(self, record: dict) -> None:
+        """Apply one storage record written by another process to the in-memory state."""
+        if record['op'] == 'bike':
+            data = record['data']
+            bike = self.bike_index.get(data['id'])
+            if bike is None:
+                self._insert_bike(Bike(**data))
+                self.sequences['bike'].observe(data['id'])
+                return
+            for field, value in data.items():
+                if getattr(bike, field) != value:
+                    self._set_bike_field(bike, field, value)
+        elif record['op'] == 'remove_bike':
+            bike = self.bike_index.get(record['id'])
+            if bike is not None:
+                self._delete_bike(bike)
+        elif record['op'] == 'ticket':
+            ticket = Ticket(**record['data'])
+            self._store_ticket(ticket)
+            self.sequences['ticket'].observe(ticket.id)
+            self.sequences['customer'].observe(ticket.customer['id'])
+
+    def close(self) -> None:
+        """Finish background storage work and release files."""
+        if self.writer is not None:
+            self.writer.close()
+        self.storage.close()
+        if self.storage.file_lock is not None:
+            self.storage.file_lock.close()
+        self.close_archive()
+
+    def close_archive(self) -> None:
+        """Close the file behind lazily loaded tickets, if any."""
+        if isinstance(getattr(self, '_tickets', None), TicketStore):
+            self._tickets.close()
 
     def check_files_exist(self, inventory_file='inventory.json', tickets_file='tickets.json') -> bool:
         """Check if the JSON files exist."""
+        return check_files_exist(inventory_file, tickets_file)
+
+    @property
+    def late_fee_rate(self) -> float:
+        """Multiplier on the hourly rate for overdue hours (kept on self.pricing)."""
+        return self.pricing.late_fee_rate
+
+    @late_fee_rate.setter
+    def late_fee_rate(self, rate: float) -> None:
+        self.pricing.late_fee_rate = rate
+
+    # --------------------
+    # Transactions
+    # --------------------
+    @contextmanager
+    def transaction(self):
+        """
+        Group several mutations so they are persisted once, when the block exits.
+        If the block raises, every in-memory change made inside it is undone.
+        Nested transactions join the outermost one. Each thread has its own transaction;
+        open it before taking self.lock, so the records are written after the lock is released.
+        With shared_files the outermost one holds the file lock throughout and starts with sync_changes().
+        """
+        txn = self._txn
+        if txn.depth == 0 and self.shared_files:
+            self.storage.file_lock.acquire()
+            try:
+                self.sync_changes()
+            except BaseException:
+                self.storage.file_lock.release()
+                raise
+        txn.depth += 1
         try:
-            with open(inventory_file, 'r') as file:
-                pass
-            with open(tickets_file, 'r') as file:
-                pass
-            return True
-        except FileNotFoundError:
-            # create empty files
-            with open(inventory_file, 'w') as file:
-                json.dump([], file)
-
-            with open(tickets_file, 'w') as file:
-                json.dump([], file)
-            return False
+            try:
+                yield self
+            except BaseException:
+                txn.depth -= 1
+                if txn.depth == 0:
+                    self.rollback()
+                raise
+
+            txn.depth -= 1
+            if txn.depth == 0:
+                records = list(txn.records.values())
+                try:
+                    if records:
+                        self.persist(*records)  # a writer keeps the files locked until they are written
+                except BaseException:
+                    self.rollback()
+                    raise
+                txn.records = {}
+                txn.undo = []
+        finally:
+            if txn.depth == 0 and self.shared_files:
+                self.storage.file_lock.release()
+
+    def on_rollback(self, undo) -> None:
+        """Register how to revert an in-memory change if the open transaction fails."""
+        if self._txn.depth:
+            self._txn.undo.append(undo)
+
+    def rollback(self) -> None:
+        """Revert the in-memory changes of the open transaction and drop its records."""
+        txn = self._txn
+        undo_list, txn.undo = txn.undo, []
+        txn.records = {}
+        with self.lock:
+            for undo in reversed(undo_list):
+                undo()
+
+    # --------------------
+    # Locking
+    # --------------------
+    # a mutation takes, in this order: the lock of each bike it touches (held until its records are written,
+    # so two terminals can't both rent one bike and writes of one bike stay in order), then a transaction,
+    # then self.lock for the in-memory change only. Rentals of different bikes only share that short section,
+    # and storage writes are ordered by self.storage_lock, which is never taken while holding self.lock.
+    # With shared_files the storage's file lock stands in for every bike lock: other processes can't see ours.
+    def bike_lock(self, bike_id) -> threading.RLock:
+        """Return the lock of one bike, creating it on first use."""
+        if self.shared_files:
+            return self.storage.file_lock
+        lock = self.bike_locks.get(bike_id)
+        if lock is None:
+            lock = self.bike_locks.setdefault(bike_id, threading.RLock())  # atomic, so racing threads share one
+        return lock
+
+    @contextmanager
+    def lock_bikes(self, bike_ids):
+        """Hold the locks of several bikes, taken in one fixed order so two bulk changes can't deadlock."""
+        with ExitStack() as stack:
+            for bike_id in sorted(set(bike_ids), key=repr):
+                stack.enter_context(self.bike_lock(bike_id))
+            yield
 
     # --------------------
     # Bike Inventory
     # --------------------
+    @property
+    def inventory(self) -> list[Bike]:
+        """The bikes in insertion order, as a new list."""
+        return list(self.bike_index.values())
+
+    @inventory.setter
+    def inventory(self, bikes: list[Bike]) -> None:
+        # replacing the whole list rebuilds the id index with it
+        self.bike_index = {b.id: b for b in bikes}  # dict: bike_id -> Bike, in inventory order (dicts keep it)
+        self.bike_rank = {bike_id: i for i, bike_id in enumerate(self.bike_index)}  # bike_id -> place in that order
+        self.next_rank = len(self.bike_rank)
+        self.status_buckets = {}  # dict: status -> {bike_id: Bike}
+        self.bike_search = SearchIndex()  # make / model words -> bike ids, see search_bikes
+        for b in bikes:
+            self.status_buckets.setdefault(b.status, {})[b.id] = b
+            self.bike_search.add(b.id, (b.make, b.model))
+
+    def get_bike(self, bike_id: int) -> None | Bike:
+        """Return the bike with the given ID, or None."""
+        return self.bike_index.get(bike_id)
+
+    def _insert_bike(self, bike: Bike, rank=None) -> None:
+        """Add a bike at the end of the inventory, or back at a rank _delete_bike returned."""
+        if rank is None:
+            rank = self.next_rank
+            self.next_rank += 1
+        last = next(reversed(self.bike_index), None)
+        self.bike_index[bike.id] = bike
+        self.bike_rank[bike.id] = rank
+        if last is not None and self.bike_rank[last] > rank:
+            # back into its old place, only when undoing a removal or an id change
+            ordered = sorted(self.bike_index.values(), key=lambda b: self.bike_rank[b.id])
+            self.bike_index.clear()
+            self.bike_index.update((b.id, b) for b in ordered)
+        self.status_buckets.setdefault(bike.status, {})[bike.id] = bike
+        self.bike_search.add(bike.id, (bike.make, bike.model))
+
+    def _delete_bike(self, bike: Bike) -> int:
+        """Take a bike out of the inventory and its indexes, returning its rank for _insert_bike."""
+        del self.bike_index[bike.id]
+        del self.status_buckets[bike.status][bike.id]
+        self.bike_search.remove(bike.id, (bike.make, bike.model))
+        return self.bike_rank.pop(bike.id)
+
+    def _set_bike_field(self, bike: Bike, field: str, value) -> None:
+        """Set one bike attribute, moving the bike between status buckets and search entries if needed."""
+        if field == 'status' and value != bike.status:
+            del self.status_buckets[bike.status][bike.id]
+            self.status_buckets.setdefault(value, {})[bike.id] = bike
+        if field in ('make', 'model'):
+            self.bike_search.remove(bike.id, (bike.make, bike.model))
+            bike.__setattr__(field, value)
+            self.bike_search.add(bike.id, (bike.make, bike.model))
+            return
+        bike.__setattr__(field, value)
+
+    def next_bike_id(self) -> int:
+        """Allocate a fresh bike ID; IDs of deleted bikes are never reused."""
+        with self.lock:
+            return self.sequences['bike'].next()
+
     def add_bike(self, bike: Bike) -> None:
         """Add a new bike to the inventory."""
-        self.inventory.append(bike)
-        self.save_data()
+        with self.bike_lock(bike.id), self.transaction(), self.lock:
+            if bike.id in self.bike_index:
+                raise ValueError("Bike ID already in use")
+            self.sequences['bike'].observe(bike.id)
+            self._insert_bike(bike)
+            self.on_rollback(lambda: self._delete_bike(bike))
+            self.persist({'op': 'bike', 'data': bike.to_dict()})
+
+    def add_bikes(self, bikes) -> list[Bike]:
+        """Add many bikes in one write. Nothing is added if any ID is already in use or repeated."""
+        bikes = list(bikes)
+        with self.lock_bikes(b.id for b in bikes), self.transaction(), self.lock:
+            ids = set()
+            for bike in bikes:
+                if bike.id in self.bike_index or bike.id in ids:
+                    raise ValueError(f"Bike ID {bike.id} already in use")
+                ids.add(bike.id)
+
+            for bike in bikes:
+                self.sequences['bike'].observe(bike.id)
+                self._insert_bike(bike)
+            def undo():
+                for bike in bikes:
+                    self._delete_bike(bike)
+            self.on_rollback(undo)
+            self.persist(*({'op': 'bike', 'data': b.to_dict()} for b in bikes))
+        return bikes
+
+    def import_inventory_csv(self, path) -> list[Bike]:
+        """
+        Add the bikes listed in a CSV file with a header row: make and model, optionally id, status and hourly_rate.
+        Rows without an id get a new one. Every row is checked before any bike is added, and they are written once.
+        """
+        rows = []
+        with open(path, newline='') as file:
+            reader = csv.DictReader(file)
+            missing = {'make', 'model'} - set(reader.fieldnames or ())
+            if missing:
+                raise ValueError(f"{path}: missing column(s) {', '.join(sorted(missing))}")
+            for row in reader:
+                try:
+                    bike_id = int(row['id']) if (row.get('id') or '').strip() else None
+                    hourly_rate = float(row['hourly_rate']) if (row.get('hourly_rate') or '').strip() else 5.0
+                except ValueError:
+                    raise ValueError(f"{path} line {reader.line_num}: id and hourly_rate must be numbers")
+                if not (row['make'] or '').strip() or not (row['model'] or '').strip():
+                    raise ValueError(f"{path} line {reader.line_num}: make and model are required")
+                if hourly_rate < 0:
+                    raise ValueError(f"{path} line {reader.line_num}: hourly_rate can't be negative")
+                rows.append((bike_id, row['make'].strip(), row['model'].strip(), (row.get('status') or '').strip() or 'available', hourly_rate))
+
+        with self.lock:
+            # new IDs come after every ID in the file
+            for row in rows:
+                self.sequences['bike'].observe(row[0])
+            bikes = [Bike(id=bike_id if bike_id is not None else self.sequences['bike'].next(), make=make, model=model,
+                          status=status, hourly_rate=hourly_rate)
+                     for bike_id, make, model, status, hourly_rate in rows]
+        return self.add_bikes(bikes)
 
     def list_available_bikes(self) -> list[Bike]:
         """Return a list of bikes that are available for rental."""
-        return [b for b in self.inventory if b.status == 'available']
+        return self.list_any_bikes('available')
     
     def list_rented_bikes(self) -> list[Bike]:
         """Return a list of bikes that are currently rented out."""
-        return [b for b in self.inventory if b.status == 'rented']
+        return self.list_any_bikes('rented')
     
     def list_any_bikes(self, status: str) -> list[Bike]:
         """Return a list of bikes filtered by status."""
-        return [b for b in self.inventory if b.status == status]
+        # status changes must go through set_bike_status for the buckets to stay right
+        with self.lock:
+            # in inventory order, like the full list; a bucket is in the order bikes entered it
+            return sorted(self.status_buckets.get(status, {}).values(), key=lambda b: self.bike_rank[b.id])
+
+    def count_bikes(self, status: str) -> int:
+        """Return how many bikes have the given status."""
+        return len(self.status_buckets.get(status, ()))
+
+    def status_counts(self) -> dict[str, int]:
+        """Return the number of bikes per status."""
+        with self.lock:
+            return {status: len(bikes) for status, bikes in self.status_buckets.items() if bikes}
     
     def list_inventory(self) -> list[Bike]:
         """Return the full bike inventory."""
-        return self.inventory
+        with self.lock:
+            return self.inventory
+
+    def search_bikes(self, query: str) -> list[Bike]:
+        """
+        Return the bikes matching every word of query, by bike ID: a word matches as a prefix or substring
+        of the make or model, or (digits only) the bike ID. An empty query returns the whole inventory.
+        """
+        with self.lock:
+            ids = self.bike_search.search(query, self.bike_index, self.sequences['bike'].last)
+            if ids is None:
+                return self.inventory
+            return [self.bike_index[bike_id] for bike_id in sorted(ids)]
     
     def set_bike_status(self, bike_id: int, status: str, new_value = None) -> Bike:
         """Set the status of a bike."""
-        for bike in self.inventory:
-            if bike.id == bike_id:
-                bike.__setattr__(status, new_value)
-                self.save_data()
+        with self.bike_lock(bike_id), self.transaction(), self.lock:
+            bike = self.bike_index.get(bike_id)
+            if not bike:
+                raise ValueError("Bike not found")
+            if status not in Bike.__slots__:
+                raise ValueError(f"Bike has no field '{status}'")
+
+            if status == 'id' and new_value != bike_id:
+                if new_value in self.bike_index:
+                    raise ValueError("Bike ID already in use")
+                # re-key the index under the new id
+                rank = self._delete_bike(bike)
+                bike.id = new_value
+                self._insert_bike(bike, rank)
+                self.sequences['bike'].observe(new_value)
+
+                def undo():
+                    self._delete_bike(bike)
+                    bike.id = bike_id
+                    self._insert_bike(bike, rank)
+                self.on_rollback(undo)
+                self.persist({'op': 'remove_bike', 'id': bike_id}, {'op': 'bike', 'data': bike.to_dict()})
                 return bike
-        raise ValueError("Bike not found")
+
+            old_value = getattr(bike, status)
+            self._set_bike_field(bike, status, new_value)
+            self.on_rollback(lambda: self._set_bike_field(bike, status, old_value))
+            self.persist({'op': 'bike', 'data': bike.to_dict()})
+            return bike
+
+    def set_bike_fields(self, bike_id: int, **fields) -> Bike:
+        """Set several fields of a bike in one write, e.g. set_bike_fields(3, make='Trek', hourly_rate=8.0)."""
+        # both ids are locked before self.lock, like every other change
+        with self.lock_bikes([bike_id, fields.get('id', bike_id)]), self.transaction(), self.lock:
+            bike = self.bike_index.get(bike_id)
+            if not bike:
+                raise ValueError("Bike not found")
+            for field in fields:
+                if field not in Bike.__slots__:
+                    raise ValueError(f"Bike has no field '{field}'")
+            if 'id' in fields and fields['id'] != bike_id and fields['id'] in self.bike_index:
+                raise ValueError("Bike ID already in use")
+
+            for field, value in fields.items():
+                if field != 'id':
+                    self.set_bike_status(bike_id, field, value)
+            if 'id' in fields:
+                self.set_bike_status(bike_id, 'id', fields['id'])  # last, so the calls above find the bike by its old id
+            return bike
+
+    def bulk_set_status(self, bike_ids, status: str) -> list[Bike]:
+        """Set the status of many bikes in one write. Nothing changes if any of them doesn't exist."""
+        bike_ids = list(dict.fromkeys(bike_ids))
+        with self.lock_bikes(bike_ids), self.transaction(), self.lock:
+            missing = [bike_id for bike_id in bike_ids if bike_id not in self.bike_index]
+            if missing:
+                raise ValueError(f"Bikes not found: {missing}")
+            return [self.set_bike_status(bike_id, 'status', status) for bike_id in bike_ids]
     
     def remove_bike(self, bike_id: int) -> None:
         """Remove a bike from the inventory."""
         # DONT SHIFT THE IDS OF OTHER BIKES
-        
-        for i, bike in enumerate(self.inventory):
-            if bike.id == bike_id:
-                del self.inventory[i]
-                self.save_data()
-                return
-            
-        raise ValueError("Bike not found")
+        with self.bike_lock(bike_id), self.transaction(), self.lock:
+            bike = self.bike_index.get(bike_id)
+            if not bike:
+                raise ValueError("Bike not found")
+
+            rank = self._delete_bike(bike)
+            self.on_rollback(lambda: self._insert_bike(bike, rank))
+            self.persist({'op': 'remove_bike', 'id': bike_id})
 
     # --------------------
     # Ticket Management
     # --------------------
+    @property
+    def tickets(self) -> dict[int, Ticket]:
+        """All tickets by ID."""
+        return self._tickets
+
+    @tickets.setter
+    def tickets(self, tickets: dict[int, Ticket]) -> None:
+        # replacing the whole dict rebuilds the secondary indexes with it
+        self._tickets = tickets
+        self.active_by_customer = {}  # dict: customer_key -> {ticket_id: Ticket}, open tickets only
+
+        # running report aggregates, see Simple Reports
+        self.active_count = 0
+        self.revenue_total = 0.0
+        self.revenue_per_bike = {}  # dict: bike_id -> revenue
+        self.revenue_per_day = {}  # dict: 'YYYY-MM-DD' of return -> revenue
+        self.search_index = None  # SearchIndex over every ticket, built by the first search_tickets call
+        for t in self.in_memory_tickets():
+            self._index_ticket(t)
+
+        if isinstance(tickets, TicketStore):
+            # archived tickets are all closed, they only add to the revenue figures
+            summary = tickets.summary
+            self.revenue_total += summary['revenue_total']
+            for bike_id, fee in summary['revenue_per_bike'].items():
+                self.revenue_per_bike[bike_id] = self.revenue_per_bike.get(bike_id, 0.0) + fee
+            for day, fee in summary['revenue_per_day'].items():
+                self.revenue_per_day[day] = self.revenue_per_day.get(day, 0.0) + fee
+
+    def in_memory_tickets(self):
+        """Tickets held as objects: all of them, or with lazy_history only the open/recent ones."""
+        if isinstance(self._tickets, TicketStore):
+            return self._tickets.hot.values()
+        return self._tickets.values()
+
+    @staticmethod
+    def customer_key(name, phone) -> tuple[str, str]:
+        """Normalize a customer's name and phone for matching: case/spacing-blind name, digits-only phone."""
+        digits = ''.join(c for c in str(phone) if c.isdigit())
+        return ' '.join(str(name).split()).casefold(), digits or str(phone).strip()
+
+    @staticmethod
+    def search_values(customer: dict, bike: dict, system_notes, personal_notes) -> tuple:
+        """The text a ticket is found by: customer name and phone (also as bare digits), bike make and model, notes."""
+        digits = ''.join(filter(str.isdigit, str(customer['phone'])))
+        return (f"{customer['name']} {customer['phone']} {digits}", f"{bike['make']} {bike['model']}",
+                system_notes, personal_notes)
+
+    def _index_ticket(self, ticket: Ticket) -> None:
+        """Add a ticket to the secondary indexes, according to its current state."""
+        if ticket.end_time == "":
+            key = self.customer_key(ticket.customer['name'], ticket.customer['phone'])
+            self.active_by_customer.setdefault(key, {})[ticket.id] = ticket
+        if self.search_index is not None:
+            self.search_index.add(ticket.id, self.search_values(ticket.customer, ticket.bike, ticket.system_notes, ticket.personal_notes))
+        self._count_ticket(ticket, 1)
+
+    def _unindex_ticket(self, ticket: Ticket) -> None:
+        """Remove a ticket from the secondary indexes; call before changing its state."""
+        key = self.customer_key(ticket.customer['name'], ticket.customer['phone'])
+        matches = self.active_by_customer.get(key)
+        if matches is not None:
+            matches.pop(ticket.id, None)
+            if not matches:
+                del self.active_by_customer[key]
+        if self.search_index is not None:
+            self.search_index.remove(ticket.id, self.search_values(ticket.customer, ticket.bike, ticket.system_notes, ticket.personal_notes))
+        self._count_ticket(ticket, -1)
+
+    def _count_ticket(self, ticket: Ticket, sign: int) -> None:
+        """Add (sign=1) or take back (sign=-1) a ticket's share of the report aggregates."""
+        if ticket.status == 'active':
+            self.active_count += sign
+        elif ticket.status == 'closed':
+            fee = sign * ticket.total_fee
+            day = ticket.end_time[:10]
+            self.revenue_total += fee
+            self.revenue_per_bike[ticket.bike['id']] = self.revenue_per_bike.get(ticket.bike['id'], 0.0) + fee
+            self.revenue_per_day[day] = self.revenue_per_day.get(day, 0.0) + fee
+
+    def _store_ticket(self, ticket: Ticket) -> None:
+        """Add or replace a ticket, keeping the indexes in step."""
+        previous = self._tickets.get(ticket.id)
+        if previous is not None:
+            self._unindex_ticket(previous)
+        self._tickets[ticket.id] = ticket
+        self._index_ticket(ticket)
+
+    def _drop_ticket(self, ticket_id: int) -> None:
+        """Forget a ticket entirely (only used to undo create_ticket)."""
+        ticket = self._tickets.pop(ticket_id, None)
+        if ticket is not None:
+            self._unindex_ticket(ticket)
+
     def create_ticket(self, customer: Customer, bike_id: int, hours: int, personal_notes='') -> Ticket:
         """Create a new rental ticket."""
-        bike = next((b for b in self.inventory if b.id == bike_id and b.status == 'available'), None)
-        if not bike:
-            raise ValueError("Bike not available")
-        
-        # repack customer object into a dict
-        
-        if customer.id is None:
-            # assign a new customer ID
-            if self.tickets:
-                max_customer_id = max(t.customer['id'] for t in self.tickets.values())
-                customer.id = max_customer_id + 1
+        if isinstance(hours, bool) or not isinstance(hours, (int, float)) or not 0 < hours < float('inf'):
+            raise ValueError("Planned hours must be a positive number")
+        # the bike's lock makes the availability check and the rental one step, so a bike can't be rented twice;
+        # everything below is written once, when the transaction commits
+        with self.bike_lock(bike_id), self.transaction(), self.lock:
+            bike = self.bike_index.get(bike_id)
+            if not bike or bike.status != 'available':
+                raise ValueError("Bike not available")
+            
+            # repack customer object into a dict
+            
+            if customer.id is None:
+                # assign a new customer ID
+                customer.id = self.sequences['customer'].next()
             else:
-                customer.id = 1
+                self.sequences['customer'].observe(customer.id)
 
-        customer_str = {"id": customer.id, "name": customer.name, "phone": customer.phone}
+            customer_str = {"id": customer.id, "name": customer.name, "phone": customer.phone}
 
-        # repack bike
-        bike_str = {"id": bike.id, "make": bike.make, "model": bike.model, "hourly_rate": bike.hourly_rate, "status": "rented"}
+            # repack bike
+            bike_str = {"id": bike.id, "make": bike.make, "model": bike.model, "hourly_rate": bike.hourly_rate, "status": "rented"}
 
-        if self.tickets:
-            ticket_id = max(self.tickets.keys()) + 1
-        else:
-            ticket_id = 1
-
-        start_time = datetime.now().isoformat() # store as ISO string
-
-        # create ticket object
-        ticket = Ticket(
-            id=ticket_id,
-            status='active',
-            bike=bike_str,
-            customer=customer_str,
-            start_time=start_time,
-            planned_hours=hours,
-            end_time="",
-            total_fee=0,
-            system_notes='',
-            personal_notes=personal_notes
-        )
-
-        # Mark bike as rented in inventory
-        self.set_bike_status(bike.id, 'status', 'rented')
-        self.set_bike_status(bike.id, 'rented_by', customer.name)
-
-        self.tickets[ticket_id] = ticket
-        
-        self.save_data()
+            ticket_id = self.sequences['ticket'].next()
+
+            start_time = datetime.now()
+
+            # create ticket object
+            ticket = Ticket(
+                id=ticket_id,
+                status='active',
+                bike=bike_str,
+                customer=customer_str,
+                start_time=start_time.isoformat(), # store as ISO string
+                planned_hours=hours,
+                end_time="",
+                total_fee=0,
+                system_notes='',
+                personal_notes=personal_notes
+            )
+            ticket.start_datetime = start_time  # already parsed
+
+            # Mark bike as rented in inventory
+            self.set_bike_status(bike.id, 'status', 'rented')
+            self.set_bike_status(bike.id, 'rented_by', customer.name)
+
+            self._store_ticket(ticket)
+            self.on_rollback(lambda: self._drop_ticket(ticket_id))
+
+            self.persist({'op': 'ticket', 'data': ticket.to_dict()})
         return ticket
 
     def close_ticket(self, ticket_id: int) -> Ticket:
         """Close a ticket after bike return."""
-        ticket = self.tickets.get(ticket_id)
+        ticket = self.get_ticket(ticket_id)
         if not ticket:
             raise ValueError("Ticket not found")
-        
-        end_time = datetime.now().isoformat()
 
+        with self.bike_lock(ticket.bike['id']), self.transaction(), self.lock:
+            # looked up again under the bike's lock: another terminal may have just closed it
+            ticket = self.tickets.get(ticket_id)
+            if not ticket:
+                raise ValueError("Ticket not found")
+            if ticket.status == 'closed':
+                raise ValueError("Ticket already closed")
+
+            # snapshot for rollback, close_ticket edits the ticket in place
+            before = ticket.to_dict()
+            def undo():
+                self._unindex_ticket(ticket)
+                ticket.update(before)
+                self._index_ticket(ticket)
+
+            self.on_rollback(undo)
+            self._unindex_ticket(ticket)
+            self._close_ticket(ticket)
+            self._index_ticket(ticket)
+        return ticket
+
+    def close_tickets(self, ticket_ids) -> list[Ticket]:
+        """Close many tickets in one write, e.g. at the end of the day. Nothing changes if any can't be closed."""
+        ticket_ids = list(dict.fromkeys(ticket_ids))
+        tickets = [self.get_ticket(ticket_id) for ticket_id in ticket_ids]
+        missing = [ticket_id for ticket_id, ticket in zip(ticket_ids, tickets) if ticket is None]
+        if missing:
+            raise ValueError(f"Tickets not found: {missing}")
+
+        with self.lock_bikes(t.bike['id'] for t in tickets), self.transaction():
+            with self.lock:
+                # checked again under the bikes' locks: another terminal may have just closed one
+                closed = [ticket_id for ticket_id in ticket_ids if self.tickets[ticket_id].status == 'closed']
+            if closed:
+                raise ValueError(f"Tickets already closed: {closed}")
+            return [self.close_ticket(ticket_id) for ticket_id in ticket_ids]
+
+    def _close_ticket(self, ticket: Ticket) -> None:
+        """Work out the fee, free the bike and mark the ticket closed."""
         # Calculate total fee
-        hours_rented = (datetime.fromisoformat(end_time) - datetime.fromisoformat(ticket.start_time)).total_seconds() / 3600
+        ticket.end_datetime = datetime.now()
+        hours_rented = ticket.hours_rented()
 
-        ticket.end_time = end_time
         ticket.bike['status'] = 'available'
 
-        # Charge on hourly rate on the planned hours, round up hours
-        total_fee = 0
-        total_fee = math.ceil(ticket.planned_hours) * ticket.bike['hourly_rate']  # round up hours
-
-        # if overdue, add late fee
-        overdue_fee = 0
-        overdue_hours = 0
-        if hours_rented > ticket.planned_hours:
-            late_hours = hours_rented - ticket.planned_hours
-            late_fee = late_hours * ticket.bike['hourly_rate'] * self.late_fee_rate
-            overdue_fee = late_fee
-            overdue_hours = late_hours
+        # planned hours at the hourly rate plus any late fee, see pricing.PricingRules
+        quote = self.pricing.quote(ticket.planned_hours, ticket.bike['hourly_rate'], hours_rented, ticket.start_datetime.hour)
+        total_fee = quote.base_fee
+        overdue_fee = quote.late_fee
+        overdue_hours = quote.late_hours
 
         # total fee
-        ticket.total_fee = total_fee + overdue_fee
+        ticket.total_fee = quote.total
         
 
         # Mark bike as available in inventory
@@ -206,7 +916,7 @@ class RentalManager:
 
         # note about overdue if any
         if overdue_fee > 0:
-            ticket.system_notes = f"Overdue by {overdue_hours:.2f} hours. Original fee: ${total_fee:.2f}. Late fee applied: ${overdue_fee:.2f} = ({overdue_hours:.2f}hours * {ticket.bike['hourly_rate'] * self.late_fee_rate:.2f}rate)."
+            ticket.system_notes = f"Overdue by {overdue_hours:.2f} hours. Original fee: ${total_fee:.2f}. Late fee applied: ${overdue_fee:.2f} = ({overdue_hours:.2f}hours * {quote.rate * self.late_fee_rate:.2f}rate)."
         else:
             ticket.system_notes = "Returned on time."
 
@@ -220,19 +930,13 @@ class RentalManager:
         # From hong, we want to keep the ticket for records, so we won't delete it.
         # just mark the end_time and total_fee and leave the ticket alone.
 
-        self.save_data()
-        return ticket
+        self.persist({'op': 'ticket', 'data': ticket.to_dict()})
     
     def find_active_tickets_by_customer(self, name, phone) -> list[Ticket]:
         """Find active tickets matching customer name and phone."""
-        matches = []
-        for ticket in self.tickets.values():
-            # strict matching on phone, loose on name, must be active
-            if (ticket.customer['name'] == name and 
-                str(ticket.customer['phone']) == str(phone) and 
-                ticket.end_time == ""):
-                matches.append(ticket)
-        return matches
+        # strict matching on phone digits, loose on name case and spacing, must be active
+        with self.lock:
+            return list(self.active_by_customer.get(self.customer_key(name, phone), {}).values())
     
     def get_ticket(self, ticket_id: int) -> None | Ticket:
         """Return the ticket object json for a given ticket ID."""
@@ -240,21 +944,121 @@ class RentalManager:
         
     def active_tickets_list(self) -> list[Ticket]:
         """Return a list of all active tickets."""
-        return list(self.tickets.values())
+        with self.lock:
+            return list(self.tickets.values())
     
     def get_all_tickets(self) -> list[Ticket]:
         """Return all tickets."""
-        return list(self.tickets.values())
+        with self.lock:
+            return list(self.tickets.values())
+
+    def build_search_index(self) -> SearchIndex:
+        """Index every ticket, archived ones included, for search_tickets; kept up to date from then on."""
+        index = SearchIndex()
+        if isinstance(self._tickets, TicketStore):
+            for data in self._tickets.archive.iter_dicts():
+                index.add(data['id'], self.search_values(data['customer'], data['bike'], data['system_notes'], data['personal_notes']))
+        for t in self.in_memory_tickets():
+            index.add(t.id, self.search_values(t.customer, t.bike, t.system_notes, t.personal_notes))
+        self.search_index = index
+        return index
+
+    def search_ticket_ids(self, query: str, active_only=False) -> list[int]:
+        """The IDs of the tickets search_tickets returns, in the same order, without building the tickets."""
+        with self.lock:
+            ids = None
+            if tokenize(query):
+                index = self.search_index if self.search_index is not None else self.build_search_index()
+                ids = index.search(query, self._tickets, self.sequences['ticket'].last)
+            if active_only:
+                active = (t.id for tickets in self.active_by_customer.values() for t in tickets.values())
+                return sorted(active if ids is None else (ticket_id for ticket_id in active if ticket_id in ids))
+            return sorted(self._tickets if ids is None else ids)
+
+    def search_tickets(self, query: str, active_only=False) -> list[Ticket]:
+        """
+        Return the tickets matching every word of query, by ticket ID.
+        A word matches as a prefix or substring of the customer's name or phone, the bike's make or model,
+        the notes, or (digits only) the ticket ID. An empty query returns every ticket.
+        """
+        return [t for t in map(self.get_ticket, self.search_ticket_ids(query, active_only)) if t is not None]
 
     # --------------------
     # Simple Reports
     # --------------------
+    # the aggregates are kept up to date by _index_ticket / _unindex_ticket
+
     def total_active_rentals(self) -> int:
         """Return the number of active rentals."""
-        return len([t for t in self.tickets.values() if t.status == 'active'])
+        return self.active_count
 
     def total_revenue(self) -> float:
         """Return total revenue from completed tickets."""
-        # For simplicity, calculate from tickets that have end_time
-        completed_tickets = [t for t in self.tickets.values() if t.end_time is not None]
-        return sum(t.total_fee for t in completed_tickets)
\ No newline at end of file
+        return round(self.revenue_total, 2)
+
+    def revenue_by_bike(self) -> dict[int, float]:
+        """Return revenue from completed tickets per bike ID."""
+        with self.lock:
+            return {bike_id: round(fee, 2) for bike_id, fee in self.revenue_per_bike.items()}
+
+    def current_charges(self, now=None) -> dict[int, float]:
+        """Return what every active rental would be charged if returned now, by ticket ID, in one batch quote."""
+        now = now or datetime.now()
+        with self.lock:
+            active = [t for tickets in self.active_by_customer.values() for t in tickets.values()]
+        fees = self.pricing.quote_batch([t.planned_hours for t in active], [t.bike['hourly_rate'] for t in active],
+                                        [t.hours_rented(now) for t in active], [t.start_datetime.hour for t in active])
+        return {t.id: fee for t, fee in zip(active, fees)}
+
+    def total_current_charges(self, now=None) -> float:
+        """Return the sum of current_charges(), for end-of-day settlement."""
+        return round(sum(self.current_charges(now).values()), 2)
+
+    def revenue_by_day(self) -> dict[str, float]:
+        """Return revenue from completed tickets per return date (YYYY-MM-DD)."""
+        with self.lock:
+            return {day: round(fee, 2) for day, fee in sorted(self.revenue_per_day.items())}
+
+    def tickets_between(self, start: datetime, end: datetime) -> list[Ticket]:
+        """Return tickets that started in [start, end); with segmented_history only those months are read."""
+        start, end = start.isoformat(), end.isoformat()
+        with self.lock:
+            tickets = []
+            if isinstance(self.tickets, TicketStore):
+                tickets = [Ticket(**data) for data in self.tickets.archive.iter_range(start, end)]
+            tickets.extend(t for t in self.in_memory_tickets() if isinstance(t.start_time, str) and start <= t.start_time < end)
+            return tickets
+
+    def iter_ticket_dicts(self, start: datetime = None, end: datetime = None, status: str = None, chunk=1000):
+        """
+        Yield ticket dicts, optionally only those that started in [start, end) or with one status: archived
+        tickets first, straight from the archive without building Ticket objects, then the in-memory ones.
+        The lock is taken per chunk of in-memory tickets, so a long export doesn't hold up the front desk.
+        """
+        start = start.isoformat() if start is not None else None
+        end = end.isoformat() if end is not None else None
+
+        def wanted(data) -> bool:
+            if status is not None and data['status'] != status:
+                return False
+            if start is None and end is None:
+                return True
+            started = data['start_time']
+            return isinstance(started, str) and (start is None or start <= started) and (end is None or started < end)
+
+        with self.lock:
+            store = self.tickets
+            ids = list(store.hot if isinstance(store, TicketStore) else store)
+        if isinstance(store, TicketStore):
+            # archived tickets never change, they are read without the lock (as in snapshot_state)
+            archived = store.archive.iter_range(start or '', end or '\uffff') if start or end else store.archive.iter_dicts()
+            yield from filter(wanted, archived)
+        for i in range(0, len(ids), chunk):
+            with self.lock:
+                tickets = (self.tickets.get(ticket_id) for ticket_id in ids[i:i + chunk])
+                rows = [data for data in (t.to_dict() for t in tickets if t is not None) if wanted(data)]
+            yield from rows
+
+    def revenue_between(self, start: datetime, end: datetime) -> float:
+        """Return revenue from completed tickets that started in [start, end)."""
+        return round(sum(t.total_fee for t in self.tickets_between(start, end) if t.status == 'closed'), 2)
\ No newline at end of file
@@ -0,0 +1,132 @@
+# inverted index for the report search
+#
+# a document (ticket) is a handful of field values, e.g. "name phone", "make model", notes.
+# many documents share the same values, so the index is three levels deep:
+#   values: value string -> ids of the documents that have it
+#   tokens: lowercase word / number -> values containing it
+#   grams:  trigram -> tokens containing it
+# a query word is looked up through its trigrams, which finds every token it is a prefix or substring of
+# without scanning the whole vocabulary.
+
+import re
+
+TOKEN_PATTERN = re.compile(r'[^\W_]+')  # runs of letters / digits
+GRAM = 3
+
+
+def tokenize(text) -> list[str]:
+    """Split text into lowercase word / number tokens."""
+    return TOKEN_PATTERN.findall(str(text).casefold())
+
+
+def grams(token: str) -> set[str]:
+    """Return the trigrams of a token (the token itself if it is shorter)."""
+    if len(token) <= GRAM:
+        return {token}
+    return {token[i:i + GRAM] for i in range(len(token) - GRAM + 1)}
+
+
+def numbers_containing(digits: str, limit: int):
+    """
+    Yield every positive int up to limit whose decimal form contains digits, some more than once.
+    Built from the digits outwards (prefix, digits, k trailing digits), so the cost follows the number of matches.
+    """
+    width = len(digits)
+    for k in range(len(str(limit)) - width + 1):
+        scale = 10 ** k
+        step = scale * 10 ** width
+        middle = int(digits) * scale
+        for prefix in range(0 if digits[0] != '0' else 1, limit // step + 1):
+            start = prefix * step + middle
+            yield from range(max(start, 1), min(start + scale, limit + 1))
+
+
+class SearchIndex:
+    """Prefix / substring word search over documents made of text values, updated one document at a time."""
+
+    def __init__(self):
+        self.values = {}  # value -> set of document ids
+        self.tokens = {}  # token -> set of values
+        self.grams = {}  # trigram -> set of tokens, a token shorter than GRAM is its own trigram
+
+    def add(self, doc_id, values) -> None:
+        """Index a document under its values; empty values are skipped."""
+        for value in values:
+            if not value:
+                continue
+            ids = self.values.get(value)
+            if ids is None:
+                ids = self.values[value] = set()
+                self._add_value(value)
+            ids.add(doc_id)
+
+    def remove(self, doc_id, values) -> None:
+        """Take a document out again; values must be the ones it was added with."""
+        for value in values:
+            ids = self.values.get(value)
+            if ids is None:
+                continue
+            ids.discard(doc_id)
+            if not ids:
+                del self.values[value]
+                self._remove_value(value)
+
+    def _add_value(self, value) -> None:
+        for token in set(tokenize(value)):
+            values = self.tokens.get(token)
+            if values is None:
+                values = self.tokens[token] = set()
+                for gram in grams(token):
+                    self.grams.setdefault(gram, set()).add(token)
+            values.add(value)
+
+    def _remove_value(self, value) -> None:
+        for token in set(tokenize(value)):
+            values = self.tokens[token]
+            values.discard(value)
+            if values:
+                continue
+            del self.tokens[token]
+            for gram in grams(token):
+                tokens = self.grams[gram]
+                tokens.discard(token)
+                if not tokens:
+                    del self.grams[gram]
+
+    def matching_tokens(self, word: str) -> list[str]:
+        """Return every indexed token that word is a prefix or substring of."""
+        if len(word) >= GRAM:
+            # a token containing word contains all of its trigrams; start from the rarest
+            candidates = None
+            for gram in sorted(grams(word), key=lambda g: len(self.grams.get(g, ()))):
+                tokens = self.grams.get(gram)
+                if not tokens:
+                    return []
+                candidates = set(tokens) if candidates is None else candidates & tokens
+            return [token for token in candidates if word in token]
+
+        # one or two characters: scan the trigrams, a few thousand at most
+        matches = set()
+        for gram, tokens in self.grams.items():
+            if word in gram:
+                matches.update(tokens)
+        return list(matches)
+
+    def search(self, query, ids=(), max_id=0) -> None | set:
+        """
+        Return the ids of the documents in which every word of the query is a prefix or substring of some token,
+        or None if the query has no words. Words made of digits also match the int ids in ids (up to max_id)
+        containing them; the index itself only knows documents by their values.
+        """
+        result = None
+        for word in tokenize(query):
+            matches = set()
+            for token in self.matching_tokens(word):
+                for value in self.tokens[token]:
+                    matches |= self.values[value]
+            if word.isdigit():
+                matches.update(n for n in numbers_containing(word, max_id) if n in ids)
+            result = matches if result is None else result & matches
+            if not result:
+                return set()
+        return result
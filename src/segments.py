@@ -0,0 +1,194 @@
+# closed tickets partitioned by the month they started in
+#
+# segments/manifest.json   month -> segment file, its ticket ids and revenue summary
+# segments/tickets-YYYY-MM.jsonl      one ticket per line, rewritten when tickets are added to that month
+# segments/tickets-YYYY-MM.jsonl.gz   a sealed month: compressed and read-only
+#
+# segment files are written before the manifest, so a crash in between only leaves unlisted tickets behind;
+# those are still in the main storage and get archived again on the next load.
+
+import gzip
+import json
+import os
+import stat
+from array import array
+from collections import OrderedDict
+from durable import load_json, write_atomic
+from ticket_store import TicketArchive
+
+MANIFEST_VERSION = 1
+UNKNOWN_MONTH = 'unknown'  # tickets whose start_time has no usable YYYY-MM prefix
+
+
+def copy_ticket(data: dict) -> dict:
+    """Copy a cached ticket dict deep enough that the caller can't change the cache."""
+    return {**data, 'bike': dict(data['bike']), 'customer': dict(data['customer'])}
+
+
+def ticket_month(ticket: dict) -> str:
+    """Return the 'YYYY-MM' segment key of a ticket dict."""
+    start_time = ticket['start_time']
+    if isinstance(start_time, str) and len(start_time) >= 7 and start_time[4] == '-' and start_time[:4].isdigit() and start_time[5:7].isdigit():
+        return start_time[:7]
+    return UNKNOWN_MONTH
+
+
+class SegmentedTicketArchive(TicketArchive):
+    """
+    Closed tickets in per-month segment files. Only the manifest is read at startup;
+    a segment is read when one of its tickets is fetched, and a few recently used ones stay cached.
+    """
+
+    stored_separately = True
+    CACHED_SEGMENTS = 2
+
+    def __init__(self, directory):
+        super().__init__()
+        self.directory = directory
+        self.manifest_file = os.path.join(directory, 'manifest.json')
+        self.segments = {}  # month -> {'file', 'sealed', 'ids', 'summary'}
+        self.cache = OrderedDict()  # month -> {ticket_id: dict}
+
+        manifest = load_json(self.manifest_file, {'version': MANIFEST_VERSION, 'segments': {}})
+        if manifest.get('version') != MANIFEST_VERSION:
+            raise ValueError(f"{self.manifest_file} is not a version {MANIFEST_VERSION} manifest")
+        self.segments = manifest['segments']
+
+        # one sorted id array over every segment, with the segment of each id next to it
+        self.months = sorted(self.segments)
+        pairs = sorted((ticket_id, n) for n, month in enumerate(self.months) for ticket_id in self.segments[month]['ids'])
+        self.ids = array('q', (ticket_id for ticket_id, _ in pairs))
+        self.segment_of = array('l', (n for _, n in pairs))
+        for month in self.months:
+            self._add_summary(self.segments[month]['summary'])
+
+    def _add_summary(self, summary: dict) -> None:
+        """Fold a segment's stored summary into the archive summary."""
+        total = self.summary
+        total['revenue_total'] += summary['revenue_total']
+        for bike_id, fee in summary['revenue_per_bike']:  # pairs: JSON would turn int bike ids into strings
+            total['revenue_per_bike'][bike_id] = total['revenue_per_bike'].get(bike_id, 0.0) + fee
+        for day, fee in summary['revenue_per_day'].items():
+            total['revenue_per_day'][day] = total['revenue_per_day'].get(day, 0.0) + fee
+        total['max_ticket_id'] = max(total['max_ticket_id'], summary['max_ticket_id'])
+        total['max_customer_id'] = max(total['max_customer_id'], summary['max_customer_id'])
+
+    # --------------------
+    # reading
+    # --------------------
+    def path(self, month) -> str:
+        return os.path.join(self.directory, self.segments[month]['file'])
+
+    def read_segment(self, month) -> dict:
+        """Return {ticket_id: dict} of one segment, through the cache."""
+        tickets = self.cache.get(month)
+        if tickets is not None:
+            self.cache.move_to_end(month)
+            return tickets
+
+        opener = gzip.open if self.segments[month]['sealed'] else open
+        with opener(self.path(month), 'rt', encoding='utf-8') as file:
+            tickets = {}
+            for line in file:
+                data = json.loads(line)
+                tickets[data['id']] = data
+        self.cache[month] = tickets
+        if len(self.cache) > self.CACHED_SEGMENTS:
+            self.cache.popitem(last=False)
+        return tickets
+
+    def fetch(self, ticket_id):
+        month = self.months[self.segment_of[self._position(ticket_id)]]
+        return copy_ticket(self.read_segment(month)[ticket_id])
+
+    def iter_dicts(self):
+        # segment by segment instead of id by id, so each file is read once
+        for month in self.months:
+            for ticket_id, data in sorted(self.read_segment(month).items()):
+                if ticket_id not in self.removed:
+                    yield copy_ticket(data)
+
+    def iter_range(self, start: str, end: str):
+        """Yield the dicts of tickets that started in [start, end) (ISO strings), opening only those months."""
+        for month in self.months:
+            if month != UNKNOWN_MONTH and not (start[:7] <= month <= end[:7]):
+                continue
+            for ticket_id, data in self.read_segment(month).items():
+                if ticket_id not in self.removed and isinstance(data['start_time'], str) and start <= data['start_time'] < end:
+                    yield copy_ticket(data)
+
+    # --------------------
+    # writing
+    # --------------------
+    def extended(self, tickets, sync=True):
+        new = {t['id']: t for t in tickets}
+        months = {ticket_month(t) for t in tickets}
+        # an older copy of a ticket may sit in another month's segment
+        months.update(self.months[self.segment_of[i]] for i in (self._position(ticket_id) for ticket_id in new) if i >= 0)
+
+        os.makedirs(self.directory, exist_ok=True)
+        segments = dict(self.segments)
+        for month in sorted(months):
+            rows = {}
+            if month in self.segments:
+                rows = {ticket_id: data for ticket_id, data in self.read_segment(month).items()
+                        if ticket_id not in new and ticket_id not in self.removed}
+            rows.update((ticket_id, t) for ticket_id, t in new.items() if ticket_month(t) == month)
+            if not rows:
+                segments.pop(month, None)
+                continue
+            sealed = month in self.segments and self.segments[month]['sealed']
+            segments[month] = self._write_segment(month, rows, sealed, sync)
+
+        self._write_manifest(segments, sync)
+        return SegmentedTicketArchive(self.directory)
+
+    def _write_segment(self, month, rows: dict, sealed: bool, sync) -> dict:
+        """Write one segment file and return its manifest entry."""
+        file_name = f'tickets-{month}.jsonl' + ('.gz' if sealed else '')
+        path = os.path.join(self.directory, file_name)
+        lines = ''.join(json.dumps(rows[ticket_id]) + '\n' for ticket_id in sorted(rows))
+        if sealed:
+            write_atomic(path, lambda file: file.write(gzip.compress(lines.encode('utf-8'))), sync, binary=True)
+            os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        else:
+            write_atomic(path, lambda file: file.write(lines), sync)
+
+        summary = TicketArchive()
+        for data in rows.values():
+            summary.count(data)
+        return {
+            'file': file_name,
+            'sealed': sealed,
+            'ids': sorted(rows),
+            'summary': {**summary.summary, 'revenue_per_bike': list(summary.summary['revenue_per_bike'].items())},
+        }
+
+    def _write_manifest(self, segments: dict, sync) -> None:
+        manifest = {'version': MANIFEST_VERSION, 'segments': segments}
+        write_atomic(self.manifest_file, lambda file: json.dump(manifest, file), sync)
+
+    def seal(self, before: str, sync=True) -> list[str]:
+        """
+        Compress every unsealed month before the given 'YYYY-MM' and make its file read-only.
+        Returns the sealed months.
+        """
+        months = [m for m in self.months if m != UNKNOWN_MONTH and m < before and not self.segments[m]['sealed']]
+        if not months:
+            return []
+        segments = dict(self.segments)
+        old_paths = []
+        for month in months:
+            rows = self.read_segment(month)
+            old_paths.append(self.path(month))
+            segments[month] = self._write_segment(month, rows, True, sync)
+        self._write_manifest(segments, sync)
+        self.segments = segments
+        self.cache.clear()
+        for path in old_paths:
+            for leftover in (path, path + '.bak'):
+                try:
+                    os.remove(leftover)
+                except FileNotFoundError:
+                    pass
+        return months
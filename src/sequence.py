@@ -0,0 +1,18 @@
+class Sequence:
+    """Monotonic id counter that never hands out the same id twice, even after deletions."""
+
+    def __init__(self, last=0):
+        self.last = last
+
+    def next(self) -> int:
+        """Allocate the next id."""
+        self.last += 1
+        return self.last
+
+    def observe(self, used_id) -> None:
+        """Move past an id that was assigned elsewhere, e.g. loaded from disk or given by the caller."""
+        if isinstance(used_id, int) and used_id > self.last:
+            self.last = used_id
+
+    def __repr__(self):
+        return f"Sequence(last={self.last})"
@@ -0,0 +1,716 @@
+# storage backends for RentalManager
+# every backend loads and saves plain dicts (Bike.to_dict() / Ticket.to_dict() shapes),
+# RentalManager turns them into objects and keeps the in-memory indexes.
+#
+# json:    inventory.json + tickets.json, rewritten on every change
+# journal: the same JSON files as a snapshot, plus journal.jsonl with one record per change
+#          (json and journal can keep their snapshot in one binary file instead, see binary_snapshot.py)
+# sqlite:  rental.db with indexed bikes / customers / tickets tables, one row written per change
+
+import json
+import os
+import sqlite3
+import threading
+from array import array
+from binary_snapshot import read_snapshot, read_snapshot_objects, write_snapshot
+from durable import FsyncPolicy, load_json, load_recovering, read_json, restore_backup, write_atomic
+from file_lock import FileLock
+from journal import Journal
+from ticket_store import JsonTicketArchive, TicketArchive, iter_json_array
+
+SEQUENCE_NAMES = ('bike', 'ticket', 'customer')
+SNAPSHOT_FORMATS = ('json', 'binary')
+
+
+def file_signature(path) -> list | None:
+    """[inode, mtime, size] of path, or None if it doesn't exist; write_atomic gives every write a new inode."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_ino, stat.st_mtime_ns, stat.st_size]
+
+
+def check_files_exist(inventory_file='inventory.json', tickets_file='tickets.json') -> bool:
+    """Check if the JSON files exist."""
+    try:
+        with open(inventory_file, 'r') as file:
+            pass
+        with open(tickets_file, 'r') as file:
+            pass
+        return True
+    except FileNotFoundError:
+        # create empty files
+        with open(inventory_file, 'w') as file:
+            json.dump([], file)
+
+        with open(tickets_file, 'w') as file:
+            json.dump([], file)
+        return False
+
+
+class Storage:
+    """
+    Interface RentalManager persists through.
+
+    Records passed to apply() are {'op': 'bike', 'data': bike_dict}, {'op': 'remove_bike', 'id': bike_id}
+    or {'op': 'ticket', 'data': ticket_dict}, always carrying the whole new state of the object.
+    """
+
+    # False: apply() is never called, RentalManager calls save_all() with the full state instead
+    incremental = False
+    # FileLock held by RentalManager(shared_files=True) around each change, None if the backend can't be shared
+    file_lock = None
+
+    def load(self) -> tuple[list[dict], list[dict], dict]:
+        """Return (bike dicts, ticket dicts, sequence values)."""
+        raise NotImplementedError
+
+    def load_lazy(self) -> tuple[list[dict], list[dict], dict, None | TicketArchive]:
+        """
+        Like load(), but closed tickets may be left behind in a TicketArchive.
+        Returns (bike dicts, ticket dicts to keep in memory, sequence values, archive or None).
+        """
+        bikes, tickets, sequences = self.load()
+        return bikes, tickets, sequences, None
+
+    def load_objects(self, bike_cls, ticket_cls) -> tuple[list, list, dict]:
+        """Like load(), but return Bike and Ticket objects; backends with a faster way override this."""
+        bikes, tickets, sequences = self.load()
+        return [bike_cls(**b) for b in bikes], [ticket_cls(**t) for t in tickets], sequences
+
+    def save_all(self, bikes, tickets, sequences) -> None:
+        """Replace everything stored with the given state."""
+        raise NotImplementedError
+
+    def apply(self, records, sequences, sync=True) -> None | object:
+        """
+        Persist a batch of change records. With sync=False the backend may leave them unsynced and return a
+        token for sync(), to be called once the caller's locks are released (see Journal.sync_through).
+        """
+        raise NotImplementedError
+
+    def sync(self, token) -> None:
+        """Wait until the apply(sync=False) that returned token is on disk; None means it already is."""
+
+    def changes(self) -> None | list[dict]:
+        """
+        Return the records other processes stored since this one last loaded or wrote (empty if none),
+        or None if they can't be told apart and everything has to be loaded again. Call with file_lock held.
+        """
+        return []
+
+    def needs_compaction(self) -> bool:
+        """Return True when compact() should be called."""
+        return False
+
+    def compact(self, snapshot, wait=False) -> None:
+        """Fold incremental changes into a full copy; snapshot() returns (bikes, tickets, sequences)."""
+        pass
+
+    def close(self) -> None:
+        """Release files and connections."""
+        pass
+
+
+class JsonStorage(Storage):
+    """
+    The original pair of JSON files (plus sequences.json), rewritten whole on every save.
+    With snapshot_format='binary' everything goes to snapshot_file instead.
+    """
+
+    def __init__(self, inventory_file='inventory.json', tickets_file='tickets.json', sequences_file='sequences.json',
+                 fsync='always', fsync_interval=1.0, snapshot_format='json', snapshot_file='rental.snap'):
+        if snapshot_format not in SNAPSHOT_FORMATS:
+            raise ValueError(f"Unknown snapshot format: {snapshot_format}")
+        self.inventory_file = inventory_file
+        self.tickets_file = tickets_file
+        self.sequences_file = sequences_file
+        self.snapshot_format = snapshot_format
+        self.snapshot_file = snapshot_file
+        self.fsync = FsyncPolicy(fsync, fsync_interval)
+        self.recovered = []  # files that were damaged and restored from their .bak on load
+        self.file_lock = FileLock((snapshot_file if snapshot_format == 'binary' else inventory_file) + '.lock')
+        self.manifest_file = inventory_file + '.manifest'  # signatures of the last complete JSON save
+        self.seen = None  # file signatures as of the last load or save, see changes()
+
+    def signature(self) -> tuple:
+        """The file_signature of each snapshot file."""
+        if self.snapshot_format == 'binary':
+            return (file_signature(self.snapshot_file),)
+        return tuple(file_signature(path) for path in (self.inventory_file, self.tickets_file, self.sequences_file))
+
+    def _check_manifest(self) -> None:
+        """
+        A crash between the renames of a save leaves some JSON files from that save and some from the one
+        before. Put back the previous copy of each file the manifest doesn't describe, so all of them are
+        from the last complete save. Files saved without a manifest (or edited by hand) are left alone.
+        """
+        try:
+            manifest = read_json(self.manifest_file)
+        except (FileNotFoundError, ValueError):
+            return
+        paths = (self.inventory_file, self.tickets_file, self.sequences_file)
+        restored = False
+        for path, expected in zip(paths, manifest):
+            if file_signature(path) != expected and file_signature(path + '.bak') == expected and restore_backup(path):
+                self.recovered.append(path)
+                restored = True
+        if restored:
+            self._write_manifest(True)
+
+    def _write_manifest(self, sync) -> None:
+        write_atomic(self.manifest_file, lambda file: json.dump(list(self.signature()), file), sync)
+
+    def changes(self):
+        # whole files, no deltas: any change means reading them again
+        return [] if self.signature() == self.seen else None
+
+    def load(self):
+        # noted before reading, so a write in between shows up as a change later rather than being missed
+        self.seen = self.signature()
+        if self.snapshot_format == 'binary':
+            return load_recovering(self.snapshot_file, read_snapshot, ([], [], {}), self.recovered)
+
+        # check and create files if they don't exist
+        check_files_exist(self.inventory_file, self.tickets_file)
+        self._check_manifest()
+        bikes, sequences = self._load_bikes_and_sequences()
+
+        # Load tickets
+        tickets = load_json(self.tickets_file, [], self.recovered)
+
+        return bikes, tickets, sequences
+
+    def load_objects(self, bike_cls, ticket_cls):
+        self.seen = self.signature()
+        if self.snapshot_format == 'binary':
+            return load_recovering(self.snapshot_file, lambda path: read_snapshot_objects(path, bike_cls, ticket_cls),
+                                   ([], [], {}), self.recovered)
+        return super().load_objects(bike_cls, ticket_cls)
+
+    def load_lazy(self):
+        if self.snapshot_format == 'binary':
+            # the binary snapshot is loaded whole, it is fast enough
+            return *JsonStorage.load(self), None
+
+        self.seen = self.signature()
+        check_files_exist(self.inventory_file, self.tickets_file)
+        self._check_manifest()
+        bikes, sequences = self._load_bikes_and_sequences()
+
+        try:
+            tickets, archive = self._stream_tickets()
+        except ValueError:
+            # damaged file, start over from the last good snapshot
+            if not restore_backup(self.tickets_file):
+                raise
+            self.recovered.append(self.tickets_file)
+            tickets, archive = self._stream_tickets()
+        return bikes, tickets, sequences, archive
+
+    def _stream_tickets(self) -> tuple[list[dict], JsonTicketArchive]:
+        """Stream the ticket array, keeping only open tickets and the file offsets of closed ones."""
+        tickets = []
+        archive = JsonTicketArchive(self.tickets_file)
+        try:
+            for offset, length, data in iter_json_array(self.tickets_file):
+                if data['end_time'] == "":
+                    tickets.append(data)
+                else:
+                    archive.add(offset, length, data)
+        except BaseException:
+            archive.close()
+            raise
+        archive.finish()
+        return tickets, archive
+
+    def _load_bikes_and_sequences(self) -> tuple[list[dict], dict]:
+        """Read the inventory and sequences files."""
+        bikes = load_json(self.inventory_file, [], self.recovered)
+        sequences = load_json(self.sequences_file, {}, self.recovered)
+        return bikes, sequences
+
+    def save_all(self, bikes, tickets, sequences):
+        # check and create files if they don't exist
+        if self.snapshot_format == 'json':
+            check_files_exist(self.inventory_file, self.tickets_file)
+        self.write_snapshot(bikes, tickets, sequences)
+
+    def save_sequences(self, sequences, sync=None) -> None:
+        """Write the id allocators to the sequences file."""
+        sync = self.fsync.due() if sync is None else sync
+        write_atomic(self.sequences_file, lambda file: json.dump(sequences, file), sync)
+
+    def write_snapshot(self, bikes, tickets, sequences) -> None:
+        """
+        Write the JSON files via temp file + rename (see durable.write_atomic), so a crash never leaves
+        them half written and a lazy archive can keep reading the previous file while the new one is written.
+        The manifest is renamed last, see _check_manifest().
+        Tickets may be any iterable; they are written one per line as they come.
+        """
+        sync = self.fsync.due()
+        if self.snapshot_format == 'binary':
+            write_atomic(self.snapshot_file, lambda file: write_snapshot(file, bikes, tickets, sequences), sync, binary=True)
+            self.seen = self.signature()
+            return
+
+        write_atomic(self.inventory_file, lambda file: json.dump(list(bikes), file, indent=4), sync)
+
+        def write_tickets(file):
+            separator = '[\n'
+            for ticket in tickets:
+                file.write(separator)
+                file.write(json.dumps(ticket))
+                separator = ',\n'
+            file.write('\n]' if separator == ',\n' else '[]')
+        write_atomic(self.tickets_file, write_tickets, sync)
+
+        self.save_sequences(sequences, sync)
+        self._write_manifest(sync)
+        self.seen = self.signature()
+
+
+class JournalStorage(JsonStorage):
+    """JSON snapshot plus an append-only journal, compacted on a background thread."""
+
+    incremental = True
+
+    def __init__(self, inventory_file='inventory.json', tickets_file='tickets.json', sequences_file='sequences.json',
+                 journal_file='journal.jsonl', compact_every=1000, fsync='always', fsync_interval=1.0,
+                 snapshot_format='json', snapshot_file='rental.snap'):
+        super().__init__(inventory_file, tickets_file, sequences_file, fsync, fsync_interval, snapshot_format, snapshot_file)
+        self.journal = Journal(journal_file, FsyncPolicy(fsync, fsync_interval))
+        self.compact_every = compact_every
+        self._compactor = None
+
+    def load(self):
+        return self._replay(*super().load())
+
+    def load_lazy(self):
+        bikes, tickets, sequences, archive = super().load_lazy()
+        # journalled tickets stay in memory, even closed ones; the TicketStore hides the archived copy
+        return *self._replay(bikes, tickets, sequences), archive
+
+    def load_objects(self, bike_cls, ticket_cls):
+        if self.snapshot_format == 'json':
+            # built from load(), which has replayed the journal already
+            return super().load_objects(bike_cls, ticket_cls)
+        return self._replay(*super().load_objects(bike_cls, ticket_cls), bike_cls, ticket_cls)
+
+    def _replay(self, bikes, tickets, sequences, bike_cls=None, ticket_cls=None):
+        """Apply the journal to loaded snapshot dicts, or to objects if their classes are given."""
+        # replay keyed by id; records are whole-object upserts so the last one wins
+        if bike_cls is None:
+            bikes = {b['id']: b for b in bikes}
+            tickets = {t['id']: t for t in tickets}
+        else:
+            bikes = {b.id: b for b in bikes}
+            tickets = {t.id: t for t in tickets}
+        removed_ids = []
+        for record in self.journal.replay():
+            if record['op'] == 'bike':
+                data = record['data']
+                bikes[data['id']] = data if bike_cls is None else bike_cls(**data)
+            elif record['op'] == 'remove_bike':
+                bikes.pop(record['id'], None)
+                removed_ids.append(record['id'])
+            elif record['op'] == 'ticket':
+                data = record['data']
+                tickets[data['id']] = data if ticket_cls is None else ticket_cls(**data)
+
+        # removed ids stay used
+        sequences = dict(sequences)
+        ids = [i for i in removed_ids if isinstance(i, int)]
+        sequences['bike'] = max([sequences.get('bike', 0)] + ids)
+
+        return list(bikes.values()), list(tickets.values()), sequences
+
+    def apply(self, records, sequences, sync=True):
+        return self.journal.append(records, sync)
+
+    def sync(self, token):
+        if token is not None:
+            self.journal.sync_through(token)
+
+    def changes(self):
+        if self.signature() != self.seen:
+            return None  # another process compacted the journal into a new snapshot
+        return self.journal.read_new()
+
+    def needs_compaction(self):
+        # a compaction cut short last run also counts
+        return self.journal.record_count >= self.compact_every or (
+            not self.compaction_running() and self.journal.has_leftover_compaction())
+
+    def compaction_running(self) -> bool:
+        """Return True while a snapshot is being written in the background."""
+        return self._compactor is not None and self._compactor.is_alive()
+
+    def wait_for_compaction(self) -> None:
+        """Block until a background compaction, if any, has finished."""
+        if self._compactor is not None:
+            self._compactor.join()
+
+    def compact(self, snapshot, wait=False):
+        """
+        Fold the journal into a fresh JSON snapshot.
+        The snapshot is written on a background thread unless wait is True.
+        """
+        if self.compaction_running():
+            if not wait:
+                return  # one compaction at a time, the journal just keeps growing meanwhile
+            self._compactor.join()
+
+        # snapshot() copies the state now, so the writer thread never sees half-applied mutations
+        bikes, tickets, sequences = snapshot()
+        self.journal.rotate()
+        self._compactor = threading.Thread(target=self._write_compaction, args=(bikes, tickets, sequences), daemon=True)
+        self._compactor.start()
+        if wait:
+            self._compactor.join()
+
+    def _write_compaction(self, bikes, tickets, sequences) -> None:
+        """Write the snapshot and drop the rotated journal."""
+        self.write_snapshot(bikes, tickets, sequences)
+        self.journal.finish_compaction()
+
+    def save_all(self, bikes, tickets, sequences):
+        # a full save is a synchronous compaction
+        self.compact(lambda: (bikes, tickets, sequences), wait=True)
+
+    def close(self):
+        self.wait_for_compaction()
+        self.journal.close()
+
+
+class SqliteStorage(Storage):
+    """SQLite database (WAL mode) with one row per bike, customer and ticket."""
+
+    incremental = True
+
+    SCHEMA = """
+        -- position keeps the inventory order: new bikes go last, edits keep their place
+        CREATE TABLE IF NOT EXISTS bikes (
+            id INTEGER PRIMARY KEY,
+            make TEXT, model TEXT, status TEXT, rented_by TEXT, hourly_rate REAL,
+            position INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS bikes_status ON bikes (status);
+
+        CREATE TABLE IF NOT EXISTS customers (
+            id INTEGER PRIMARY KEY,
+            name TEXT, phone TEXT
+        );
+        CREATE INDEX IF NOT EXISTS customers_name_phone ON customers (name, phone);
+
+        -- bike and customer details are copied into the ticket as they were at rental time
+        CREATE TABLE IF NOT EXISTS tickets (
+            id INTEGER PRIMARY KEY,
+            status TEXT,
+            bike_id INTEGER, bike_make TEXT, bike_model TEXT, bike_hourly_rate REAL, bike_status TEXT,
+            customer_id INTEGER, customer_name TEXT, customer_phone TEXT,
+            start_time TEXT, planned_hours REAL, end_time TEXT, total_fee REAL,
+            system_notes TEXT, personal_notes TEXT
+        );
+        CREATE INDEX IF NOT EXISTS tickets_status ON tickets (status);
+        CREATE INDEX IF NOT EXISTS tickets_bike ON tickets (bike_id);
+        CREATE INDEX IF NOT EXISTS tickets_customer ON tickets (customer_name, customer_phone);
+        CREATE INDEX IF NOT EXISTS tickets_end_time ON tickets (end_time);
+        CREATE INDEX IF NOT EXISTS tickets_start_time ON tickets (start_time);
+
+        CREATE TABLE IF NOT EXISTS sequences (
+            name TEXT PRIMARY KEY,
+            last INTEGER
+        );
+
+        -- the latest apply() records, for other processes sharing the database to catch up from
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            record TEXT
+        );
+    """
+
+    BIKE_COLUMNS = 'id, make, model, status, rented_by, hourly_rate'
+
+    # an upsert, so an edited bike keeps its position
+    UPSERT_BIKE = ('INSERT INTO bikes (id, make, model, status, rented_by, hourly_rate, position) '
+                   'VALUES (?, ?, ?, ?, ?, ?, (SELECT COALESCE(MAX(position), 0) + 1 FROM bikes)) '
+                   'ON CONFLICT (id) DO UPDATE SET make = excluded.make, model = excluded.model, '
+                   'status = excluded.status, rented_by = excluded.rented_by, hourly_rate = excluded.hourly_rate')
+
+    TICKET_COLUMNS = ('id, status, bike_id, bike_make, bike_model, bike_hourly_rate, bike_status, '
+                      'customer_id, customer_name, customer_phone, start_time, planned_hours, end_time, '
+                      'total_fee, system_notes, personal_notes')
+
+    # fsync policy -> PRAGMA synchronous; in WAL mode NORMAL only syncs at checkpoints
+    SYNCHRONOUS = {'always': 'FULL', 'batched': 'NORMAL', 'never': 'OFF'}
+
+    # rows kept in the changes table; a process further behind than this loads everything again
+    CHANGES_KEPT = 10000
+
+    def __init__(self, database_file='rental.db', fsync='always'):
+        self.database_file = database_file
+        if fsync not in self.SYNCHRONOUS:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        # writes may come from a background thread, the lock keeps them one at a time
+        self.conn = sqlite3.connect(database_file, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(f'PRAGMA synchronous={self.SYNCHRONOUS[fsync]}')
+        self.conn.executescript(self.SCHEMA)
+        if 'position' not in [r[1] for r in self.conn.execute('PRAGMA table_info(bikes)')]:
+            # databases from before the position column: keep the id order they were loaded in
+            with self.conn:
+                self.conn.execute('ALTER TABLE bikes ADD COLUMN position INTEGER')
+                self.conn.execute('UPDATE bikes SET position = id')
+        self.file_lock = FileLock(database_file + '.lock')
+        self.seen = 0  # last changes row this process wrote or read
+        self.data_version = None  # changes only when another connection commits
+
+    def _mark_seen(self) -> None:
+        self.seen = self.conn.execute('SELECT COALESCE(MAX(seq), 0) FROM changes').fetchone()[0]
+
+    # --------------------
+    # row <-> dict
+    # --------------------
+    @staticmethod
+    def bike_row(bike: dict) -> tuple:
+        return (bike['id'], bike['make'], bike['model'], bike['status'], bike['rented_by'], bike['hourly_rate'])
+
+    @staticmethod
+    def bike_from_row(row) -> dict:
+        return {'id': row[0], 'make': row[1], 'model': row[2], 'status': row[3], 'rented_by': row[4], 'hourly_rate': row[5]}
+
+    @staticmethod
+    def ticket_row(ticket: dict) -> tuple:
+        bike = ticket['bike']
+        customer = ticket['customer']
+        return (ticket['id'], ticket['status'],
+                bike['id'], bike.get('make'), bike.get('model'), bike.get('hourly_rate'), bike.get('status'),
+                customer['id'], customer['name'], customer['phone'],
+                ticket['start_time'], ticket['planned_hours'], ticket['end_time'], ticket['total_fee'],
+                ticket['system_notes'], ticket['personal_notes'])
+
+    @staticmethod
+    def ticket_from_row(row) -> dict:
+        return {
+            'id': row[0],
+            'status': row[1],
+            'bike': {'id': row[2], 'make': row[3], 'model': row[4], 'hourly_rate': row[5], 'status': row[6]},
+            'customer': {'id': row[7], 'name': row[8], 'phone': row[9]},
+            'start_time': row[10],
+            'planned_hours': row[11],
+            'end_time': row[12],
+            'total_fee': row[13],
+            'system_notes': row[14],
+            'personal_notes': row[15],
+        }
+
+    # --------------------
+    # Storage interface
+    # --------------------
+    def load(self):
+        with self.lock:
+            self._mark_seen()
+            bikes = self._load_bikes()
+            tickets = [self.ticket_from_row(r) for r in self.conn.execute(f'SELECT {self.TICKET_COLUMNS} FROM tickets ORDER BY id')]
+            sequences = dict(self.conn.execute('SELECT name, last FROM sequences'))
+        return bikes, tickets, sequences
+
+    def save_all(self, bikes, tickets, sequences):
+        tickets = list(tickets)  # may be streaming out of this database, read it all before clearing
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM bikes')
+            self.conn.execute('DELETE FROM tickets')
+            self.conn.execute('DELETE FROM customers')
+            self.conn.executemany(f'INSERT INTO bikes ({self.BIKE_COLUMNS}, position) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                  ((*self.bike_row(b), i) for i, b in enumerate(bikes, 1)))
+            self._write_tickets(tickets)
+            self._write_sequences(sequences)
+            # everything changed, other processes have to load it all again
+            self.conn.execute('DELETE FROM changes')
+            self.conn.execute('INSERT INTO changes (record) VALUES (?)', (json.dumps({'op': 'reset'}),))
+            self._mark_seen()
+
+    def apply(self, records, sequences, sync=True):
+        with self.lock, self.conn:
+            for record in records:
+                if record['op'] == 'bike':
+                    self.conn.execute(self.UPSERT_BIKE, self.bike_row(record['data']))
+                elif record['op'] == 'remove_bike':
+                    self.conn.execute('DELETE FROM bikes WHERE id = ?', (record['id'],))
+            self._write_tickets([r['data'] for r in records if r['op'] == 'ticket'])
+            self._write_sequences(sequences)
+            self.conn.executemany('INSERT INTO changes (record) VALUES (?)', ((json.dumps(r),) for r in records))
+            self._mark_seen()
+            self.conn.execute('DELETE FROM changes WHERE seq <= ?', (self.seen - self.CHANGES_KEPT,))
+
+    def changes(self):
+        with self.lock:
+            data_version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+            if data_version == self.data_version:
+                return []
+            self.data_version = data_version
+            rows = self.conn.execute('SELECT seq, record FROM changes WHERE seq > ? ORDER BY seq', (self.seen,)).fetchall()
+        if not rows:
+            return []
+        if rows[0][0] != self.seen + 1:
+            return None  # pruned past what this process has seen
+        self.seen = rows[-1][0]
+        records = [json.loads(r[1]) for r in rows]
+        if any(r['op'] == 'reset' for r in records):
+            return None
+        return records
+
+    def _load_bikes(self) -> list[dict]:
+        return [self.bike_from_row(r) for r in self.conn.execute(f'SELECT {self.BIKE_COLUMNS} FROM bikes ORDER BY position')]
+
+    def _write_tickets(self, tickets) -> None:
+        rows = [self.ticket_row(t) for t in tickets]
+        self.conn.executemany('INSERT OR REPLACE INTO customers VALUES (?, ?, ?)', ((r[7], r[8], r[9]) for r in rows))
+        self.conn.executemany(f'INSERT OR REPLACE INTO tickets ({self.TICKET_COLUMNS}) VALUES ({", ".join("?" * 16)})', rows)
+
+    def _write_sequences(self, sequences) -> None:
+        self.conn.executemany('INSERT OR REPLACE INTO sequences VALUES (?, ?)', sequences.items())
+
+    def load_lazy(self):
+        with self.lock:
+            self._mark_seen()
+            bikes = self._load_bikes()
+            tickets = [self.ticket_from_row(r) for r in self.conn.execute(
+                f"SELECT {self.TICKET_COLUMNS} FROM tickets WHERE end_time = '' ORDER BY id")]
+            sequences = dict(self.conn.execute('SELECT name, last FROM sequences'))
+        return bikes, tickets, sequences, SqliteTicketArchive(self)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # --------------------
+    # Queries, answered by SQLite without loading tickets
+    # --------------------
+    def get_ticket(self, ticket_id: int) -> None | dict:
+        """Return one ticket dict by ID."""
+        with self.lock:
+            row = self.conn.execute(f'SELECT {self.TICKET_COLUMNS} FROM tickets WHERE id = ?', (ticket_id,)).fetchone()
+        return self.ticket_from_row(row) if row else None
+
+    def iter_tickets(self, returned_only=False, started_from=None, started_to=None, chunk=1000):
+        """
+        Yield ticket dicts by ID, optionally only returned ones or those started in [started_from, started_to)
+        (ISO strings). Rows are read a chunk at a time, so writes aren't held up for the whole scan.
+        """
+        query = f'SELECT {self.TICKET_COLUMNS} FROM tickets WHERE id > ?'
+        params = []
+        if returned_only:
+            query += " AND end_time != ''"
+        if started_from is not None:
+            query += ' AND start_time >= ?'
+            params.append(started_from)
+        if started_to is not None:
+            query += ' AND start_time < ?'
+            params.append(started_to)
+        last_id = -1
+        while True:
+            with self.lock:
+                rows = self.conn.execute(query + f' ORDER BY id LIMIT {int(chunk)}', [last_id, *params]).fetchall()
+            for row in rows:
+                yield self.ticket_from_row(row)
+            if len(rows) < chunk:
+                return
+            last_id = rows[-1][0]
+
+    def revenue_total(self) -> float:
+        """Return revenue from closed tickets."""
+        with self.lock:
+            return self.conn.execute("SELECT COALESCE(SUM(total_fee), 0) FROM tickets WHERE status = 'closed'").fetchone()[0]
+
+    def revenue_by_bike(self) -> dict[int, float]:
+        """Return revenue from closed tickets per bike ID."""
+        with self.lock:
+            return dict(self.conn.execute(
+                "SELECT bike_id, SUM(total_fee) FROM tickets WHERE status = 'closed' GROUP BY bike_id"))
+
+    def revenue_by_day(self) -> dict[str, float]:
+        """Return revenue from closed tickets per return date (YYYY-MM-DD)."""
+        with self.lock:
+            return dict(self.conn.execute(
+                "SELECT substr(end_time, 1, 10), SUM(total_fee) FROM tickets WHERE status = 'closed' GROUP BY 1 ORDER BY 1"))
+
+
+class SqliteTicketArchive(TicketArchive):
+    """Closed tickets left in the SQLite database; the summary comes from aggregate queries."""
+
+    def __init__(self, storage: SqliteStorage):
+        super().__init__()
+        self.storage = storage
+        with storage.lock:
+            conn = storage.conn
+            self.ids = array('q', (r[0] for r in conn.execute("SELECT id FROM tickets WHERE end_time != '' ORDER BY id")))
+            self.summary['max_ticket_id'], self.summary['max_customer_id'] = conn.execute(
+                "SELECT COALESCE(MAX(id), 0), COALESCE(MAX(customer_id), 0) FROM tickets WHERE end_time != ''").fetchone()
+        self.summary['revenue_total'] = storage.revenue_total()
+        self.summary['revenue_per_bike'] = storage.revenue_by_bike()
+        self.summary['revenue_per_day'] = storage.revenue_by_day()
+
+    def fetch(self, ticket_id):
+        return self.storage.get_ticket(ticket_id)
+
+    def iter_dicts(self):
+        # one query per chunk instead of one per id; tickets closed since loading are in memory, not here
+        return (data for data in self.storage.iter_tickets(returned_only=True) if data['id'] in self)
+
+    def iter_range(self, start, end):
+        return (data for data in self.storage.iter_tickets(returned_only=True, started_from=start, started_to=end) if data['id'] in self)
+
+
+def make_storage(storage_mode='json', inventory_file='inventory.json', tickets_file='tickets.json',
+                 sequences_file='sequences.json', journal_file='journal.jsonl', compact_every=1000,
+                 database_file='rental.db', fsync='always', fsync_interval=1.0, snapshot_format='json',
+                 snapshot_file='rental.snap') -> Storage:
+    """Build the storage backend for a RentalManager storage_mode."""
+    if storage_mode == 'json':
+        return JsonStorage(inventory_file, tickets_file, sequences_file, fsync, fsync_interval,
+                           snapshot_format, snapshot_file)
+    if storage_mode == 'journal':
+        return JournalStorage(inventory_file, tickets_file, sequences_file, journal_file, compact_every,
+                              fsync, fsync_interval, snapshot_format, snapshot_file)
+    if storage_mode == 'sqlite':
+        if snapshot_format != 'json':
+            raise ValueError("snapshot_format only applies to the json and journal storage modes")
+        return SqliteStorage(database_file, fsync)
+    raise ValueError(f"Unknown storage mode: {storage_mode}")
+
+
+def migrate_json_to_sqlite(database_file='rental.db', inventory_file='inventory.json', tickets_file='tickets.json',
+                           sequences_file='sequences.json', journal_file='journal.jsonl') -> tuple[int, int]:
+    """
+    Copy the JSON files (and the journal, if any) into a SQLite database.
+    Returns the number of bikes and tickets migrated.
+    """
+    source = JournalStorage(inventory_file, tickets_file, sequences_file, journal_file)
+    bikes, tickets, sequences = source.load()
+    source.close()
+
+    # make sure the sequences cover every id already handed out
+    sequences = {name: sequences.get(name, 0) for name in SEQUENCE_NAMES}
+    for b in bikes:
+        if isinstance(b['id'], int):
+            sequences['bike'] = max(sequences['bike'], b['id'])
+    for t in tickets:
+        sequences['ticket'] = max(sequences['ticket'], t['id'])
+        sequences['customer'] = max(sequences['customer'], t['customer']['id'] or 0)
+
+    target = SqliteStorage(database_file)
+    target.save_all(bikes, tickets, sequences)
+    target.close()
+    return len(bikes), len(tickets)
+
+
+# one-shot migration: python storage.py [rental.db]
+if __name__ == "__main__":
+    import sys
+    database_file = sys.argv[1] if len(sys.argv) > 1 else 'rental.db'
+    bike_count, ticket_count = migrate_json_to_sqlite(database_file)
+    print(f"Migrated {bike_count} bikes and {ticket_count} tickets into {database_file}.")
@@ -2,7 +2,27 @@
 import json
 import unittest
 import rental_manager
+import storage
+import binary_snapshot
+import pricing
+import virtual_list
 import os
+import tempfile
+import threading
+import bench_concurrency
+import asyncio
+import api_server
+import bench_api
+import ticket_export
+import csv
+import gzip
+import contextlib
+import io
+import marshal
+import sys
+import array
+import ticket_store
+import time
 
 class TestRentalManager(unittest.TestCase):
     def setUp(self):
@@ -16,8 +36,8 @@ class TestRentalManager(unittest.TestCase):
         if self.debug_output:
             # spit out data
             print("==================== DEBUG OUTPUT ====================")
-            print("Inventory Data\n", json.dumps([b.__dict__ for b in self.manager.inventory], indent=4))
-            print("Tickets Data\n", json.dumps([t.__dict__ for t in self.manager.tickets.values()], indent=4))
+            print("Inventory Data\n", json.dumps([b.to_dict() for b in self.manager.inventory], indent=4))
+            print("Tickets Data\n", json.dumps([t.to_dict() for t in self.manager.tickets.values()], indent=4))
 
     def test_add_bike(self):
         """
@@ -165,6 +185,1435 @@ class TestRentalManager(unittest.TestCase):
         self.assertIn('Overdue by', closed_ticket.system_notes) # Notes updated
         self.assertEqual(self.manager.inventory[0].status, 'available') # Bike status updated
 
+    def temp_manager(self, directory, **kwargs):
+        """Build a manager whose files live in a temp directory."""
+        return rental_manager.RentalManager(
+            inventory_file=os.path.join(directory, 'inventory.json'),
+            tickets_file=os.path.join(directory, 'tickets.json'),
+            journal_file=os.path.join(directory, 'journal.jsonl'),
+            sequences_file=os.path.join(directory, 'sequences.json'),
+            database_file=os.path.join(directory, 'rental.db'),
+            snapshot_file=os.path.join(directory, 'rental.snap'),
+            **kwargs
+        )
+
+    def journal_manager(self, directory, **kwargs):
+        """Build a journal-mode manager whose files live in a temp directory."""
+        return self.temp_manager(directory, storage_mode='journal', **kwargs)
+
+    def test_journal_replay(self):
+        """
+        TEST: 11
+        Test that journal-mode changes survive a reload without rewriting the snapshot.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            manager = self.journal_manager(directory)
+            manager.add_bike(rental_manager.Bike(id=1, make='test_brand_11', model='test_model_11'))
+            manager.add_bike(rental_manager.Bike(id=2, make='test_brand_11', model='test_model_11'))
+            manager.remove_bike(bike_id=2)
+            customer = rental_manager.Customer(id=None, name='test_customer_11', phone='123-456-7890')
+            ticket = manager.create_ticket(customer=customer, bike_id=1, hours=1)
+            manager.close()
+
+            with open(os.path.join(directory, 'tickets.json')) as file:
+                self.assertEqual(json.load(file), []) # snapshot untouched, changes only in the journal
+
+            reloaded = self.journal_manager(directory)
+            self.assertEqual([b.id for b in reloaded.inventory], [1])
+            self.assertEqual(reloaded.inventory[0].status, 'rented')
+            self.assertEqual(reloaded.get_ticket(ticket.id).customer['name'], 'test_customer_11')
+            reloaded.close()
+
+    def test_journal_compaction(self):
+        """
+        TEST: 12
+        Test that the journal is folded into the snapshot once it grows past the threshold.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            manager = self.journal_manager(directory, compact_every=10)
+            for i in range(25):
+                manager.add_bike(rental_manager.Bike(id=i, make='test_brand_12', model='test_model_12'))
+                # a compaction is skipped while the previous one still runs, let each one finish
+                manager.storage.wait_for_compaction()
+            manager.close()
+
+            self.assertLess(manager.storage.journal.record_count, 10) # journal was rotated
+            with open(os.path.join(directory, 'inventory.json')) as file:
+                self.assertGreaterEqual(len(json.load(file)), 10) # snapshot caught up
+            reloaded = self.journal_manager(directory)
+            self.assertEqual(len(reloaded.inventory), 25)
+            reloaded.close()
+
+    def test_ticket_saves_once(self):
+        """
+        TEST: 13
+        Test that creating and closing a ticket each write the files once.
+        """
+        bike = rental_manager.Bike(id=1, make='test_brand_13', model='test_model_13')
+        self.manager.add_bike(bike)
+
+        saves = []
+        self.manager.save_data = lambda *args: saves.append(args)
+
+        customer = rental_manager.Customer(id=1, name='test_customer_13', phone='123-456-7890')
+        ticket = self.manager.create_ticket(customer=customer, bike_id=1, hours=1)
+        self.assertEqual(len(saves), 1) # one write for the whole ticket
+
+        self.manager.close_ticket(ticket_id=ticket.id)
+        self.assertEqual(len(saves), 2)
+
+    def test_transaction_rollback(self):
+        """
+        TEST: 14
+        Test that a failing transaction undoes its in-memory changes and writes nothing.
+        """
+        bike = rental_manager.Bike(id=1, make='test_brand_14', model='test_model_14')
+        self.manager.add_bike(bike)
+
+        saves = []
+        self.manager.save_data = lambda *args: saves.append(args)
+
+        with self.assertRaises(ValueError):
+            with self.manager.transaction():
+                self.manager.set_bike_status(bike_id=1, status='make', new_value='changed_brand')
+                self.manager.add_bike(rental_manager.Bike(id=2, make='test_brand_14', model='test_model_14'))
+                self.manager.set_bike_status(bike_id=99, status='status', new_value='rented') # no such bike
+
+        self.assertEqual(bike.make, 'test_brand_14') # edit undone
+        self.assertEqual(len(self.manager.inventory), 1) # add undone
+        self.assertEqual(saves, []) # nothing written
+
+    def test_bike_index(self):
+        """
+        TEST: 15
+        Test that the id index follows adds, removes, id edits and list replacement.
+        """
+        self.debug_output = False
+
+        for i in range(5):
+            self.manager.add_bike(rental_manager.Bike(id=i, make='test_brand_15', model='test_model_15'))
+        self.manager.remove_bike(bike_id=2)
+        self.manager.set_bike_status(bike_id=4, status='id', new_value=40)
+
+        self.assertIsNone(self.manager.get_bike(2))
+        self.assertIsNone(self.manager.get_bike(4))
+        self.assertIs(self.manager.get_bike(40), self.manager.inventory[-1])
+        self.assertEqual(sorted(self.manager.bike_index), [0, 1, 3, 40])
+
+        self.manager.inventory = []
+        self.assertIsNone(self.manager.get_bike(0)) # index reset with the list
+
+    def test_status_buckets(self):
+        """
+        TEST: 16
+        Test that availability lists and counts follow status changes.
+        """
+        for i in range(4):
+            self.manager.add_bike(rental_manager.Bike(id=i, make='test_brand_16', model='test_model_16'))
+        self.manager.set_bike_status(bike_id=3, status='status', new_value='maintenance')
+
+        customer = rental_manager.Customer(id=1, name='test_customer_16', phone='123-456-7890')
+        ticket = self.manager.create_ticket(customer=customer, bike_id=0, hours=1)
+
+        self.assertEqual([b.id for b in self.manager.list_available_bikes()], [1, 2])
+        self.assertEqual([b.id for b in self.manager.list_rented_bikes()], [0])
+        self.assertEqual(self.manager.status_counts(), {'available': 2, 'rented': 1, 'maintenance': 1})
+
+        self.manager.close_ticket(ticket_id=ticket.id)
+        self.manager.remove_bike(bike_id=1)
+        self.assertEqual(self.manager.count_bikes('available'), 2)
+        self.assertEqual(self.manager.count_bikes('rented'), 0)
+
+    def test_id_sequences(self):
+        """
+        TEST: 17
+        Test that bike, ticket and customer ids are never reused, even across reloads.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            manager = self.temp_manager(directory)
+            first = manager.next_bike_id()
+            second = manager.next_bike_id()
+            manager.add_bike(rental_manager.Bike(id=first, make='test_brand_17', model='test_model_17'))
+            manager.add_bike(rental_manager.Bike(id=second, make='test_brand_17', model='test_model_17'))
+            manager.remove_bike(bike_id=second) # highest id is gone
+
+            customer = rental_manager.Customer(id=None, name='test_customer_17', phone='123-456-7890')
+            ticket = manager.create_ticket(customer=customer, bike_id=first, hours=1)
+
+            reloaded = self.temp_manager(directory)
+            self.assertEqual(reloaded.next_bike_id(), second + 1) # deleted id not handed out again
+
+            reloaded.close_ticket(ticket_id=ticket.id)
+            repeat = rental_manager.Customer(id=None, name='test_customer_17', phone='123-456-7890')
+            next_ticket = reloaded.create_ticket(customer=repeat, bike_id=first, hours=1)
+            self.assertEqual(next_ticket.id, ticket.id + 1)
+            self.assertEqual(repeat.id, customer.id + 1)
+
+            with self.assertRaises(ValueError):
+                reloaded.add_bike(rental_manager.Bike(id=first, make='test_brand_17', model='test_model_17'))
+
+    def test_find_active_tickets_by_customer(self):
+        """
+        TEST: 18
+        Test that customer lookups only return open tickets and ignore case, spacing and phone punctuation.
+        """
+        for i in range(3):
+            self.manager.add_bike(rental_manager.Bike(id=i, make='test_brand_18', model='test_model_18'))
+
+        tickets = []
+        for i in range(3):
+            customer = rental_manager.Customer(id=None, name='Test Customer 18', phone='(123) 456-7890')
+            tickets.append(self.manager.create_ticket(customer=customer, bike_id=i, hours=1))
+        self.manager.close_ticket(ticket_id=tickets[0].id)
+
+        matches = self.manager.find_active_tickets_by_customer(' test  customer 18', '123-456-7890')
+        self.assertEqual([t.id for t in matches], [tickets[1].id, tickets[2].id])
+        self.assertEqual(self.manager.find_active_tickets_by_customer('Test Customer 18', '555-555-5555'), [])
+
+        self.manager.close_ticket(ticket_id=tickets[1].id)
+        self.manager.close_ticket(ticket_id=tickets[2].id)
+        self.assertEqual(self.manager.find_active_tickets_by_customer('Test Customer 18', '(123) 456-7890'), [])
+
+    def test_report_aggregates(self):
+        """
+        TEST: 19
+        Test that active rentals and revenue only count what they should.
+        """
+        for i in range(3):
+            self.manager.add_bike(rental_manager.Bike(id=i, make='test_brand_19', model='test_model_19', hourly_rate=10.0))
+
+        tickets = []
+        for i in range(3):
+            customer = rental_manager.Customer(id=None, name='test_customer_19', phone='123-456-7890')
+            tickets.append(self.manager.create_ticket(customer=customer, bike_id=i, hours=2))
+        self.assertEqual(self.manager.total_active_rentals(), 3)
+        self.assertEqual(self.manager.total_revenue(), 0) # open tickets earn nothing yet
+
+        self.manager.close_ticket(ticket_id=tickets[0].id)
+        self.manager.close_ticket(ticket_id=tickets[2].id)
+
+        today = tickets[0].end_time[:10]
+        self.assertEqual(self.manager.total_active_rentals(), 1)
+        self.assertEqual(self.manager.total_revenue(), 40.0)
+        self.assertEqual(self.manager.revenue_by_bike(), {0: 20.0, 2: 20.0})
+        self.assertEqual(self.manager.revenue_by_day(), {today: 40.0})
+
+    def test_sqlite_storage(self):
+        """
+        TEST: 20
+        Test that the SQLite backend writes single rows and round-trips bikes, tickets and ids.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            manager = self.temp_manager(directory, storage_mode='sqlite')
+            for i in range(3):
+                manager.add_bike(rental_manager.Bike(id=i, make='test_brand_20', model='test_model_20', hourly_rate=10.0))
+            manager.remove_bike(bike_id=2)
+            customer = rental_manager.Customer(id=None, name='test_customer_20', phone='123-456-7890')
+            ticket = manager.create_ticket(customer=customer, bike_id=0, hours=1, personal_notes='helmet')
+            manager.close_ticket(ticket_id=ticket.id)
+            manager.close()
+
+            self.assertFalse(os.path.exists(os.path.join(directory, 'tickets.json'))) # no JSON involved
+
+            reloaded = self.temp_manager(directory, storage_mode='sqlite')
+            self.assertEqual([b.id for b in reloaded.inventory], [0, 1])
+            self.assertEqual(reloaded.get_ticket(ticket.id).to_dict(), ticket.to_dict())
+            self.assertEqual(reloaded.next_bike_id(), 3) # removed id stays used
+            self.assertEqual(reloaded.storage.revenue_total(), 10.0) # reports straight from SQL
+            self.assertEqual([t['id'] for t in reloaded.storage.iter_tickets(returned_only=True, chunk=1)], [ticket.id])
+            reloaded.close()
+
+    def test_migrate_json_to_sqlite(self):
+        """
+        TEST: 21
+        Test the one-shot migration from the JSON files to SQLite.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            manager = self.journal_manager(directory)
+            manager.add_bike(rental_manager.Bike(id=1, make='test_brand_21', model='test_model_21'))
+            customer = rental_manager.Customer(id=None, name='test_customer_21', phone='123-456-7890')
+            ticket = manager.create_ticket(customer=customer, bike_id=1, hours=2)
+            manager.close()
+
+            counts = storage.migrate_json_to_sqlite(
+                database_file=os.path.join(directory, 'rental.db'),
+                inventory_file=os.path.join(directory, 'inventory.json'),
+                tickets_file=os.path.join(directory, 'tickets.json'),
+                sequences_file=os.path.join(directory, 'sequences.json'),
+                journal_file=os.path.join(directory, 'journal.jsonl'),
+            )
+            self.assertEqual(counts, (1, 1))
+
+            migrated = self.temp_manager(directory, storage_mode='sqlite')
+            self.assertEqual(migrated.inventory[0].status, 'rented')
+            self.assertEqual(migrated.get_ticket(ticket.id).to_dict(), ticket.to_dict())
+            self.assertEqual(len(migrated.find_active_tickets_by_customer('test_customer_21', '123-456-7890')), 1)
+            migrated.close()
+
+    def test_lazy_history(self):
+        """
+        TEST: 22
+        Test that lazy loading keeps only open tickets in memory but still serves closed ones.
+        """
+        for mode in ('json', 'journal', 'sqlite'):
+            with self.subTest(mode=mode), tempfile.TemporaryDirectory() as directory:
+                manager = self.temp_manager(directory, storage_mode=mode)
+                for i in range(5):
+                    manager.add_bike(rental_manager.Bike(id=i, make='test_brand_22', model='test_model_22', hourly_rate=10.0))
+                tickets = []
+                for i in range(5):
+                    customer = rental_manager.Customer(id=None, name='test_customer_22', phone='123-456-7890')
+                    tickets.append(manager.create_ticket(customer=customer, bike_id=i, hours=1))
+                for ticket in tickets[:3]:
+                    manager.close_ticket(ticket_id=ticket.id)
+                manager.close()
+
+                lazy = self.temp_manager(directory, storage_mode=mode, lazy_history=True)
+                if mode != 'journal': # journalled tickets are kept in memory until compaction
+                    self.assertEqual(sorted(lazy.tickets.hot), [tickets[3].id, tickets[4].id])
+                self.assertEqual(len(lazy.tickets), 5)
+                self.assertEqual(lazy.get_ticket(tickets[0].id).to_dict(), tickets[0].to_dict())
+                self.assertEqual(lazy.total_revenue(), 30.0)
+                self.assertEqual(lazy.total_active_rentals(), 2)
+
+                # keeps working after further saves
+                lazy.close_ticket(ticket_id=tickets[3].id)
+                lazy.save_data()
+                self.assertEqual(lazy.get_ticket(tickets[1].id).status, 'closed')
+                customer = rental_manager.Customer(id=None, name='test_customer_22', phone='123-456-7890')
+                new_ticket = lazy.create_ticket(customer=customer, bike_id=0, hours=1)
+                self.assertEqual(new_ticket.id, tickets[-1].id + 1)
+                lazy.close()
+
+                eager = self.temp_manager(directory, storage_mode=mode)
+                self.assertEqual(len(eager.tickets), 6)
+                self.assertEqual(eager.total_revenue(), 40.0)
+                eager.close()
+
+    def test_columnar_history(self):
+        """
+        TEST: 23
+        Test that closed tickets packed into columns come back exactly as they were saved.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            manager = self.temp_manager(directory)
+            for i in range(4):
+                manager.add_bike(rental_manager.Bike(id=i, make='test_brand_23', model='test_model_23', hourly_rate=7.5))
+            tickets = []
+            for i in range(4):
+                customer = rental_manager.Customer(id=None, name='test_customer_23', phone='123-456-7890')
+                tickets.append(manager.create_ticket(customer=customer, bike_id=i, hours=i + 1, personal_notes='note %d' % i))
+            for ticket in tickets[:3]:
+                manager.close_ticket(ticket_id=ticket.id)
+
+            packed = self.temp_manager(directory, columnar_history=True)
+            archive = packed.tickets.archive
+            self.assertEqual(len(archive), 3)
+            self.assertEqual(list(packed.tickets.hot), [tickets[3].id])
+            for ticket in tickets:
+                self.assertEqual(packed.get_ticket(ticket.id).to_dict(), ticket.to_dict()) # lossless
+            self.assertEqual(archive.values.count('test_customer_23'), 1) # repeated strings stored once
+            self.assertEqual(packed.total_revenue(), manager.total_revenue())
+
+    def test_slotted_models(self):
+        """
+        TEST: 24
+        Test that model objects have no per-instance __dict__ and reject unknown bike fields.
+        """
+        bike = rental_manager.Bike(id=1, make='test_brand_24', model='test_model_24')
+        self.manager.add_bike(bike)
+        self.assertFalse(hasattr(bike, '__dict__'))
+
+        with self.assertRaises(ValueError):
+            self.manager.set_bike_status(bike_id=1, status='colour', new_value='red')
+
+    def test_background_writes(self):
+        """
+        TEST: 25
+        Test that background writes reach disk on flush and that failures are reported through poll.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            manager = self.temp_manager(directory, background_writes=True)
+            for i in range(5):
+                manager.add_bike(rental_manager.Bike(id=i, make='test_brand_25', model='test_model_25'))
+            customer = rental_manager.Customer(id=None, name='test_customer_25', phone='123-456-7890')
+            ticket = manager.create_ticket(customer=customer, bike_id=0, hours=1)
+            self.assertTrue(manager.writer.flush(timeout=5))
+            manager.close()
+
+            reloaded = self.temp_manager(directory)
+            self.assertEqual(len(reloaded.inventory), 5)
+            self.assertEqual(reloaded.get_ticket(ticket.id).to_dict(), ticket.to_dict())
+
+            # a failing write is kept for retry and surfaces on the owner's thread
+            manager = self.temp_manager(directory, background_writes=True)
+            manager.writer.storage = storage.Storage() # save_all raises NotImplementedError
+            manager.remove_bike(4)
+            with self.assertRaises(NotImplementedError):
+                manager.writer.flush(timeout=5)
+            errors = []
+            manager.writer.poll(on_error=errors.append)
+            self.assertEqual(len(errors), 1)
+            self.assertTrue(manager.writer.pending())
+
+            manager.writer.storage = manager.storage
+            self.assertTrue(manager.writer.flush(timeout=5))
+            manager.close()
+            self.assertEqual(len(self.temp_manager(directory).inventory), 4)
+
+    def test_recover_damaged_snapshot(self):
+        """
+        TEST: 26
+        Test that a half-written save falls back to the last good snapshot instead of failing to load.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            manager = self.temp_manager(directory, fsync='never')
+            manager.add_bike(rental_manager.Bike(id=1, make='test_brand_26', model='test_model_26'))
+            customer = rental_manager.Customer(id=None, name='test_customer_26', phone='123-456-7890')
+            ticket = manager.create_ticket(customer=customer, bike_id=1, hours=1)
+            manager.add_bike(rental_manager.Bike(id=2, make='test_brand_26', model='test_model_26'))
+
+            for lazy_history in (False, True):
+                with self.subTest(lazy_history=lazy_history):
+                    # simulate a crash in the middle of writing both files
+                    for path in (manager.inventory_file, manager.tickets_file):
+                        with open(path, 'r+') as file:
+                            file.truncate(os.path.getsize(path) // 2)
+
+                    recovered = self.temp_manager(directory, lazy_history=lazy_history)
+                    self.assertEqual(len(recovered.storage.recovered), 2)
+                    self.assertEqual([b.id for b in recovered.inventory], [1]) # the save before the crash
+                    self.assertEqual(recovered.get_ticket(ticket.id).customer['name'], 'test_customer_26')
+                    recovered.close()
+
+            with self.assertRaises(ValueError):
+                self.temp_manager(directory, fsync='sometimes')
+
+    def test_binary_snapshot(self):
+        """
+        TEST: 27
+        Test that the binary snapshot format round-trips bikes and tickets exactly, with or without a journal.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            manager = self.temp_manager(directory, snapshot_format='binary')
+            for i in range(3):
+                manager.add_bike(rental_manager.Bike(id=i, make='test_brand_27', model='tëst\x00model', hourly_rate=7.5))
+            customer = rental_manager.Customer(id=None, name='test_customer_27', phone='123-456-7890')
+            tickets = [manager.create_ticket(customer=customer, bike_id=i, hours=1.5, personal_notes='n' * i) for i in range(3)]
+            manager.close_ticket(ticket_id=tickets[0].id)
+            self.assertFalse(os.path.exists(manager.inventory_file))
+
+            for storage_mode in ('json', 'journal'):
+                with self.subTest(storage_mode=storage_mode):
+                    loaded = self.temp_manager(directory, snapshot_format='binary', storage_mode=storage_mode)
+                    self.assertEqual([b.to_dict() for b in loaded.inventory], [b.to_dict() for b in manager.inventory])
+                    self.assertEqual([t.to_dict() for t in loaded.tickets.values()], [t.to_dict() for t in manager.tickets.values()])
+                    self.assertEqual(loaded.sequence_values(), manager.sequence_values())
+                    loaded.close()
+
+            # the fixed-width header table is readable without parsing the tickets
+            with binary_snapshot.SnapshotReader(manager.storage.snapshot_file) as reader:
+                headers = list(reader.ticket_headers())
+            self.assertEqual([h[0] for h in headers], [t.id for t in tickets])
+            self.assertEqual([h[6] for h in headers], [1, 0, 0]) # closed, active, active
+            self.assertEqual(headers[1][2], binary_snapshot.NO_VALUE) # no end time yet
+
+    def test_mmap_history(self):
+        """
+        TEST: 28
+        Test that closed tickets move into the mmap archive on load and are still found by id.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            history_file = os.path.join(directory, 'tickets.archive')
+            manager = self.temp_manager(directory)
+            for i in range(4):
+                manager.add_bike(rental_manager.Bike(id=i, make='test_brand_28', model='test_model_28', hourly_rate=5.0))
+            customer = rental_manager.Customer(id=None, name='test_customer_28', phone='123-456-7890')
+            tickets = [manager.create_ticket(customer=customer, bike_id=i, hours=1) for i in range(4)]
+            for ticket in tickets[:2]:
+                manager.close_ticket(ticket_id=ticket.id)
+            expected = {t.id: t.to_dict() for t in tickets}
+
+            archived = self.temp_manager(directory, mmap_history=True, history_file=history_file)
+            self.assertEqual(sorted(archived.tickets.hot), [tickets[2].id, tickets[3].id])
+            with open(archived.tickets_file, 'r') as file:
+                self.assertEqual(len(json.load(file)), 2) # closed tickets left the main storage
+            self.assertEqual({t.id: t.to_dict() for t in archived.get_all_tickets()}, expected)
+            self.assertEqual(archived.total_revenue(), manager.total_revenue())
+
+            # closing another one merges it into the existing archive on the next load
+            archived.close_ticket(ticket_id=tickets[2].id)
+            expected[tickets[2].id] = archived.get_ticket(tickets[2].id).to_dict()
+            archived.close()
+            reloaded = self.temp_manager(directory, mmap_history=True, history_file=history_file)
+            self.assertEqual(list(reloaded.tickets.hot), [tickets[3].id])
+            self.assertEqual(len(reloaded.tickets.archive), 3)
+            self.assertEqual({t.id: t.to_dict() for t in reloaded.get_all_tickets()}, expected)
+            self.assertEqual(reloaded.total_revenue(), archived.total_revenue())
+            reloaded.close()
+
+    def test_segmented_history(self):
+        """
+        TEST: 29
+        Test that closed tickets are split into per-month segments, old months sealed, and ranges read only their months.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            segments_dir = os.path.join(directory, 'segments')
+            manager = self.temp_manager(directory)
+            for i in range(3):
+                manager.add_bike(rental_manager.Bike(id=i, make='test_brand_29', model='test_model_29', hourly_rate=5.0))
+            customer = rental_manager.Customer(id=None, name='test_customer_29', phone='123-456-7890')
+            tickets = [manager.create_ticket(customer=customer, bike_id=i, hours=1) for i in range(3)]
+            tickets[0].start_time = '2023-01-05T10:00:00'
+            tickets[1].start_time = '2023-02-10T10:00:00'
+            for ticket in tickets[:2]:
+                manager.close_ticket(ticket_id=ticket.id)
+            expected = {t.id: t.to_dict() for t in tickets}
+
+            segmented = self.temp_manager(directory, segmented_history=True, segments_dir=segments_dir)
+            self.assertEqual(list(segmented.tickets.hot), [tickets[2].id])
+            segment_files = sorted(name for name in os.listdir(segments_dir) if name.startswith('tickets-'))
+            self.assertEqual(segment_files, ['tickets-2023-01.jsonl.gz', 'tickets-2023-02.jsonl.gz']) # sealed
+            self.assertEqual(os.stat(os.path.join(segments_dir, segment_files[0])).st_mode & 0o222, 0) # read-only
+            self.assertEqual({t.id: t.to_dict() for t in segmented.get_all_tickets()}, expected)
+            self.assertEqual(segmented.total_revenue(), manager.total_revenue())
+            segmented.close()
+
+            reloaded = self.temp_manager(directory, segmented_history=True, segments_dir=segments_dir)
+            february = reloaded.tickets_between(rental_manager.datetime(2023, 2, 1), rental_manager.datetime(2023, 3, 1))
+            self.assertEqual([t.id for t in february], [tickets[1].id])
+            self.assertEqual(list(reloaded.tickets.archive.cache), ['2023-02']) # january was never opened
+            self.assertEqual(reloaded.revenue_between(rental_manager.datetime(2023, 2, 1), rental_manager.datetime(2023, 3, 1)),
+                             round(tickets[1].total_fee, 2))
+            reloaded.close()
+
+    def test_cached_timestamps(self):
+        """
+        TEST: 30
+        Test that tickets keep parsed start/end datetimes in step with their ISO strings.
+        """
+        bike = rental_manager.Bike(id=1, make='test_brand_30', model='test_model_30', hourly_rate=10.0)
+        self.manager.add_bike(bike)
+        customer = rental_manager.Customer(id=None, name='test_customer_30', phone='123-456-7890')
+        ticket = self.manager.create_ticket(customer=customer, bike_id=1, hours=2)
+        self.assertEqual(ticket.start_datetime.isoformat(), ticket.start_time)
+        self.assertIsNone(ticket.end_datetime)
+
+        ticket.start_time = '2024-01-01T08:00:00' # assigning the string drops the cached value
+        self.assertEqual(ticket.start_datetime, rental_manager.datetime(2024, 1, 1, 8))
+        self.assertEqual(ticket.hours_rented(now=rental_manager.datetime(2024, 1, 1, 11, 30)), 3.5)
+
+        self.manager.close_ticket(ticket_id=ticket.id)
+        self.assertEqual(ticket.end_datetime.isoformat(), ticket.end_time)
+        self.assertEqual(list(ticket.to_dict()), list(rental_manager.Ticket.FIELDS))
+
+    def test_pricing_rules(self):
+        """
+        TEST: 31
+        Test that pricing rules apply caps, rounding and evening rates, and batch quotes match single ones.
+        """
+        rules = pricing.PricingRules(late_fee_rate=2.0, late_rounding='quarter', max_fee=100.0, time_of_day=[(17, 24, 1.5)])
+        self.assertEqual(rules.quote(1.5, 10.0, 1.0, start_hour=9).total, 20.0) # planned hours rounded up
+        self.assertEqual(rules.quote(1, 10.0, 1.1, start_hour=9).total, 15.0) # 0.1h late -> a quarter hour at 2x
+        self.assertEqual(rules.quote(1, 10.0, 1.0, start_hour=18).total, 15.0) # evening rate
+        self.assertEqual(rules.quote(1, 10.0, 30.0, start_hour=9).total, 100.0) # capped
+
+        planned, rates, hours, starts = [1, 2.5, 3], [10.0, 7.5, 12.0], [0.5, 4.2, 30.0], [9, 18, 23]
+        expected = [round(rules.quote(*args).total, 2) for args in zip(planned, rates, hours, starts)]
+        self.assertEqual(rules.quote_batch(planned, rates, hours, starts), expected)
+
+        # the manager quotes every active rental in one call
+        self.manager.add_bike(rental_manager.Bike(id=1, make='test_brand_31', model='test_model_31', hourly_rate=10.0))
+        customer = rental_manager.Customer(id=None, name='test_customer_31', phone='123-456-7890')
+        ticket = self.manager.create_ticket(customer=customer, bike_id=1, hours=2)
+        self.assertEqual(self.manager.current_charges(now=ticket.start_datetime), {ticket.id: 20.0})
+
+    def test_search_tickets(self):
+        """
+        TEST: 32
+        Test that ticket search finds prefixes and substrings of names, phones, ids, bikes and notes, and stays up to date.
+        """
+        self.manager.add_bike(rental_manager.Bike(id=1, make='Trek', model='FX 3', hourly_rate=10.0))
+        self.manager.add_bike(rental_manager.Bike(id=2, make='Giant', model='Escape', hourly_rate=10.0))
+        alice = rental_manager.Customer(id=None, name='Alice Mayfield', phone='555-0101')
+        bob = rental_manager.Customer(id=None, name='Bob Stone', phone='555-0202')
+        first = self.manager.create_ticket(customer=alice, bike_id=1, hours=1, personal_notes='needs helmet')
+        self.assertEqual(self.manager.search_tickets('may'), [first]) # builds the index
+
+        second = self.manager.create_ticket(customer=bob, bike_id=2, hours=1) # indexed on creation
+        self.assertEqual(self.manager.search_tickets('ayfie'), [first]) # substring
+        self.assertEqual(self.manager.search_tickets('5550202'), [second]) # phone digits
+        self.assertEqual(self.manager.search_tickets('giant stone'), [second]) # every word must match
+        self.assertEqual(self.manager.search_tickets('HELM'), [first])
+        self.assertIn(second, self.manager.search_tickets(str(second.id))) # phones may contain the id too
+        self.assertEqual(self.manager.search_tickets('nobody'), [])
+        self.assertEqual(self.manager.search_tickets(''), [first, second])
+
+        self.manager.close_ticket(ticket_id=first.id)
+        self.assertEqual(self.manager.search_tickets('returned'), [first]) # system notes of the closed ticket
+        self.assertEqual(self.manager.search_tickets('555', active_only=True), [second])
+        self.assertEqual(self.manager.search_tickets('555'), [first, second])
+
+    def test_search_bikes(self):
+        """
+        TEST: 33
+        Test that bike search matches make, model and id words and follows adds, edits and removals.
+        """
+        self.manager.add_bike(rental_manager.Bike(id=7, make='Trek', model='FX 3', hourly_rate=10.0))
+        self.manager.add_bike(rental_manager.Bike(id=12, make='Giant', model='Escape 3', hourly_rate=10.0))
+        self.assertEqual([b.id for b in self.manager.search_bikes('tre')], [7]) # prefix
+        self.assertEqual([b.id for b in self.manager.search_bikes('scap')], [12]) # substring
+        self.assertEqual([b.id for b in self.manager.search_bikes('3')], [7, 12])
+        self.assertEqual([b.id for b in self.manager.search_bikes('giant 3')], [12])
+        self.assertEqual([b.id for b in self.manager.search_bikes('12')], [12]) # bike id
+        self.assertEqual(self.manager.search_bikes(''), self.manager.inventory)
+
+        self.manager.set_bike_status(7, 'model', 'Domane')
+        self.assertEqual([b.id for b in self.manager.search_bikes('fx')], [])
+        self.assertEqual([b.id for b in self.manager.search_bikes('doma')], [7])
+        self.manager.set_bike_status(7, 'id', 70)
+        self.assertEqual([b.id for b in self.manager.search_bikes('70')], [70])
+        self.manager.remove_bike(70)
+        self.assertEqual([b.id for b in self.manager.search_bikes('trek')], [])
+
+    def test_result_pager(self):
+        """
+        TEST: 34
+        Test that the result pager only reads as far into a lazy result as the pages shown, and sorts everything.
+        """
+        pulled = []
+        def results():
+            for n in range(25):
+                pulled.append(n)
+                yield n
+
+        pager = virtual_list.ResultPager(results(), page_size=10)
+        self.assertEqual(pager.rows(), list(range(10)))
+        self.assertTrue(pager.has_next())
+        self.assertEqual(len(pulled), 11) # one past the page, to know there is a next one
+        self.assertIsNone(pager.page_count())
+
+        pager.next()
+        pager.next()
+        self.assertEqual(pager.rows(), list(range(20, 25)))
+        self.assertFalse(pager.has_next())
+        pager.next() # stays on the last page
+        self.assertEqual(pager.page, 2)
+        self.assertEqual(pager.page_count(), 3)
+
+        pager.sort(key=lambda n: -n)
+        self.assertEqual(pager.page, 0)
+        self.assertEqual(pager.rows(), list(range(24, 14, -1)))
+        self.assertFalse(pager.has_previous())
+
+    def test_concurrent_rentals(self):
+        """
+        TEST: 35
+        Test that desks racing for one bike rent it once, and that parallel rentals are all persisted.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            manager = self.journal_manager(directory, fsync='never')
+            for i in range(1, 5):
+                manager.add_bike(rental_manager.Bike(id=i, make='test_brand_35', model='test_model_35', hourly_rate=5.0))
+
+            results = []
+            start = threading.Barrier(8)
+            def rent(n):
+                start.wait()
+                customer = rental_manager.Customer(id=None, name=f'test_customer_35_{n}', phone='123-456-7890')
+                try:
+                    results.append(manager.create_ticket(customer=customer, bike_id=1, hours=1))
+                except ValueError:
+                    results.append(None)
+            desks = [threading.Thread(target=rent, args=(n,)) for n in range(8)]
+            for desk in desks:
+                desk.start()
+            for desk in desks:
+                desk.join()
+            self.assertEqual(len([t for t in results if t is not None]), 1) # only one desk got the bike
+            bench_concurrency.check_no_double_booking(manager)
+            manager.close()
+
+            # a short stress run: every rental is counted, and the journal replays to the same state
+            rentals, _ = bench_concurrency.run(4, 0.2, 3, storage_mode='journal', fsync='never')
+            self.assertGreater(rentals, 0)
+            manager = self.journal_manager(directory, fsync='never')
+            def churn(n):
+                for _ in range(20):
+                    for bike_id in range(1, 5):
+                        try:
+                            customer = rental_manager.Customer(id=None, name=f'test_customer_35_{n}', phone='123-456-7890')
+                            ticket = manager.create_ticket(customer=customer, bike_id=bike_id, hours=1)
+                        except ValueError:
+                            continue
+                        manager.close_ticket(ticket_id=ticket.id)
+            desks = [threading.Thread(target=churn, args=(n,)) for n in range(4)]
+            for desk in desks:
+                desk.start()
+            for desk in desks:
+                desk.join()
+            expected = {t.id: t.to_dict() for t in manager.get_all_tickets()}
+            manager.close()
+            reloaded = self.journal_manager(directory, fsync='never')
+            self.assertEqual({t.id: t.to_dict() for t in reloaded.get_all_tickets()}, expected)
+            self.assertEqual(reloaded.total_revenue(), round(sum(t['total_fee'] for t in expected.values()), 2))
+            reloaded.close()
+
+    def test_shared_files(self):
+        """
+        TEST: 36
+        Test that two managers sharing files see each other's changes and can't rent the same bike twice.
+        """
+        for storage_mode in ('journal', 'sqlite', 'json'):
+            with self.subTest(storage_mode=storage_mode), tempfile.TemporaryDirectory() as directory:
+                first = self.temp_manager(directory, storage_mode=storage_mode, fsync='never', shared_files=True)
+                second = self.temp_manager(directory, storage_mode=storage_mode, fsync='never', shared_files=True)
+                first.add_bike(rental_manager.Bike(id=1, make='test_brand_36', model='test_model_36', hourly_rate=5.0))
+                first.add_bike(rental_manager.Bike(id=2, make='test_brand_36', model='test_model_36', hourly_rate=5.0))
+
+                # the second manager catches up before renting, so it knows bike 1
+                customer = rental_manager.Customer(id=None, name='test_customer_36', phone='123-456-7890')
+                ticket = second.create_ticket(customer=customer, bike_id=1, hours=1)
+                with self.assertRaises(ValueError):
+                    first.create_ticket(customer=customer, bike_id=1, hours=1)
+                self.assertEqual(first.get_ticket(ticket.id).status, 'active')
+                self.assertEqual(first.get_bike(1).status, 'rented')
+
+                # journal and sqlite hand over just the new records, json reloads its files
+                first.set_bike_status(2, 'status', 'maintenance')
+                applied = second.sync_changes()
+                self.assertEqual(applied, None if storage_mode == 'json' else 1)
+                self.assertEqual(second.get_bike(2).status, 'maintenance')
+                self.assertEqual(second.sync_changes(), 0)
+
+                first.close_ticket(ticket.id)
+                second.sync_changes()
+                self.assertEqual(second.total_active_rentals(), 0)
+                self.assertEqual(second.total_revenue(), first.total_revenue())
+                self.assertEqual(second.search_ticket_ids('test_customer_36'), [ticket.id])
+                other = second.create_ticket(customer=customer, bike_id=1, hours=1)
+                self.assertNotEqual(other.id, ticket.id)
+                first.close()
+                second.close()
+
+    def test_api_server(self):
+        """
+        TEST: 37
+        Test the HTTP API: rentals over one keep-alive connection, errors, lookups, reports and a batch.
+        """
+        async def exercise(manager):
+            service = api_server.ApiService(manager)
+            server = await service.start('127.0.0.1', 0)
+            client = bench_api.Client('127.0.0.1', server.sockets[0].getsockname()[1])
+            try:
+                customer = {'name': 'test_customer_37', 'phone': '123-456-7890'}
+                status, ticket = await client.request('POST', '/tickets', {'customer': customer, 'bike_id': 1, 'hours': 2})
+                self.assertEqual(status, 201)
+                status, error = await client.request('POST', '/tickets', {'customer': customer, 'bike_id': 1, 'hours': 2})
+                self.assertEqual((status, error), (400, {'error': "Bike not available"}))
+                self.assertEqual((await client.request('POST', '/tickets', {'bike_id': 2}))[0], 400)
+                self.assertEqual((await client.request('GET', '/tickets/999'))[0], 404)
+                self.assertEqual((await client.request('GET', '/nowhere'))[0], 404)
+
+                status, active = await client.request('GET', '/tickets/active?name=TEST_customer_37&phone=1234567890')
+                self.assertEqual([t['id'] for t in active], [ticket['id']])
+                status, bikes = await client.request('GET', '/bikes?status=available')
+                self.assertEqual([b['id'] for b in bikes], [2])
+                status, closed = await client.request('POST', f"/tickets/{ticket['id']}/close")
+                self.assertEqual((status, closed['status']), (200, 'closed'))
+                status, summary = await client.request('GET', '/reports/summary')
+                self.assertEqual((summary['active_rentals'], summary['total_revenue']), (0, manager.total_revenue()))
+
+                # changes in a batch run in order, and a read sees the changes before it
+                status, results = await client.request('POST', '/batch', [
+                    {'method': 'POST', 'path': '/tickets', 'body': {'customer': customer, 'bike_id': 1, 'hours': 1}},
+                    {'method': 'POST', 'path': '/tickets', 'body': {'customer': customer, 'bike_id': 1, 'hours': 1}},
+                    {'method': 'GET', 'path': '/reports/summary'},
+                ])
+                self.assertEqual([r['status'] for r in results], [201, 400, 200])
+                self.assertEqual(results[2]['body']['active_rentals'], 1)
+            finally:
+                client.close()
+                await service.close()
+
+        with tempfile.TemporaryDirectory() as directory:
+            manager = self.journal_manager(directory, fsync='never')
+            manager.add_bike(rental_manager.Bike(id=1, make='test_brand_37', model='test_model_37', hourly_rate=5.0))
+            manager.add_bike(rental_manager.Bike(id=2, make='test_brand_37', model='test_model_37', hourly_rate=5.0))
+            asyncio.run(exercise(manager))
+            manager.close()
+
+            # the load generator against its own server
+            latencies, failures = asyncio.run(bench_api.run(0.2, 4, bikes=3))
+            self.assertEqual(failures, 0)
+            self.assertGreater(len(latencies['rent']), 0)
+
+    def test_bulk_operations(self):
+        """
+        TEST: 38
+        Test that bulk changes are checked up front, change nothing on a bad entry and are written once.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            manager = self.temp_manager(directory)
+            saves = []
+            save_all = manager.storage.save_all
+            manager.storage.save_all = lambda *state: saves.append(1) or save_all(*state)
+
+            bikes = [rental_manager.Bike(id=i, make='test_brand_38', model='test_model_38') for i in range(100)]
+            manager.add_bikes(bikes)
+            self.assertEqual((len(manager.inventory), len(saves)), (100, 1))
+            with self.assertRaises(ValueError):
+                manager.add_bikes([rental_manager.Bike(id=100, make='a', model='b'), rental_manager.Bike(id=5, make='a', model='b')])
+            self.assertEqual((len(manager.inventory), len(saves)), (100, 1))
+
+            manager.set_bike_fields(5, make='test_brand_38b', hourly_rate=8.0)
+            self.assertEqual((manager.get_bike(5).make, manager.get_bike(5).hourly_rate, len(saves)), ('test_brand_38b', 8.0, 2))
+            self.assertEqual([b.id for b in manager.search_bikes('test_brand_38b')], [5])
+            with self.assertRaises(ValueError):
+                manager.set_bike_fields(5, make='x', colour='red')
+            self.assertEqual(manager.get_bike(5).make, 'test_brand_38b')
+
+            manager.bulk_set_status(range(10, 20), 'maintenance')
+            self.assertEqual((manager.count_bikes('maintenance'), len(saves)), (10, 3))
+            with self.assertRaises(ValueError):
+                manager.bulk_set_status([20, 21, 999], 'maintenance')
+            self.assertEqual(manager.count_bikes('maintenance'), 10)
+
+            customer = rental_manager.Customer(id=None, name='test_customer_38', phone='123-456-7890')
+            tickets = [manager.create_ticket(customer=customer, bike_id=i, hours=1) for i in range(30, 35)]
+            saves.clear()
+            with self.assertRaises(ValueError):
+                manager.close_tickets([tickets[0].id, 999])
+            self.assertEqual(manager.total_active_rentals(), 5)
+            closed = manager.close_tickets(t.id for t in tickets)
+            self.assertEqual(([t.status for t in closed], len(saves)), (['closed'] * 5, 1))
+            self.assertEqual(manager.count_bikes('rented'), 0)
+            with self.assertRaises(ValueError):
+                manager.close_tickets([tickets[0].id])
+
+            # a CSV import is all or nothing too
+            path = os.path.join(directory, 'fleet.csv')
+            with open(path, 'w') as file:
+                file.write("id,make,model,hourly_rate\n200,test_brand_38,test_model_38,7.5\n,test_brand_38,test_model_38,\n,test_brand_38,,5\n")
+            with self.assertRaisesRegex(ValueError, 'line 4'):
+                manager.import_inventory_csv(path)
+            self.assertIsNone(manager.get_bike(200))
+            with open(path, 'w') as file:
+                file.write("id,make,model,hourly_rate\n200,test_brand_38,test_model_38,7.5\n,test_brand_38,test_model_38,\n")
+            saves.clear()
+            added = manager.import_inventory_csv(path)
+            self.assertEqual(([b.hourly_rate for b in added], len(saves)), ([7.5, 5.0], 1))
+            self.assertGreater(added[1].id, 200)
+
+            reloaded = self.temp_manager(directory)
+            self.assertEqual(len(reloaded.inventory), 102)
+            self.assertEqual(reloaded.get_bike(5).hourly_rate, 8.0)
+
+    def test_ticket_export(self):
+        """
+        TEST: 39
+        Test exporting archived and open tickets to CSV and gzipped JSON Lines, filtered by date and status.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            seeded = [{'id': i, 'status': 'closed',
+                       'bike': {'id': 1, 'make': 'test_brand_39', 'model': 'test_model_39', 'hourly_rate': 5.0, 'status': 'available'},
+                       'customer': {'id': i, 'name': f'test_customer_39, "{i}"', 'phone': '123-456-7890'},
+                       'start_time': f'2023-{i:02d}-01T10:00:00', 'planned_hours': 1,
+                       'end_time': f'2023-{i:02d}-01T11:00:00', 'total_fee': 5.0, 'system_notes': '', 'personal_notes': ''}
+                      for i in range(1, 13)]
+            manager = self.temp_manager(directory)
+            manager.add_bike(rental_manager.Bike(id=1, make='test_brand_39', model='test_model_39'))
+            manager.storage.save_all([manager.get_bike(1).to_dict()], seeded, manager.sequence_values())
+            manager = self.temp_manager(directory, lazy_history=True)
+            customer = rental_manager.Customer(id=None, name='test_customer_39', phone='123-456-7890')
+            active = manager.create_ticket(customer=customer, bike_id=1, hours=1)
+
+            path = os.path.join(directory, 'tickets.csv')
+            self.assertEqual(ticket_export.export_tickets(manager, path), 13)
+            with open(path, newline='') as file:
+                rows = list(csv.DictReader(file))
+            self.assertEqual([int(r['id']) for r in rows], list(range(1, 13)) + [active.id])
+            self.assertEqual(rows[2]['customer_name'], 'test_customer_39, "3"')  # quoting survives
+            self.assertEqual(rows[-1]['status'], 'active')
+
+            path = os.path.join(directory, 'tickets.jsonl.gz')
+            count = ticket_export.export_tickets(manager, path, start=rental_manager.datetime(2023, 3, 1), end=rental_manager.datetime(2023, 6, 1), status='closed')
+            self.assertEqual(count, 3)
+            with gzip.open(path, 'rt') as file:
+                exported = [json.loads(line) for line in file]
+            self.assertEqual(exported, seeded[2:5])
+            self.assertEqual(ticket_export.export_tickets(manager, path, status='active'), 1)
+            self.assertFalse(os.path.exists(path + '.bak'))  # an export replaces the old one without a backup
+            self.assertFalse(os.path.exists(path + '.tmp'))
+
+            with self.assertRaises(ValueError):
+                ticket_export.export_tickets(manager, os.path.join(directory, 'tickets.xlsx'))
+            manager.close()
+
+    def test_journal_torn_tail(self):
+        """
+        TEST: 40
+        Test that a record appended after a crash mid-append doesn't run into the torn line and get lost.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            manager = self.journal_manager(directory)
+            manager.add_bike(rental_manager.Bike(id=1, make='test_brand_40', model='test_model_40'))
+            manager.close()
+            with open(os.path.join(directory, 'journal.jsonl'), 'a') as file:
+                file.write('{"op": "bike", "data": {"id": 2')  # the crash
+
+            manager = self.journal_manager(directory)
+            self.assertEqual([b.id for b in manager.inventory], [1])
+            manager.add_bike(rental_manager.Bike(id=3, make='test_brand_40', model='test_model_40'))
+            manager.close()
+
+            reloaded = self.journal_manager(directory)
+            self.assertEqual([b.id for b in reloaded.inventory], [1, 3])
+            reloaded.close()
+
+    def test_inventory_order(self):
+        """
+        TEST: 41
+        Test that removing bikes keeps the others in order and a rolled back removal or id change restores its place.
+        """
+        for i in range(1, 6):
+            self.manager.add_bike(rental_manager.Bike(id=i, make='test_brand_41', model='test_model_41'))
+        self.manager.remove_bike(bike_id=3)
+        self.assertEqual([b.id for b in self.manager.inventory], [1, 2, 4, 5])
+
+        with self.assertRaises(RuntimeError):
+            with self.manager.transaction():
+                self.manager.remove_bike(bike_id=2)
+                self.manager.set_bike_status(4, 'id', 40)
+                self.assertEqual([b.id for b in self.manager.inventory], [1, 40, 5])
+                raise RuntimeError("cancelled")
+        self.assertEqual([b.id for b in self.manager.inventory], [1, 2, 4, 5])
+        self.manager.add_bike(rental_manager.Bike(id=6, make='test_brand_41', model='test_model_41'))
+        self.assertEqual(self.manager.inventory[-1].id, 6)
+
+    def test_status_lists_in_inventory_order(self):
+        """
+        TEST: 42
+        Test that the per-status bike lists keep inventory order whatever order the bikes changed status in.
+        """
+        for i in range(1, 6):
+            self.manager.add_bike(rental_manager.Bike(id=i, make='test_brand_42', model='test_model_42'))
+        for bike_id in (4, 2, 5):
+            self.manager.set_bike_status(bike_id, 'status', 'maintenance')
+        for bike_id in (5, 2):
+            self.manager.set_bike_status(bike_id, 'status', 'available')
+        self.assertEqual([b.id for b in self.manager.list_available_bikes()], [1, 2, 3, 5])
+        self.assertEqual([b.id for b in self.manager.list_any_bikes('maintenance')], [4])
+
+    def test_sqlite_archive_queries(self):
+        """
+        TEST: 43
+        Test that SQLite's archived tickets are read by date range and streamed through SQL, each ticket once.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            manager = self.temp_manager(directory, storage_mode='sqlite')
+            manager.add_bike(rental_manager.Bike(id=1, make='test_brand_43', model='test_model_43'))
+            seeded = [{'id': i, 'status': 'closed',
+                       'bike': {'id': 1, 'make': 'test_brand_43', 'model': 'test_model_43', 'hourly_rate': 5.0, 'status': 'available'},
+                       'customer': {'id': i, 'name': 'test_customer_43', 'phone': '123-456-7890'},
+                       'start_time': f'2023-{i:02d}-01T10:00:00', 'planned_hours': 1,
+                       'end_time': f'2023-{i:02d}-01T11:00:00', 'total_fee': 5.0, 'system_notes': '', 'personal_notes': ''}
+                      for i in range(1, 13)]
+            manager.storage.save_all([manager.get_bike(1).to_dict()], seeded, manager.sequence_values())
+            manager.close()
+
+            lazy = self.temp_manager(directory, storage_mode='sqlite', lazy_history=True)
+            june = lazy.tickets_between(rental_manager.datetime(2023, 6, 1), rental_manager.datetime(2023, 8, 1))
+            self.assertEqual([t.id for t in june], [6, 7])
+            customer = rental_manager.Customer(id=None, name='test_customer_43', phone='123-456-7890')
+            lazy.close_ticket(lazy.create_ticket(customer=customer, bike_id=1, hours=1).id)
+            ids = [t['id'] for t in lazy.iter_ticket_dicts()]
+            self.assertEqual(ids, list(range(1, 14)))  # the ticket closed since loading comes from memory only
+            lazy.close()
+
+    def test_background_json_changes(self):
+        """
+        TEST: 44
+        Test that background JSON writes copy only the changed objects and keep the inventory order on disk.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            manager = self.temp_manager(directory, background_writes=True)
+            for i in range(1, 4):
+                manager.add_bike(rental_manager.Bike(id=i, make='test_brand_44', model='test_model_44'))
+            customer = rental_manager.Customer(id=None, name='test_customer_44', phone='123-456-7890')
+            for _ in range(5):
+                manager.close_ticket(manager.create_ticket(customer=customer, bike_id=2, hours=1).id)
+
+            copied = []
+            to_dict = rental_manager.Ticket.to_dict
+            rental_manager.Ticket.to_dict = lambda ticket: copied.append(ticket.id) or to_dict(ticket)
+            try:
+                ticket = manager.create_ticket(customer=customer, bike_id=3, hours=1)
+                manager.set_bike_status(bike_id=1, status='id', new_value=10)  # keeps its place
+            finally:
+                rental_manager.Ticket.to_dict = to_dict
+            self.assertEqual(copied, [ticket.id])
+            manager.close()
+
+            reloaded = self.temp_manager(directory)
+            self.assertEqual([b.id for b in reloaded.inventory], [10, 2, 3])
+            self.assertEqual(len(reloaded.tickets), 6)
+            self.assertEqual(reloaded.get_ticket(ticket.id).to_dict(), ticket.to_dict())
+
+    def test_torn_json_save(self):
+        """
+        TEST: 45
+        Test that a crash between the file renames of a JSON save loads the whole previous save, not a mix.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            manager = self.temp_manager(directory)
+            manager.add_bike(rental_manager.Bike(id=1, make='test_brand_45', model='test_model_45'))
+            customer = rental_manager.Customer(id=None, name='test_customer_45', phone='123-456-7890')
+            ticket = manager.create_ticket(customer=customer, bike_id=1, hours=1)
+
+            # the next save renames the inventory and tickets files, then crashes before the sequences file
+            def crash(sequences, sync=None):
+                raise OSError("simulated crash")
+            manager.storage.save_sequences = crash
+            with self.assertRaises(OSError):
+                manager.close_ticket(ticket.id)
+
+            recovered = self.temp_manager(directory)
+            self.assertEqual(sorted(recovered.storage.recovered), sorted([manager.inventory_file, manager.tickets_file]))
+            self.assertEqual(recovered.get_bike(1).status, 'rented')
+            self.assertEqual(recovered.get_ticket(ticket.id).end_time, "")
+            self.assertEqual(self.temp_manager(directory).storage.recovered, [])  # recovered once, not on every load
+
+    def test_journal_replayed_once(self):
+        """
+        TEST: 46
+        Test that loading replays the journal once and counts each of its records once, in both snapshot formats.
+        """
+        for snapshot_format in ('json', 'binary'):
+            with self.subTest(snapshot_format=snapshot_format), tempfile.TemporaryDirectory() as directory:
+                manager = self.temp_manager(directory, storage_mode='journal', snapshot_format=snapshot_format)
+                for i in range(4):
+                    manager.add_bike(rental_manager.Bike(id=i, make='test_brand_46', model='test_model_46'))
+                manager.close()
+
+                reloaded = self.temp_manager(directory, storage_mode='journal', snapshot_format=snapshot_format)
+                with open(reloaded.storage.journal.path) as file:
+                    lines = len(file.readlines())
+                self.assertEqual(reloaded.storage.journal.record_count, lines)
+                reloaded.load_data()
+                self.assertEqual(reloaded.storage.journal.record_count, lines)
+                self.assertEqual(len(reloaded.inventory), 4)
+                reloaded.close()
+
+    def test_group_commit(self):
+        """
+        TEST: 47
+        Test that journal writes made while another thread fsyncs share one fsync, and are on disk once stored.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            manager = self.temp_manager(directory, storage_mode='journal')
+            syncs = []
+            fsync = os.fsync
+            def slow_fsync(fd):
+                syncs.append(fd)
+                threading.Event().wait(0.02)  # a slow disk
+                fsync(fd)
+            os.fsync = slow_fsync
+            try:
+                desks = [threading.Thread(target=manager.add_bike,
+                                          args=(rental_manager.Bike(id=i, make='test_brand_47', model='test_model_47'),))
+                         for i in range(8)]
+                for desk in desks:
+                    desk.start()
+                for desk in desks:
+                    desk.join()
+            finally:
+                os.fsync = fsync
+            self.assertLess(len(syncs), 8)
+            manager.close()
+            self.assertEqual(len(self.journal_manager(directory).inventory), 8)
+
+    def test_flush_skips_delay(self):
+        """
+        TEST: 48
+        Test that a flush writes at once instead of waiting out the writer's batching delay.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            manager = self.temp_manager(directory, storage_mode='journal', background_writes=True)
+            manager.writer.delay = 5.0
+            manager.add_bike(rental_manager.Bike(id=1, make='test_brand_48', model='test_model_48'))
+            start = time.monotonic()
+            self.assertTrue(manager.writer.flush(timeout=10))
+            self.assertLess(time.monotonic() - start, 1.0)
+            manager.close()
+            self.assertEqual(len(self.journal_manager(directory).inventory), 1)
+
+    def test_api_rejects_bad_tickets(self):
+        """
+        TEST: 49
+        Test that the API and the manager refuse tickets with a wrong body shape, ids or hours, renting nothing.
+        """
+        async def exercise(manager):
+            service = api_server.ApiService(manager)
+            server = await service.start('127.0.0.1', 0)
+            client = bench_api.Client('127.0.0.1', server.sockets[0].getsockname()[1])
+            customer = {'name': 'test_customer_49', 'phone': '123-456-7890'}
+            try:
+                for body in ([customer, 1, 2], {'customer': 'x', 'bike_id': 1, 'hours': 1},
+                             {'customer': customer, 'bike_id': '1', 'hours': 1},
+                             {'customer': customer, 'bike_id': True, 'hours': 1},
+                             {'customer': customer, 'bike_id': 1, 'hours': '2'},
+                             {'customer': customer, 'bike_id': 1, 'hours': -1},
+                             {'customer': customer, 'bike_id': 1, 'hours': 0},
+                             {'customer': {**customer, 'id': 'a'}, 'bike_id': 1, 'hours': 1}):
+                    with self.subTest(body=body):
+                        self.assertEqual((await client.request('POST', '/tickets', body))[0], 400)
+                self.assertEqual((await client.request('POST', '/tickets', {'customer': customer, 'bike_id': 1, 'hours': 1.5}))[0], 201)
+            finally:
+                client.close()
+                await service.close()
+
+        with tempfile.TemporaryDirectory() as directory:
+            manager = self.journal_manager(directory, fsync='never')
+            manager.add_bike(rental_manager.Bike(id=1, make='test_brand_49', model='test_model_49', hourly_rate=5.0))
+            customer = rental_manager.Customer(id=None, name='test_customer_49', phone='123-456-7890')
+            for hours in ('2', -1, 0, float('nan'), None):
+                with self.assertRaises(ValueError):
+                    manager.create_ticket(customer=customer, bike_id=1, hours=hours)
+            self.assertEqual(manager.total_active_rentals(), 0)
+            asyncio.run(exercise(manager))
+            self.assertEqual(manager.total_active_rentals(), 1)
+            manager.close()
+
+    def test_api_errors_and_shutdown(self):
+        """
+        TEST: 50
+        Test that an unexpected handler error is a 500 that keeps the connection, and that closing the
+        service hangs up idle keep-alive connections without errors.
+        """
+        async def exercise(manager):
+            errors = []
+            asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+            service = api_server.ApiService(manager)
+            server = await service.start('127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            client, idle = bench_api.Client('127.0.0.1', port), bench_api.Client('127.0.0.1', port)
+            try:
+                def broken():
+                    raise RuntimeError("disk on fire")
+                manager.total_revenue = broken
+                self.assertEqual(await client.request('GET', '/reports/summary'), (500, {'error': "Internal server error"}))
+                status, results = await client.request('POST', '/batch', [{'method': 'GET', 'path': '/reports/summary'}])
+                self.assertEqual((status, results[0]['status']), (200, 500))
+                self.assertEqual((await client.request('GET', '/bikes'))[0], 200)  # still connected
+
+                self.assertEqual((await idle.request('GET', '/bikes'))[0], 200)
+                await asyncio.wait_for(service.close(), 5)
+                self.assertEqual(service.connections, {})
+                self.assertEqual(await idle.reader.read(), b'')  # hung up
+            finally:
+                client.close()
+                idle.close()
+            self.assertEqual(errors, [])
+
+        with tempfile.TemporaryDirectory() as directory:
+            manager = self.journal_manager(directory, fsync='never')
+            with contextlib.redirect_stderr(io.StringIO()):  # the 500s log their tracebacks
+                asyncio.run(exercise(manager))
+            manager.close()
+
+
+    def test_bike_id_in_use(self):
+        """
+        TEST: 51
+        Test that a bike can't be given the id of another bike, and that nothing changes when it's refused.
+        """
+        self.debug_output = False
+
+        for i in (1, 2):
+            self.manager.add_bike(rental_manager.Bike(id=i, make='test_brand_51', model='test_model_51'))
+        with self.assertRaisesRegex(ValueError, "already in use"):
+            self.manager.set_bike_status(bike_id=1, status='id', new_value=2)
+
+        self.assertEqual([b.id for b in self.manager.inventory], [1, 2])
+        self.assertEqual(self.manager.get_bike(2).id, 2)
+        self.manager.set_bike_status(bike_id=1, status='id', new_value=1)  # its own id is fine
+        self.assertEqual(sorted(self.manager.bike_index), [1, 2])
+
+
+    def test_sqlite_bike_order(self):
+        """
+        TEST: 52
+        Test that the SQLite backend keeps bikes in the order they were added, not by id, and that edits keep their place.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            manager = self.temp_manager(directory, storage_mode='sqlite')
+            for i in (5, 1, 3):
+                manager.add_bike(rental_manager.Bike(id=i, make='test_brand_52', model='test_model_52'))
+            manager.set_bike_status(bike_id=5, status='model', new_value='test_model_52b')
+            manager.remove_bike(bike_id=1)
+            manager.add_bike(rental_manager.Bike(id=1, make='test_brand_52', model='test_model_52'))
+            self.assertEqual([b.id for b in manager.inventory], [5, 3, 1])
+            manager.close()
+
+            reloaded = self.temp_manager(directory, storage_mode='sqlite')
+            self.assertEqual([b.id for b in reloaded.inventory], [5, 3, 1])
+            self.assertEqual(reloaded.get_bike(5).model, 'test_model_52b')
+            reloaded.save_data()  # a full rewrite keeps the order too
+            reloaded.close()
+            again = self.temp_manager(directory, storage_mode='sqlite', lazy_history=True)
+            self.assertEqual([b.id for b in again.inventory], [5, 3, 1])
+            again.close()
+
+
+    def test_binary_snapshot_format(self):
+        """
+        TEST: 53
+        Test that the binary snapshot keeps id / status / fee in the header table only when they fit it exactly,
+        and that version 1 (marshal) snapshots still load.
+        """
+        bike = {'id': 1, 'make': 'test_brand_53', 'model': 'test_model_53', 'status': 'available', 'rented_by': '', 'hourly_rate': 5.0}
+        customer = {'id': 1, 'name': 'test_customer_53', 'phone': '123-456-7890'}
+        ticket = {'id': 1, 'status': 'closed', 'bike': bike, 'customer': customer, 'start_time': '2024-01-01T10:00:00',
+                  'end_time': '2024-01-01T12:00:00', 'total_fee': 12.5, 'personal_notes': 'n\x00ö'}
+        odd = dict(ticket, id=2, status='lost', total_fee=10)  # not a header status, an int fee
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'rental.snap')
+            for tickets, in_headers in (([ticket], ['id', 'total_fee', 'status']), ([ticket, odd], ['id'])):
+                with open(path, 'wb') as file:
+                    binary_snapshot.write_snapshot(file, [bike], tickets, {'ticket': 2})
+                with binary_snapshot.SnapshotReader(path) as reader:
+                    self.assertEqual(reader.meta()['header_fields'], in_headers)
+                    self.assertFalse({'ticket.' + name for name in in_headers} & set(reader.sections))
+                loaded = binary_snapshot.read_snapshot(path)
+                self.assertEqual(loaded, ([bike], tickets, {'ticket': 2}))
+                self.assertIs(type(loaded[1][-1]['total_fee']), type(tickets[-1]['total_fee']))
+
+            # a version 1 file, sections in marshal
+            sections = [('meta', marshal.dumps({'sequences': {'ticket': 1}, 'ticket_fields': list(ticket)})),
+                        ('bikes', marshal.dumps([bike]))]
+            sections += [('ticket.' + name, marshal.dumps([value])) for name, value in ticket.items()]
+            offset = binary_snapshot.HEADER.size + binary_snapshot.DIRECTORY_ENTRY.size * len(sections)
+            with open(path, 'wb') as file:
+                file.write(binary_snapshot.HEADER.pack(binary_snapshot.MAGIC, 1, len(sections), 1, 1))
+                for name, data in sections:
+                    file.write(binary_snapshot.DIRECTORY_ENTRY.pack(name.encode(), offset, len(data)))
+                    offset += len(data)
+                file.write(b''.join(data for name, data in sections))
+            self.assertEqual(binary_snapshot.read_snapshot(path), ([bike], [ticket], {'ticket': 1}))
+
+
+    def test_mmap_archive_append(self):
+        """
+        TEST: 54
+        Test that the mmap archive appends new tickets in place, replaces and drops archived ones, is rewritten
+        as one batch after ARCHIVE_MAX_BATCHES, and still reads version 1 (marshal) archives.
+        """
+        def ticket(ticket_id, fee, notes=''):
+            return {'id': ticket_id, 'status': 'closed', 'bike': {'id': 1}, 'customer': {'id': ticket_id},
+                    'start_time': '2024-01-01T10:00:00', 'end_time': '2024-01-01T12:00:00', 'total_fee': fee,
+                    'personal_notes': notes}
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tickets.archive')
+            archive = ticket_store.MmapTicketArchive(path).extended([ticket(1, 10.0), ticket(3, 5.0)])
+            with open(path, 'rb') as file:
+                first_batch = file.read()[ticket_store.ARCHIVE_HEADER.size:]
+
+            # 2 is new, 3 is replaced, 1 was discarded (a newer copy is in memory) and is dropped
+            archive.discard(1)
+            appended = archive.extended([ticket(2, 7.0, 'ö'), ticket(3, 6.0)])
+            archive.close()
+            with open(path, 'rb') as file:
+                self.assertEqual(file.read()[ticket_store.ARCHIVE_HEADER.size:len(first_batch) + ticket_store.ARCHIVE_HEADER.size], first_batch)
+            self.assertEqual(appended.batches, 2)
+            self.assertEqual(list(appended), [2, 3])
+            self.assertEqual(appended.get(2), ticket(2, 7.0, 'ö'))
+            self.assertEqual(appended.get(3)['total_fee'], 6.0)
+            self.assertIsNone(appended.get(1))
+            self.assertEqual((appended.summary['revenue_total'], appended.summary['revenue_per_bike']), (13.0, {1: 13.0}))
+
+            for i in range(ticket_store.ARCHIVE_MAX_BATCHES - 1):  # the last one goes past the limit
+                archive, appended = appended, appended.extended([ticket(10 + i, 1.0)])
+                archive.close()
+            self.assertEqual(appended.batches, 1)  # rewritten
+            self.assertEqual(list(appended), [2, 3] + list(range(10, 9 + ticket_store.ARCHIVE_MAX_BATCHES)))
+            self.assertEqual(appended.summary['revenue_total'], 12.0 + ticket_store.ARCHIVE_MAX_BATCHES)
+            appended.close()
+
+            # a version 1 archive, records and summary in marshal
+            records = [marshal.dumps(ticket(4, 8.0))]
+            summary = marshal.dumps({'revenue_total': 8.0, 'revenue_per_bike': {1: 8.0}, 'revenue_per_day': {'2024-01-01': 8.0},
+                                     'max_ticket_id': 4, 'max_customer_id': 4})
+            header = ticket_store.ARCHIVE_V1_HEADER
+            index_offset = header.size + len(records[0]) + -(header.size + len(records[0])) % 8
+            with open(path, 'wb') as file:
+                file.write(header.pack(ticket_store.ARCHIVE_MAGIC, 1, ticket_store.BYTE_ORDER, 1, index_offset,
+                                       index_offset + 24, len(summary)))
+                file.write(records[0] + b'\0' * (index_offset - header.size - len(records[0])))
+                file.write(array.array('q', (4, header.size, len(records[0]))).tobytes() + summary)
+            old = ticket_store.MmapTicketArchive(path)
+            self.assertEqual(old.get(4), ticket(4, 8.0))
+            upgraded = old.extended([ticket(5, 2.0)])
+            old.close()
+            self.assertEqual((upgraded.version, list(upgraded), upgraded.get(4)), (ticket_store.ARCHIVE_VERSION, [4, 5], ticket(4, 8.0)))
+            self.assertEqual(upgraded.summary['revenue_per_bike'], {1: 10.0})
+            upgraded.close()
+
+
+    def test_quote_batch_matches_quote(self):
+        """
+        TEST: 55
+        Test that batch quotes, with and without numpy, match quote() ticket by ticket for late and on-time rentals.
+        """
+        self.debug_output = False
+        planned = [1, 1.5, 2, 0.25, 3, 2.5, 1, 4]
+        rates = [10.0, 7.5, 12.0, 9.99, 5.0, 8.25, 20.0, 3.3]
+        hours = [0.5, 1.5, 2.01, 0.2, 7.3, 2.5, 1.26, 40.0]  # on time, on the dot, just late, early, late, ...
+        starts = [0, 9, 16, 17, 18, 23, 12, 20]
+        all_rules = [
+            pricing.PricingRules(),
+            pricing.PricingRules(late_fee_rate=1.5, late_rounding='quarter', max_fee=150.0, time_of_day=[(17, 24, 1.25)]),
+            pricing.PricingRules(late_fee_rate=3.0, planned_rounding='exact', late_rounding='ceil', time_of_day=[(0, 6, 0.5)]),
+        ]
+        for use_numpy in (False, True):
+            for n, rules in enumerate(all_rules):
+                for start_hours in (None, starts):
+                    with self.subTest(use_numpy=use_numpy, rules=n, start_hours=start_hours is not None):
+                        if use_numpy and pricing.numpy is None:
+                            self.skipTest("numpy is not installed")
+                        expected = [round(rules.quote(p, r, h, s).total, 2)
+                                    for p, r, h, s in zip(planned, rates, hours, start_hours or [None] * len(planned))]
+                        self.assertEqual(rules.quote_batch(planned, rates, hours, start_hours, use_numpy=use_numpy), expected)
+        self.assertTrue(any(h > p for p, h in zip(planned, hours)) and any(h <= p for p, h in zip(planned, hours)))
+        if pricing.numpy is None:
+            with self.assertRaises(ValueError):
+                all_rules[0].quote_batch(planned, rates, hours, use_numpy=True)
+
+
+    def test_set_bike_fields_lock_order(self):
+        """
+        TEST: 56
+        Test that changing a bike's id with other fields takes both bike locks before the manager lock, and changes it last.
+        """
+        self.debug_output = False
+        self.manager.add_bike(rental_manager.Bike(id=1, make='test_brand_56', model='test_model_56'))
+
+        inverted = []  # bike locks first taken while the manager lock was already held
+        bike_lock = self.manager.bike_lock
+        def checked_bike_lock(bike_id):
+            lock = bike_lock(bike_id)
+            if self.manager.lock._is_owned() and not lock._is_owned():
+                inverted.append(bike_id)
+            return lock
+        self.manager.bike_lock = checked_bike_lock
+
+        bike = self.manager.set_bike_fields(1, make='test_brand_56b', id=10, hourly_rate=8.0)
+        self.assertEqual(inverted, [])
+        self.assertEqual((bike.id, bike.make, bike.hourly_rate), (10, 'test_brand_56b', 8.0))
+        self.assertEqual(list(self.manager.bike_index), [10])
+
+
+    def test_api_batch_bad_items(self):
+        """
+        TEST: 57
+        Test that malformed items in a batch get a 400 of their own while the rest of the batch still runs.
+        """
+        async def exercise(manager):
+            service = api_server.ApiService(manager)
+            server = await service.start('127.0.0.1', 0)
+            client = bench_api.Client('127.0.0.1', server.sockets[0].getsockname()[1])
+            try:
+                customer = {'name': 'test_customer_57', 'phone': '123-456-7890'}
+                status, results = await client.request('POST', '/batch', [
+                    {'method': 'POST', 'path': '/tickets', 'body': {'customer': customer, 'bike_id': 1, 'hours': 1}},
+                    {'method': 'POST', 'path': 5},
+                    {'method': ['GET'], 'path': '/bikes'},
+                    {'method': 'GET', 'path': 'http://[/bikes'},  # urlsplit refuses it
+                    {'method': 'GET', 'path': '/reports/summary'},
+                ])
+                self.assertEqual(status, 200)
+                self.assertEqual([r['status'] for r in results], [201, 400, 400, 400, 200])
+                self.assertEqual(results[4]['body']['active_rentals'], 1)
+            finally:
+                client.close()
+                await service.close()
+
+        with tempfile.TemporaryDirectory() as directory:
+            manager = self.journal_manager(directory, fsync='never')
+            manager.add_bike(rental_manager.Bike(id=1, make='test_brand_57', model='test_model_57', hourly_rate=5.0))
+            asyncio.run(exercise(manager))
+            manager.close()
+
+
+    def test_export_journal_data(self):
+        """
+        TEST: 58
+        Test that the export script sees changes the GUI or API server have only written to the journal so far.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            running = self.temp_manager(directory, **api_server.MANAGER_OPTIONS)
+            running.add_bike(rental_manager.Bike(id=1, make='test_brand_58', model='test_model_58', hourly_rate=5.0))
+            running.add_bike(rental_manager.Bike(id=2, make='test_brand_58', model='test_model_58', hourly_rate=5.0))
+            customer = rental_manager.Customer(id=None, name='test_customer_58', phone='123-456-7890')
+            closed = running.create_ticket(customer=customer, bike_id=1, hours=1)
+            running.close_ticket(ticket_id=closed.id)
+            active = running.create_ticket(customer=customer, bike_id=2, hours=2)
+            with open(running.tickets_file, 'r') as file:
+                self.assertEqual(json.load(file), [])  # only in the journal so far
+
+            out = os.path.join(directory, 'out.jsonl')
+            with contextlib.chdir(directory), contextlib.redirect_stdout(io.StringIO()) as printed:
+                argv, sys.argv = sys.argv, ['ticket_export.py', out]
+                try:
+                    ticket_export.main()
+                finally:
+                    sys.argv = argv
+            with open(out, 'r') as file:
+                rows = [json.loads(line) for line in file]
+            self.assertEqual([(r['id'], r['status']) for r in rows], [(closed.id, 'closed'), (active.id, 'active')])
+            self.assertEqual(printed.getvalue().strip(), f"Exported 2 tickets to {out}.")
+            running.close()
+
+
+    def test_shared_files_background_writes(self):
+        """
+        TEST: 59
+        Test that with shared files a change returns before its background write, the files stay locked until
+        the writer has written it (compactions too), and other processes then see it.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            # the GUI's and the API server's configuration
+            gui = self.temp_manager(directory, storage_mode='journal', background_writes=True, shared_files=True,
+                                    fsync='never', compact_every=3)
+            api = self.temp_manager(directory, **api_server.MANAGER_OPTIONS, fsync='never')
+            gui.writer.delay = 0.2  # long enough to see the change queued
+
+            gui.add_bike(rental_manager.Bike(id=1, make='test_brand_59', model='test_model_59', hourly_rate=5.0))
+            self.assertTrue(gui.writer.pending())  # returned without waiting for the write
+            self.assertEqual(gui.sync_changes(), 0)  # still locked by this process, nothing to read
+            customer = rental_manager.Customer(id=None, name='test_customer_59', phone='123-456-7890')
+            ticket = api.create_ticket(customer=customer, bike_id=1, hours=1)  # waits for the write
+            self.assertEqual(gui.writer.write_count, 1)
+
+            # the ticket and its bike make three records in the journal; the next change starts a compaction,
+            # written by the writer as well
+            self.assertEqual(gui.sync_changes(), 2)
+            gui.add_bike(rental_manager.Bike(id=2, make='test_brand_59', model='test_model_59', hourly_rate=5.0))
+            self.assertTrue(gui.writer.snapshot_pending)
+            with self.assertRaisesRegex(ValueError, "not available"):
+                api.create_ticket(customer=customer, bike_id=1, hours=1)
+            self.assertFalse(gui.writer.snapshot_pending)
+            with open(gui.inventory_file, 'r') as file:
+                self.assertEqual([b['id'] for b in json.load(file)], [1, 2])
+            self.assertEqual(api.get_bike(2).make, 'test_brand_59')
+
+            api.close_ticket(ticket.id)
+            self.assertEqual(gui.sync_changes(), 2)  # the ticket and its bike
+            self.assertEqual(gui.total_revenue(), api.total_revenue())
+            gui.close()
+            api.close()
+
 
 # Run the tests
 if __name__ == '__main__':
@@ -1,16 +1,95 @@
+from datetime import datetime
+from sys import intern
+
+
+def intern_values(data: dict) -> dict:
+    """Intern the string values of an embedded bike/customer dict, repeated across many tickets."""
+    for key, value in data.items():
+        if type(value) is str:
+            data[key] = intern(value)
+    return data
+
+
 class Ticket:
+    # stored fields, in to_dict() order
+    FIELDS = ('id', 'status', 'bike', 'customer', 'start_time', 'planned_hours', 'end_time', 'total_fee', 'system_notes', 'personal_notes')
+    # slots instead of a per-ticket __dict__; repeated strings are interned.
+    # start_time / end_time are ISO strings, parsed at most once into _start_dt / _end_dt
+    __slots__ = ('id', 'status', 'bike', 'customer', '_start_time', 'planned_hours', '_end_time', 'total_fee', 'system_notes', 'personal_notes',
+                 '_start_dt', '_end_dt')
+
     def __init__(self, id, status, bike, customer, start_time, planned_hours, end_time="", total_fee=0, system_notes='', personal_notes=''):
         self.id = id
-        self.status = status
-        self.bike = bike
-        self.customer = customer
+        self.status = intern(status) if type(status) is str else status
+        self.bike = intern_values(bike)
+        self.customer = intern_values(customer)
         self.start_time = start_time
         self.planned_hours = planned_hours
         self.end_time = end_time
         self.total_fee = total_fee
-        self.system_notes = system_notes
+        self.system_notes = intern(system_notes) if type(system_notes) is str else system_notes
         self.personal_notes = personal_notes
+
+    def to_dict(self) -> dict:
+        """Return the ticket as a plain dict (the JSON/storage shape), with its own bike and customer dicts."""
+        data = {name: getattr(self, name) for name in self.FIELDS}
+        data['bike'] = dict(self.bike)
+        data['customer'] = dict(self.customer)
+        return data
+
+    @property
+    def start_time(self) -> str:
+        return self._start_time
+
+    @start_time.setter
+    def start_time(self, value: str) -> None:
+        self._start_time = value
+        self._start_dt = None
+
+    @property
+    def end_time(self) -> str:
+        """ISO end time, "" while the ticket is open."""
+        return self._end_time
+
+    @end_time.setter
+    def end_time(self, value: str) -> None:
+        self._end_time = value
+        self._end_dt = None
+
+    @property
+    def start_datetime(self) -> datetime:
+        """start_time as a datetime, parsed on first use."""
+        if self._start_dt is None:
+            self._start_dt = datetime.fromisoformat(self._start_time)
+        return self._start_dt
+
+    @start_datetime.setter
+    def start_datetime(self, value: datetime) -> None:
+        self._start_time = value.isoformat()
+        self._start_dt = value
+
+    @property
+    def end_datetime(self) -> None | datetime:
+        """end_time as a datetime (None while open), parsed on first use."""
+        if self._end_dt is None and self._end_time != "":
+            self._end_dt = datetime.fromisoformat(self._end_time)
+        return self._end_dt
+
+    @end_datetime.setter
+    def end_datetime(self, value: datetime) -> None:
+        self._end_time = value.isoformat()
+        self._end_dt = value
+
+    def hours_rented(self, now=None) -> float:
+        """Hours from start to return, or to now (default datetime.now()) while open."""
+        end = self.end_datetime or now or datetime.now()
+        return (end - self.start_datetime).total_seconds() / 3600
+
+    def update(self, data: dict) -> None:
+        """Set every field from a dict made by to_dict()."""
+        for name, value in data.items():
+            setattr(self, name, value)
         
     def __repr__(self):
         return (f"Ticket({self.id}, Bike {self.bike}, Customer {self.customer}, "
-                f"Start: {self.start_time}, End: {self.end_time}, Fee: ${self.total_fee})")
\ No newline at end of file
+                f"Start: {self.start_time}, End: {self.end_time}, Fee: ${self.total_fee})")
@@ -0,0 +1,115 @@
+# ticket export for accounting: CSV or JSON Lines, optionally gzipped
+#
+# usage: python ticket_export.py out.csv|out.jsonl[.gz] [from YYYY-MM-DD] [to YYYY-MM-DD] [status]
+# rows are written one at a time as RentalManager.iter_ticket_dicts yields them, so memory stays flat
+# however many years of history there are. The date range is on the rental's start, the end date excluded.
+
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+from datetime import datetime
+from api_server import MANAGER_OPTIONS
+from rental_manager import RentalManager
+
+FORMATS = ('csv', 'jsonl')
+
+# the nested bike and customer dicts are flattened for CSV
+CSV_COLUMNS = ('id', 'status', 'start_time', 'end_time', 'planned_hours', 'total_fee',
+               'bike_id', 'bike_make', 'bike_model', 'bike_hourly_rate',
+               'customer_id', 'customer_name', 'customer_phone', 'system_notes', 'personal_notes')
+
+
+class _LastLine:
+    """File-like target for csv.writer that keeps only the last row written."""
+
+    def write(self, text):
+        self.text = text
+
+
+def csv_lines(tickets):
+    """Yield a header line, then one CSV line per ticket dict."""
+    line = _LastLine()
+    writer = csv.writer(line)
+    writer.writerow(CSV_COLUMNS)
+    yield line.text
+    for t in tickets:
+        bike, customer = t['bike'], t['customer']
+        writer.writerow((t['id'], t['status'], t['start_time'], t['end_time'], t['planned_hours'], t['total_fee'],
+                         bike['id'], bike.get('make'), bike.get('model'), bike.get('hourly_rate'),
+                         customer['id'], customer['name'], customer['phone'], t['system_notes'], t['personal_notes']))
+        yield line.text
+
+
+def jsonl_lines(tickets):
+    """Yield one JSON line per ticket dict, in the storage shape."""
+    for t in tickets:
+        yield json.dumps(t) + '\n'
+
+
+def export_tickets(manager, path, format=None, start: datetime = None, end: datetime = None, status=None,
+                   compress=None) -> int:
+    """
+    Write the tickets that started in [start, end) and have the given status (all by default) to path.
+    format is 'csv' or 'jsonl' and compress gzips the file; both are taken from the file name if not given
+    (e.g. 'tickets.csv.gz'). The file only appears once complete. Returns the number of tickets written.
+    """
+    name = path[:-3] if path.endswith('.gz') else path
+    if compress is None:
+        compress = path.endswith('.gz')
+    if format is None:
+        format = name.rsplit('.', 1)[-1].lower()
+    if format not in FORMATS:
+        raise ValueError(f"Unknown export format: {format} (use one of {', '.join(FORMATS)})")
+
+    count = 0
+    def counted(tickets):
+        nonlocal count
+        for t in tickets:
+            count += 1
+            yield t
+
+    lines = (csv_lines if format == 'csv' else jsonl_lines)(counted(manager.iter_ticket_dicts(start, end, status)))
+
+    # written next to the target and renamed over it; unlike a snapshot, an older export is not kept as .bak
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as file:
+            raw = gzip.GzipFile(fileobj=file, mode='wb') if compress else file
+            text = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+            text.writelines(lines)
+            text.detach()  # flushed, file left for the with block to close
+            if compress:
+                raw.close()  # writes the gzip trailer, file stays open
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return count
+
+
+def main():
+    if len(sys.argv) < 2:
+        sys.exit("usage: python ticket_export.py out.csv|out.jsonl[.gz] [from YYYY-MM-DD] [to YYYY-MM-DD] [status]")
+    path = sys.argv[1]
+    start = datetime.fromisoformat(sys.argv[2]) if len(sys.argv) > 2 and sys.argv[2] else None
+    end = datetime.fromisoformat(sys.argv[3]) if len(sys.argv) > 3 and sys.argv[3] else None
+    status = sys.argv[4] if len(sys.argv) > 4 else None
+
+    # the GUI and the API server may be running on the same files: open them the way they do, so changes still
+    # in their journal are exported too. Closed tickets stay out of memory; the export reads them as it goes.
+    manager = RentalManager(**MANAGER_OPTIONS, lazy_history=True)
+    try:
+        count = export_tickets(manager, path, start=start, end=end, status=status)
+    finally:
+        manager.close()
+    print(f"Exported {count} tickets to {path}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,637 @@
+# closed-ticket archives
+# with RentalManager(lazy_history=True) only open tickets become Ticket objects at startup,
+# closed tickets from earlier runs stay on disk in a TicketArchive and are read back one at a time.
+# with RentalManager(columnar_history=True) they are loaded, but packed into typed arrays.
+# with RentalManager(mmap_history=True) they are moved out of the main storage into a memory-mapped archive file.
+
+import codecs
+import heapq
+import json
+import marshal
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from collections.abc import MutableMapping, ValuesView
+from datetime import datetime, timedelta
+from durable import write_atomic
+
+
+def iter_json_array(path, chunk_size=1 << 16):
+    """
+    Stream the objects of a top-level JSON array without reading the whole file.
+    Yields (byte offset, byte length, object) for each element.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    with open(path, 'rb') as file:
+        buffer = ''
+        pos = 0  # next unread character in buffer
+        byte_pos = 0  # byte offset of buffer[pos] in the file
+        eof = False
+        while True:
+            # skip the brackets, commas and whitespace between elements
+            start = pos
+            while pos < len(buffer) and buffer[pos] in '[, \t\r\n':
+                pos += 1
+            byte_pos += len(buffer[start:pos].encode('utf-8'))
+
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            try:
+                if pos == len(buffer):
+                    raise ValueError("need more data")
+                obj, end = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                if eof:
+                    if buffer[pos:].strip():
+                        raise
+                    return
+                # element cut off at the end of the chunk, drop what's been read and load more
+                buffer = buffer[pos:]
+                pos = 0
+                chunk = file.read(chunk_size)
+                eof = not chunk
+                buffer += utf8.decode(chunk, final=eof)
+                continue
+
+            length = len(buffer[pos:end].encode('utf-8'))
+            yield byte_pos, length, obj
+            byte_pos += length
+            pos = end
+
+
+class TicketArchive:
+    """
+    Closed tickets kept out of Ticket objects. Holds their ids (sorted, in an array) plus running
+    revenue totals; subclasses fetch a single ticket dict by id when asked.
+    """
+
+    # True if the archived tickets live in their own file and must be left out of storage snapshots
+    stored_separately = False
+
+    def __init__(self):
+        self.ids = array('q')
+        self.removed = set()  # ids superseded by a newer in-memory ticket
+        self.summary = {
+            'revenue_total': 0.0,
+            'revenue_per_bike': {},
+            'revenue_per_day': {},
+            'max_ticket_id': 0,
+            'max_customer_id': 0,
+        }
+
+    def count(self, data: dict, sign=1) -> None:
+        """Add (or with sign=-1 take back) a ticket's share of the summary."""
+        if sign > 0:
+            self.summary['max_ticket_id'] = max(self.summary['max_ticket_id'], data['id'])
+            self.summary['max_customer_id'] = max(self.summary['max_customer_id'], data['customer']['id'] or 0)
+        if data['status'] == 'closed':
+            fee = sign * data['total_fee']
+            day = data['end_time'][:10]
+            per_bike = self.summary['revenue_per_bike']
+            per_day = self.summary['revenue_per_day']
+            self.summary['revenue_total'] += fee
+            per_bike[data['bike']['id']] = per_bike.get(data['bike']['id'], 0.0) + fee
+            per_day[day] = per_day.get(day, 0.0) + fee
+
+    def _position(self, ticket_id) -> int:
+        """Index of ticket_id in self.ids, or -1."""
+        if not isinstance(ticket_id, int):
+            return -1
+        i = bisect_left(self.ids, ticket_id)
+        return i if i < len(self.ids) and self.ids[i] == ticket_id else -1
+
+    def __contains__(self, ticket_id) -> bool:
+        return ticket_id not in self.removed and self._position(ticket_id) >= 0
+
+    def __len__(self) -> int:
+        return len(self.ids) - len(self.removed)
+
+    def __iter__(self):
+        for ticket_id in self.ids:
+            if ticket_id not in self.removed:
+                yield ticket_id
+
+    def get(self, ticket_id) -> None | dict:
+        """Return the stored dict of one ticket, or None."""
+        if ticket_id not in self:
+            return None
+        return self.fetch(ticket_id)
+
+    def discard(self, ticket_id) -> None:
+        """Forget an archived ticket because a newer version now lives in memory."""
+        if ticket_id in self:
+            self.count(self.fetch(ticket_id), -1)
+            self.removed.add(ticket_id)
+
+    def iter_dicts(self):
+        """Yield the dict of every archived ticket, by id."""
+        for ticket_id in self:
+            yield self.fetch(ticket_id)
+
+    def iter_range(self, start: str, end: str):
+        """Yield the dict of every archived ticket that started in [start, end) (ISO strings)."""
+        for data in self.iter_dicts():
+            if isinstance(data['start_time'], str) and start <= data['start_time'] < end:
+                yield data
+
+    def fetch(self, ticket_id) -> dict:
+        raise NotImplementedError
+
+    def extended(self, tickets: list[dict], sync=True) -> 'TicketArchive':
+        """
+        Write the given closed tickets into the archive's own files and return an archive that
+        holds them too. Only archives that are stored_separately support this.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class JsonTicketArchive(TicketArchive):
+    """Closed tickets inside a tickets.json file, found again through their byte offsets."""
+
+    def __init__(self, path):
+        super().__init__()
+        self.offsets = array('q')
+        self.lengths = array('q')
+        # keep our own handle: saves replace the file, this one still reads the version we indexed
+        self.file = open(path, 'rb')
+        self.lock = threading.Lock()
+
+    def add(self, offset: int, length: int, data: dict) -> None:
+        """Register one closed ticket found while streaming the file."""
+        self.ids.append(data['id'])
+        self.offsets.append(offset)
+        self.lengths.append(length)
+        self.count(data)
+
+    def finish(self) -> None:
+        """Sort the index by id once every ticket has been added."""
+        if any(self.ids[i] > self.ids[i + 1] for i in range(len(self.ids) - 1)):
+            order = sorted(range(len(self.ids)), key=self.ids.__getitem__)
+            self.ids = array('q', (self.ids[i] for i in order))
+            self.offsets = array('q', (self.offsets[i] for i in order))
+            self.lengths = array('q', (self.lengths[i] for i in order))
+
+    def fetch(self, ticket_id):
+        i = self._position(ticket_id)
+        with self.lock:
+            self.file.seek(self.offsets[i])
+            return json.loads(self.file.read(self.lengths[i]))
+
+    def close(self):
+        self.file.close()
+
+
+class _StreamingValues(ValuesView):
+    """values() of a TicketStore, reading archived tickets one by one instead of by key lookups."""
+
+    def __iter__(self):
+        store = self._mapping
+        for data in store.archive.iter_dicts():
+            yield store.factory(**data)
+        yield from store.hot.values()
+
+
+class TicketStore(MutableMapping):
+    """
+    Dict-like ticket_id -> Ticket over an archive of closed tickets.
+
+    hot holds the Ticket objects in memory: everything open at load time plus anything
+    created or changed since. Archived tickets are rebuilt from the archive on each access.
+    """
+
+    def __init__(self, hot: dict, archive: TicketArchive, factory):
+        self.hot = hot
+        self.archive = archive
+        self.factory = factory
+        for ticket_id in hot:
+            archive.discard(ticket_id)
+
+    @property
+    def summary(self) -> dict:
+        """Revenue totals and highest ids of the archived tickets."""
+        return self.archive.summary
+
+    def __getitem__(self, ticket_id):
+        ticket = self.hot.get(ticket_id)
+        if ticket is not None:
+            return ticket
+        data = self.archive.get(ticket_id)
+        if data is None:
+            raise KeyError(ticket_id)
+        return self.factory(**data)
+
+    def __setitem__(self, ticket_id, ticket):
+        if ticket_id not in self.hot:
+            self.archive.discard(ticket_id)
+        self.hot[ticket_id] = ticket
+
+    def __delitem__(self, ticket_id):
+        # archived tickets are history, only in-memory ones can be dropped
+        del self.hot[ticket_id]
+
+    def __contains__(self, ticket_id):
+        return ticket_id in self.hot or ticket_id in self.archive
+
+    def __iter__(self):
+        yield from self.archive
+        yield from self.hot
+
+    def __len__(self):
+        return len(self.hot) + len(self.archive)
+
+    def values(self):
+        return _StreamingValues(self)
+
+    def close(self) -> None:
+        """Close the archive file."""
+        self.archive.close()
+
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def iso_to_micros(iso_str: str) -> int:
+    """ISO timestamp (naive, as written by datetime.isoformat) to microseconds since 1970-01-01."""
+    return (datetime.fromisoformat(iso_str) - EPOCH) // MICROSECOND
+
+
+def micros_to_iso(micros: int) -> str:
+    """Inverse of iso_to_micros."""
+    return (EPOCH + micros * MICROSECOND).isoformat()
+
+
+class ColumnarTicketArchive(TicketArchive):
+    """
+    Closed tickets packed into typed arrays, one per field, instead of Ticket objects and dicts.
+
+    Timestamps are microseconds since the epoch, ids are ints, fees and rates are floats, and everything
+    else (names, phones, makes, notes, ...) is an index into one shared value table,
+    so repeated values are stored once. Tickets that don't fit the usual shape are kept as dicts.
+    """
+
+    TICKET_KEYS = {'id', 'status', 'bike', 'customer', 'start_time', 'planned_hours', 'end_time', 'total_fee', 'system_notes', 'personal_notes'}
+    BIKE_KEYS = ('id', 'make', 'model', 'hourly_rate', 'status')
+    CUSTOMER_KEYS = ('id', 'name', 'phone')
+    # fields stored as value table indexes, in column order
+    VALUE_FIELDS = ('status', 'bike_make', 'bike_model', 'bike_status', 'customer_name',
+                    'customer_phone', 'planned_hours', 'system_notes', 'personal_notes')
+
+    def __init__(self):
+        super().__init__()
+        self.values = []  # shared value table
+        self.value_index = {}  # (type, value) -> position in self.values
+        self.start_times = array('q')
+        self.end_times = array('q')
+        self.total_fees = array('d')
+        self.hourly_rates = array('d')
+        self.bike_ids = array('q')
+        self.customer_ids = array('q')
+        self.value_columns = {name: array('l') for name in self.VALUE_FIELDS}
+        self.extras = {}  # ticket_id -> dict, for tickets the columns can't hold exactly
+
+    def _value(self, value) -> int:
+        """Position of value in the value table, adding it if new."""
+        key = (type(value), value)
+        position = self.value_index.get(key)
+        if position is None:
+            position = self.value_index[key] = len(self.values)
+            self.values.append(value)
+        return position
+
+    def _fits(self, data: dict) -> bool:
+        """Return True if the columns can hold this ticket without losing anything."""
+        try:
+            return (data.keys() == self.TICKET_KEYS
+                    and tuple(data['bike']) == self.BIKE_KEYS
+                    and tuple(data['customer']) == self.CUSTOMER_KEYS
+                    and type(data['total_fee']) is float and type(data['bike']['hourly_rate']) is float
+                    and type(data['bike']['id']) is int and type(data['customer']['id']) is int
+                    and micros_to_iso(iso_to_micros(data['start_time'])) == data['start_time']
+                    and micros_to_iso(iso_to_micros(data['end_time'])) == data['end_time'])
+        except (TypeError, ValueError):
+            return False
+
+    def add(self, data: dict) -> None:
+        """Pack one closed ticket; ids must come in increasing order."""
+        if self.ids and data['id'] <= self.ids[-1]:
+            raise ValueError("Tickets must be added in increasing id order")
+        self.count(data)
+
+        bike = data['bike']
+        customer = data['customer']
+        if self._fits(data):
+            row = (data['status'], bike['make'], bike['model'], bike['status'], customer['name'],
+                   customer['phone'], data['planned_hours'], data['system_notes'], data['personal_notes'])
+            start_time = iso_to_micros(data['start_time'])
+            end_time = iso_to_micros(data['end_time'])
+            total_fee = data['total_fee']
+            hourly_rate = bike['hourly_rate']
+            bike_id = bike['id']
+            customer_id = customer['id']
+        else:
+            self.extras[data['id']] = data
+            row = (None,) * len(self.VALUE_FIELDS)
+            start_time = end_time = bike_id = customer_id = 0
+            total_fee = hourly_rate = 0.0
+
+        self.ids.append(data['id'])
+        self.start_times.append(start_time)
+        self.end_times.append(end_time)
+        self.total_fees.append(total_fee)
+        self.hourly_rates.append(hourly_rate)
+        self.bike_ids.append(bike_id)
+        self.customer_ids.append(customer_id)
+        for name, value in zip(self.VALUE_FIELDS, row):
+            self.value_columns[name].append(self._value(value))
+
+    def fetch(self, ticket_id):
+        if ticket_id in self.extras:
+            return dict(self.extras[ticket_id])
+        i = self._position(ticket_id)
+        v = {name: self.values[column[i]] for name, column in self.value_columns.items()}
+        return {
+            'id': ticket_id,
+            'status': v['status'],
+            'bike': {'id': self.bike_ids[i], 'make': v['bike_make'], 'model': v['bike_model'],
+                     'hourly_rate': self.hourly_rates[i], 'status': v['bike_status']},
+            'customer': {'id': self.customer_ids[i], 'name': v['customer_name'], 'phone': v['customer_phone']},
+            'start_time': micros_to_iso(self.start_times[i]),
+            'planned_hours': v['planned_hours'],
+            'end_time': micros_to_iso(self.end_times[i]),
+            'total_fee': self.total_fees[i],
+            'system_notes': v['system_notes'],
+            'personal_notes': v['personal_notes'],
+        }
+
+
+# mmap archive file (little endian):
+#   header   ARCHIVE_HEADER: magic, version, batch count, offset of the last batch's footer
+#   batches  one per extended() call, each appended after the one before:
+#            records  one JSON ticket dict after another
+#            index    ARCHIVE_INDEX_ROW per ticket of the batch, sorted by id, 8-byte aligned so it can be cast to 'q';
+#                     a DROPPED length marks an archived ticket taken out since the batch before
+#            summary  JSON TicketArchive.summary of the whole archive as of this batch
+#            footer   ARCHIVE_FOOTER
+# a batch is written (and synced) before the header points at it, so a crash mid-append leaves the archive as it was.
+# the index of a single batch is read from the mapping in place; several are merged into one array on open,
+# and after ARCHIVE_MAX_BATCHES the archive is rewritten as one batch.
+# version 1 archives (native byte order, marshal records) are still read; the next extended() rewrites them.
+ARCHIVE_MAGIC = b'BIKEARCH'
+ARCHIVE_VERSION = 2
+ARCHIVE_MAX_BATCHES = 8
+ARCHIVE_HEADER = struct.Struct('<8sHHq')  # magic, version, batch count, last footer offset
+ARCHIVE_FOOTER = struct.Struct('<qqqqq')  # previous footer offset (0: none), index offset, count, summary offset, summary length
+ARCHIVE_INDEX_ROW = struct.Struct('<qqq')  # ticket id, record offset, record length
+DROPPED = -1
+ARCHIVE_V1_HEADER = struct.Struct('=8sHHqqqq')  # magic, version, byte order, count, index offset, summary offset, summary length
+BYTE_ORDER = 1 if sys.byteorder == 'little' else 2
+
+
+def _dumps(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def dump_summary(summary: dict) -> bytes:
+    """Encode an archive summary; revenue_per_bike goes as pairs, JSON would turn its int keys into strings."""
+    return _dumps({**summary, 'revenue_per_bike': list(summary['revenue_per_bike'].items())})
+
+
+def load_summary(data) -> dict:
+    summary = json.loads(str(data, 'utf-8'))
+    summary['revenue_per_bike'] = dict(summary['revenue_per_bike'])
+    return summary
+
+
+def merge_index(chunks) -> array:
+    """
+    Merge the index rows of several batches, oldest first, into one sorted array of (id, offset, length)
+    triples: the newest row of an id wins, and ids whose newest row is DROPPED are left out.
+    """
+    def rows(n, chunk):
+        for ticket_id, offset, length in ARCHIVE_INDEX_ROW.iter_unpack(chunk):
+            yield ticket_id, -n, offset, length
+
+    index = array('q')
+    last = None
+    for ticket_id, _, offset, length in heapq.merge(*(rows(n, chunk) for n, chunk in enumerate(chunks))):
+        if ticket_id != last:
+            last = ticket_id
+            if length != DROPPED:
+                index.extend((ticket_id, offset, length))
+    return index
+
+
+class MmapTicketArchive(TicketArchive):
+    """
+    Closed tickets in a memory-mapped archive file. The records (and the id index, while the archive is
+    one batch) are read from the mapping in place, so archived tickets cost no memory until one is fetched.
+    A missing file is an empty archive.
+    """
+
+    stored_separately = True
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.map = None
+        self.view = None
+        self.index = None
+        self.version = ARCHIVE_VERSION
+        self.batches = 0
+        self.footer_offset = 0  # of the last batch
+        try:
+            with open(path, 'rb') as file:
+                self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):  # ValueError: empty file
+            return
+        try:
+            self._open()
+        except BaseException:
+            self.close()
+            raise
+
+    def _open(self) -> None:
+        if len(self.map) < ARCHIVE_HEADER.size:
+            raise ValueError(f"{self.path} is truncated")
+        self.view = memoryview(self.map)
+        magic, self.version, self.batches, self.footer_offset = ARCHIVE_HEADER.unpack_from(self.map)
+        if magic == ARCHIVE_MAGIC and self.version == 1:
+            self._open_v1()
+            return
+        if magic != ARCHIVE_MAGIC or self.version != ARCHIVE_VERSION:
+            raise ValueError(f"{self.path} is not a version {ARCHIVE_VERSION} ticket archive")
+
+        footers = []
+        offset = self.footer_offset
+        while offset:
+            if len(footers) == self.batches or offset + ARCHIVE_FOOTER.size > len(self.map):
+                raise ValueError(f"{self.path} is damaged")
+            footers.append(ARCHIVE_FOOTER.unpack_from(self.map, offset))
+            offset = footers[-1][0]
+        if len(footers) != self.batches or not footers:
+            raise ValueError(f"{self.path} is damaged")
+        footers.reverse()
+
+        chunks = []
+        for _, index_offset, count, summary_offset, summary_length in footers:
+            if max(index_offset + count * ARCHIVE_INDEX_ROW.size, summary_offset + summary_length) > len(self.map):
+                raise ValueError(f"{self.path} is truncated")
+            chunks.append(self.view[index_offset:index_offset + count * ARCHIVE_INDEX_ROW.size])
+        if len(chunks) == 1 and sys.byteorder == 'little':
+            self.index = chunks[0].cast('q')
+        else:
+            self.index = memoryview(merge_index(chunks))
+        # every third int of the index; bisect works on it like on an array
+        self.ids = self.index[0::ARCHIVE_INDEX_ROW.size // 8]
+        self.summary = load_summary(self.view[summary_offset:summary_offset + summary_length])
+
+    def _open_v1(self) -> None:
+        if len(self.map) < ARCHIVE_V1_HEADER.size:
+            raise ValueError(f"{self.path} is truncated")
+        _, _, byte_order, count, index_offset, summary_offset, summary_length = ARCHIVE_V1_HEADER.unpack_from(self.map)
+        if byte_order != BYTE_ORDER:
+            raise ValueError(f"{self.path} is a version 1 ticket archive from another machine")
+        if summary_offset + summary_length > len(self.map):
+            raise ValueError(f"{self.path} is truncated")
+        self.index = self.view[index_offset:index_offset + count * ARCHIVE_INDEX_ROW.size].cast('q')
+        self.ids = self.index[0::ARCHIVE_INDEX_ROW.size // 8]
+        self.summary = marshal.loads(self.view[summary_offset:summary_offset + summary_length])
+
+    def record(self, i) -> memoryview:
+        """Return the encoded record at index position i, without copying it."""
+        width = ARCHIVE_INDEX_ROW.size // 8
+        offset, length = self.index[i * width + 1], self.index[i * width + 2]
+        return self.view[offset:offset + length]
+
+    def decode(self, record) -> dict:
+        if self.version == 1:
+            return marshal.loads(record)
+        return json.loads(str(record, 'utf-8'))
+
+    def fetch(self, ticket_id):
+        return self.decode(self.record(self._position(ticket_id)))
+
+    def extended(self, tickets, sync=True):
+        if self.map is None or self.version != ARCHIVE_VERSION or self.batches >= ARCHIVE_MAX_BATCHES:
+            records, summary = self.merged_records(tickets)
+            write_atomic(self.path, lambda file: write_ticket_archive(file, records, summary), sync, binary=True)
+        else:
+            self.append(tickets, sync)
+        return MmapTicketArchive(self.path)
+
+    def append(self, tickets: list[dict], sync=True) -> None:
+        """Write the given tickets, and drops for the archived ones discarded since opening, as a new batch."""
+        new = {t['id']: t for t in tickets}
+        summary = self.merged_summary(new)
+        dropped = ((ticket_id, None) for ticket_id in sorted(self.removed) if ticket_id not in new)
+        records = heapq.merge(dropped, ((ticket_id, _dumps(new[ticket_id])) for ticket_id in sorted(new)))
+
+        with open(self.path, 'r+b') as file:
+            # anything past the last batch is left over from an append that never finished
+            end = self.footer_offset + ARCHIVE_FOOTER.size
+            file.seek(end)
+            footer_offset = write_ticket_batch(file, end, records, summary, self.footer_offset)
+            file.flush()
+            if sync:
+                os.fsync(file.fileno())
+            file.seek(0)
+            file.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, self.batches + 1, footer_offset))
+            file.flush()
+            if sync:
+                os.fsync(file.fileno())
+
+    def merged_summary(self, new: dict) -> dict:
+        """Return the summary of this archive with the given tickets (id -> dict) added or replacing archived ones."""
+        merged = TicketArchive()
+        merged.summary = {**self.summary, 'revenue_per_bike': dict(self.summary['revenue_per_bike']),
+                          'revenue_per_day': dict(self.summary['revenue_per_day'])}
+        for ticket_id, data in new.items():
+            if ticket_id in self:
+                merged.count(self.fetch(ticket_id), -1)
+            merged.count(data)
+        return merged.summary
+
+    def merged_records(self, tickets: list[dict]):
+        """
+        Return (records, summary) for an archive holding this one's tickets plus the given ones;
+        records yields (ticket_id, JSON bytes) sorted by id, given tickets replacing archived ones.
+        """
+        new = {t['id']: t for t in tickets}
+        summary = self.merged_summary(new)
+
+        def encoded(i):
+            record = self.record(i)
+            return record if self.version == ARCHIVE_VERSION else _dumps(self.decode(record))
+
+        def records():
+            old_ids = (i for i in range(len(self.ids)) if self.ids[i] not in self.removed and self.ids[i] not in new)
+            new_ids = iter(sorted(new))
+            next_old, next_new = next(old_ids, None), next(new_ids, None)
+            while next_old is not None or next_new is not None:
+                if next_new is None or (next_old is not None and self.ids[next_old] < next_new):
+                    yield self.ids[next_old], encoded(next_old)
+                    next_old = next(old_ids, None)
+                else:
+                    yield next_new, _dumps(new[next_new])
+                    next_new = next(new_ids, None)
+        return records(), summary
+
+    def close(self):
+        # memoryviews have to go before the mapping can be closed
+        if isinstance(self.ids, memoryview):
+            self.ids.release()
+        self.ids = array('q')
+        for view in (self.index, self.view):
+            if view is not None:
+                view.release()
+        self.index = self.view = None
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+
+def write_ticket_batch(file, position, records, summary, previous) -> int:
+    """
+    Write one archive batch at position, the current end of file; records are (ticket_id, JSON bytes, or None
+    to drop an archived ticket) pairs sorted by id. previous is the footer offset of the batch before, or 0.
+    Returns the offset of this batch's footer.
+    """
+    index = array('q')
+    for ticket_id, data in records:
+        if data is None:
+            index.extend((ticket_id, 0, DROPPED))
+            continue
+        index.extend((ticket_id, position, len(data)))
+        file.write(data)
+        position += len(data)
+
+    padding = -position % 8
+    file.write(b'\0' * padding)
+    index_offset = position + padding
+    if sys.byteorder != 'little':
+        index.byteswap()
+    file.write(index.tobytes())
+
+    summary_offset = index_offset + len(index) * index.itemsize
+    summary_data = dump_summary(summary)
+    file.write(summary_data)
+    footer_offset = summary_offset + len(summary_data)
+    file.write(ARCHIVE_FOOTER.pack(previous, index_offset, len(index) // 3, summary_offset, len(summary_data)))
+    return footer_offset
+
+
+def write_ticket_archive(file, records, summary) -> None:
+    """Write an mmap archive of one batch to a binary file; records are (ticket_id, JSON bytes) pairs sorted by id."""
+    file.write(b'\0' * ARCHIVE_HEADER.size)
+    footer_offset = write_ticket_batch(file, ARCHIVE_HEADER.size, records, summary, 0)
+    file.seek(0)
+    file.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, 1, footer_offset))
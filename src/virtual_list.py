@@ -0,0 +1,152 @@
+# paged, sortable result lists for the GUI
+#
+# ResultPager pulls items from a (possibly lazy) result iterator only as far as the page being shown,
+# VirtualList shows that one page in a ttk.Treeview, so Tk never lays out more than page_size rows.
+
+import itertools
+from typing import Callable, NamedTuple
+from tkinter import ttk
+
+
+class Column(NamedTuple):
+    heading: str
+    width: int
+    value: Callable  # item -> display text
+    sort_key: Callable = None  # item -> sort key, the display text if None
+
+
+class ResultPager:
+    """Pages over a result iterator, pulling items only as far as the pages asked for."""
+
+    def __init__(self, items, page_size=100, total=None):
+        self.source = iter(items)
+        self.loaded = []  # items pulled from source so far, in display order
+        self.page_size = page_size
+        self.total = total if total is not None or not hasattr(items, '__len__') else len(items)
+        self.page = 0
+
+    def _load(self, count) -> None:
+        """Pull items until count are loaded or the source runs out."""
+        missing = count - len(self.loaded)
+        if missing > 0:
+            self.loaded.extend(itertools.islice(self.source, missing))
+            if len(self.loaded) < count:
+                self.total = len(self.loaded)
+
+    def rows(self) -> list:
+        """The items of the current page."""
+        start = self.page * self.page_size
+        self._load(start + self.page_size)
+        return self.loaded[start:start + self.page_size]
+
+    def has_next(self) -> bool:
+        end = (self.page + 1) * self.page_size
+        self._load(end + 1)
+        return len(self.loaded) > end
+
+    def has_previous(self) -> bool:
+        return self.page > 0
+
+    def next(self) -> None:
+        if self.has_next():
+            self.page += 1
+
+    def previous(self) -> None:
+        if self.has_previous():
+            self.page -= 1
+
+    def page_count(self) -> None | int:
+        """Number of pages, or None while the source hasn't been read to the end."""
+        if self.total is None:
+            return None
+        return max(1, -(-self.total // self.page_size))
+
+    def sort(self, key, reverse=False) -> None:
+        """Sort every item (which reads the whole source) and go back to the first page."""
+        self.loaded.extend(self.source)
+        self.total = len(self.loaded)
+        self.loaded.sort(key=key, reverse=reverse)
+        self.page = 0
+
+
+class VirtualList:
+    """
+    A ttk.Treeview that shows one page of results at a time, with Previous / Next buttons
+    and sorting by a click on a column heading (a second click reverses it).
+    """
+
+    PAGE_SIZE = 100
+
+    def __init__(self, parent, columns: list[Column], page_size=PAGE_SIZE, height=20):
+        self.columns = columns
+        self.page_size = page_size
+        self.pager = ResultPager([], page_size)
+        self.sort_column = None
+        self.sort_reverse = False
+        self.empty_text = ""
+
+        self.frame = ttk.Frame(parent)
+        self.frame.pack(fill="both", expand=True)
+
+        table_frame = ttk.Frame(self.frame)
+        table_frame.pack(fill="both", expand=True)
+        self.tree = ttk.Treeview(table_frame, columns=[str(i) for i in range(len(columns))], show="headings", height=height)
+        for i, column in enumerate(columns):
+            self.tree.heading(str(i), text=column.heading, command=lambda i=i: self.sort_by(i))
+            self.tree.column(str(i), width=column.width, stretch=False)
+        scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=self.tree.yview)
+        x_scrollbar = ttk.Scrollbar(table_frame, orient="horizontal", command=self.tree.xview)
+        self.tree.configure(yscrollcommand=scrollbar.set, xscrollcommand=x_scrollbar.set)
+        x_scrollbar.pack(side="bottom", fill="x")
+        self.tree.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+
+        # paging controls
+        nav_frame = ttk.Frame(self.frame)
+        nav_frame.pack(pady=5)
+        self.previous_button = ttk.Button(nav_frame, text="< Previous", command=lambda: self.pager.previous() or self.render())
+        self.previous_button.pack(side="left", padx=5)
+        self.page_label = ttk.Label(nav_frame, text="", width=40, anchor="center")
+        self.page_label.pack(side="left", padx=5)
+        self.next_button = ttk.Button(nav_frame, text="Next >", command=lambda: self.pager.next() or self.render())
+        self.next_button.pack(side="left", padx=5)
+
+    def show(self, items, total=None, empty_text="No results.") -> None:
+        """Show a new result set from its first page; items may be a lazy iterator, total its length if known."""
+        self.pager = ResultPager(items, self.page_size, total)
+        self.empty_text = empty_text
+        if self.sort_column is not None:
+            self._sort()
+        self.render()
+
+    def sort_by(self, index) -> None:
+        """Sort by a column, reversing the order if it is already sorted by it."""
+        self.sort_reverse = self.sort_column == index and not self.sort_reverse
+        self.sort_column = index
+        self._sort()
+        self.render()
+
+    def _sort(self) -> None:
+        column = self.columns[self.sort_column]
+        self.pager.sort(column.sort_key or column.value, self.sort_reverse)
+        for i, c in enumerate(self.columns):
+            arrow = (" ▼" if self.sort_reverse else " ▲") if i == self.sort_column else ""
+            self.tree.heading(str(i), text=c.heading + arrow)
+
+    def render(self) -> None:
+        """Replace the rows in the tree with the current page."""
+        self.tree.delete(*self.tree.get_children())
+        rows = self.pager.rows()
+        for item in rows:
+            self.tree.insert("", "end", values=[column.value(item) for column in self.columns])
+        self.tree.yview_moveto(0)
+
+        if not rows:
+            self.page_label.config(text=self.empty_text)
+        else:
+            pages = self.pager.page_count()
+            count = "?" if pages is None else pages
+            results = "" if self.pager.total is None else f" ({self.pager.total} results)"
+            self.page_label.config(text=f"Page {self.pager.page + 1} of {count}{results}")
+        self.previous_button.state(["!disabled"] if self.pager.has_previous() else ["disabled"])
+        self.next_button.state(["!disabled"] if self.pager.has_next() else ["disabled"])